@@ -34,7 +34,7 @@ class Assignment(kvs.Base, assignment.Driver):
         except exception.NotFound:
             raise exception.ProjectNotFound(project_id=tenant_id)
 
-    def list_projects(self, domain_id=None):
+    def list_projects(self, domain_id=None, hints=None):
         project_keys = filter(lambda x: x.startswith("tenant-"),
                               self.db.keys())
         project_refs = [self.db.get(key) for key in project_keys]
@@ -152,7 +152,9 @@ class Assignment(kvs.Base, assignment.Driver):
             user_ref['tenants'] = list(tenants)
             self.identity_api.update_user(user_id, user_ref)
 
-    def list_role_assignments(self):
+    def list_role_assignments(self, role_id=None, user_id=None,
+                              group_ids=None, domain_id=None,
+                              project_ids=None, inherited_to_projects=None):
         """List the role assignments.
 
         The kvs backend stores role assignments as key-values:
@@ -162,9 +164,24 @@ class Assignment(kvs.Base, assignment.Driver):
         i.e. "metadata-MyProjectID-MyUserID" [{'id': role1}, {'id': role2}]
 
         ...so we enumerate the list and extract the targets, actors
-        and roles.
+        and roles, then apply the filters. There are no inherited
+        assignments in this backend.
 
         """
+        if inherited_to_projects:
+            return []
+
+        def _matches(ref, filters):
+            if all(x is None for x in filters.values()):
+                return True
+            return any(ref.get(attr) in (values or [])
+                       for attr, values in filters.iteritems())
+
+        actors = {'user_id': None if user_id is None else [user_id],
+                  'group_id': group_ids}
+        targets = {'domain_id': None if domain_id is None else [domain_id],
+                   'project_id': project_ids}
+
         assignment_list = []
         metadata_keys = filter(lambda x: x.startswith("metadata-"),
                                self.db.keys())
@@ -184,8 +201,13 @@ class Assignment(kvs.Base, assignment.Driver):
                 template['group_id'] = meta_id2
 
             entry = self.db.get(key)
+            if not (_matches(template, actors) and
+                    _matches(template, targets)):
+                continue
             for r in self._roles_from_role_dicts(entry.get('roles', {}),
                                                  False):
+                if role_id is not None and r != role_id:
+                    continue
                 role_assignment = template.copy()
                 role_assignment['role_id'] = r
                 assignment_list.append(role_assignment)
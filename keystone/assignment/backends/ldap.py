@@ -55,10 +55,11 @@ class Assignment(assignment.Driver):
     def get_project(self, tenant_id):
         return self._set_default_domain(self.project.get(tenant_id))
 
-    def list_projects(self, domain_id=None):
+    def list_projects(self, domain_id=None, hints=None):
         # We don't support multiple domains within this driver, so ignore
         # any domain passed.
-        return self._set_default_domain(self.project.get_all())
+        return self._set_default_domain(
+            self.project.get_all(self.project.filter_query(hints)))
 
     def get_project_by_name(self, tenant_name, domain_id):
         self._validate_default_domain_id(domain_id)
@@ -275,7 +276,9 @@ class Assignment(assignment.Driver):
     def get_domain_by_name(self, domain_name):
         raise exception.NotImplemented()
 
-    def list_role_assignments(self):
+    def list_role_assignments(self, role_id=None, user_id=None,
+                              group_ids=None, domain_id=None,
+                              project_ids=None, inherited_to_projects=None):
         raise exception.NotImplemented()
 
 
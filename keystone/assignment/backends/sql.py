@@ -21,9 +21,11 @@ from keystone.common import sql
 from keystone.common.sql import migration
 from keystone import config
 from keystone import exception
+from keystone.openstack.common import log as logging
 
 
 CONF = config.CONF
+LOG = logging.getLogger(__name__)
 
 
 @dependency.requires('identity_api')
@@ -63,6 +65,7 @@ class Assignment(sql.Base, assignment.Driver):
             project_refs = query.all()
             return [project_ref.user_id for project_ref in project_refs]
 
+    @sql.read_from_slave()
     def _get_metadata(self, user_id=None, tenant_id=None,
                       domain_id=None, group_id=None, session=None):
         # We aren't given a session when called by the manager directly.
@@ -89,6 +92,248 @@ class Assignment(sql.Base, assignment.Driver):
         except sql.NotFound:
             raise exception.MetadataNotFound()
 
+    def _list_role_ids_for_grants(self, grants):
+        """Resolve the role ids held in a set of grant rows in one query.
+
+        Each entry in grants is a (grant model, inherited, criteria) tuple;
+        the matching rows of every grant table are fetched with a single
+        UNION ALL and their roles combined.
+
+        """
+        selects = []
+        for model, inherited, criteria in grants:
+            table = model.__table__
+            selects.append(sql.sql.select(
+                [table.c.data,
+                 sql.sql.literal(inherited, sql.Boolean)],
+                sql.sql.and_(*criteria)))
+
+        session = self.get_session()
+        role_list = []
+        for data, inherited in session.execute(sql.sql.union_all(*selects)):
+            role_list += self._roles_from_role_dicts(
+                (data or {}).get('roles', []), inherited)
+        return list(set(role_list))
+
+    def list_role_ids_for_user_and_project(self, user_id, tenant_id,
+                                           domain_id):
+        if self._materialize_effective_roles():
+            criteria = sql.sql.and_(
+                EffectiveAssignment.target_type == 'project',
+                EffectiveAssignment.target_id == tenant_id)
+            if CONF.os_inherit.enabled:
+                criteria = sql.sql.or_(criteria, sql.sql.and_(
+                    EffectiveAssignment.target_type == 'domain',
+                    EffectiveAssignment.target_id == domain_id,
+                    EffectiveAssignment.inherited))
+            return self._list_effective_role_ids(user_id, criteria)
+
+        group_ids = self._get_group_ids_for_user_id(user_id)
+        user_project = UserProjectGrant.__table__.c
+        group_project = GroupProjectGrant.__table__.c
+        grants = [(UserProjectGrant, False,
+                   [user_project.user_id == user_id,
+                    user_project.project_id == tenant_id])]
+        if group_ids:
+            grants.append((GroupProjectGrant, False,
+                           [group_project.group_id.in_(group_ids),
+                            group_project.project_id == tenant_id]))
+
+        if CONF.os_inherit.enabled:
+            user_domain = UserDomainGrant.__table__.c
+            group_domain = GroupDomainGrant.__table__.c
+            grants.append((UserDomainGrant, True,
+                           [user_domain.user_id == user_id,
+                            user_domain.domain_id == domain_id]))
+            if group_ids:
+                grants.append((GroupDomainGrant, True,
+                               [group_domain.group_id.in_(group_ids),
+                                group_domain.domain_id == domain_id]))
+
+        return self._list_role_ids_for_grants(grants)
+
+    def list_role_ids_for_user_and_domain(self, user_id, domain_id):
+        if self._materialize_effective_roles():
+            criteria = sql.sql.and_(
+                EffectiveAssignment.target_type == 'domain',
+                EffectiveAssignment.target_id == domain_id,
+                sql.sql.not_(EffectiveAssignment.inherited))
+            return self._list_effective_role_ids(user_id, criteria)
+
+        group_ids = self._get_group_ids_for_user_id(user_id)
+        user_domain = UserDomainGrant.__table__.c
+        group_domain = GroupDomainGrant.__table__.c
+        grants = [(UserDomainGrant, False,
+                   [user_domain.user_id == user_id,
+                    user_domain.domain_id == domain_id])]
+        if group_ids:
+            grants.append((GroupDomainGrant, False,
+                           [group_domain.group_id.in_(group_ids),
+                            group_domain.domain_id == domain_id]))
+
+        return self._list_role_ids_for_grants(grants)
+
+    # effective role materialization
+
+    def _materialize_effective_roles(self):
+        """Whether effective roles are read from ``effective_assignment``.
+
+        The table is only kept up to date with group memberships changed
+        through keystone, so the option is ignored unless users and groups
+        are stored in SQL too, for every domain; with LDAP, memberships
+        change in the directory without keystone noticing.
+
+        """
+        if not CONF.assignment.materialize_effective_roles:
+            return False
+        if (CONF.identity.domain_specific_drivers_enabled or
+                not isinstance(self.identity_api.driver, sql.Base)):
+            if not getattr(self, '_warned_materialize', False):
+                LOG.warning(_('Ignoring [assignment] '
+                              'materialize_effective_roles, which requires '
+                              'the SQL identity driver for every domain.'))
+                self._warned_materialize = True
+            return False
+        return True
+
+    def _list_effective_role_ids(self, user_id, criteria):
+        session = self.get_session()
+        query = session.query(EffectiveAssignment.role_id)
+        query = query.filter_by(user_id=user_id).filter(criteria)
+        role_ids = [role_id for role_id, in query.distinct()]
+        if not role_ids:
+            # Keep raising UserNotFound, as the grant lookups do when listing
+            # the user's groups.
+            self.identity_api.get_user(user_id)
+        return role_ids
+
+    def _effective_assignments(self, user_ids, source_id, target_type,
+                               target_id, metadata):
+        return [{'user_id': user_id,
+                 'target_type': target_type,
+                 'target_id': target_id,
+                 'role_id': role['id'],
+                 'inherited': bool(role.get('inherited_to')),
+                 'source_id': source_id}
+                for role in (metadata or {}).get('roles', [])
+                for user_id in user_ids]
+
+    def _insert_effective_assignments(self, session, rows):
+        if rows:
+            session.execute(EffectiveAssignment.__table__.insert(), rows)
+
+    def _sync_effective_roles(self, user_id=None, tenant_id=None,
+                              domain_id=None, group_id=None):
+        """Replace the effective roles derived from a single grant.
+
+        A user grant only affects that user; a group grant is expanded to
+        every current member of the group. Called once the grant itself has
+        been committed, since group members come from the identity backend.
+
+        """
+        if not self._materialize_effective_roles():
+            return
+
+        if tenant_id:
+            target_type, target_id = 'project', tenant_id
+        else:
+            target_type, target_id = 'domain', domain_id
+        if user_id:
+            source_id, user_ids = user_id, [user_id]
+        else:
+            source_id = group_id
+            user_ids = self._list_user_ids_in_group(group_id)
+
+        with self.transaction() as session:
+            try:
+                metadata_ref = self._get_metadata(user_id, tenant_id,
+                                                  domain_id, group_id,
+                                                  session=session)
+            except exception.MetadataNotFound:
+                metadata_ref = {}
+
+            q = session.query(EffectiveAssignment)
+            q = q.filter_by(source_id=source_id, target_type=target_type,
+                            target_id=target_id)
+            q.delete(False)
+            self._insert_effective_assignments(
+                session, self._effective_assignments(
+                    user_ids, source_id, target_type, target_id,
+                    metadata_ref))
+
+    def _delete_effective_roles(self, session, **kwargs):
+        if not self._materialize_effective_roles():
+            return
+
+        q = session.query(EffectiveAssignment)
+        q = q.filter_by(**kwargs)
+        q.delete(False)
+
+    def refresh_effective_roles_for_user(self, user_id):
+        if not self._materialize_effective_roles():
+            return
+
+        group_ids = self._get_group_ids_for_user_id(user_id)
+        with self.transaction() as session:
+            self._delete_effective_roles(session, user_id=user_id)
+
+            grants = [(UserProjectGrant, UserProjectGrant.user_id,
+                       [user_id]),
+                      (UserDomainGrant, UserDomainGrant.user_id,
+                       [user_id])]
+            if group_ids:
+                grants += [(GroupProjectGrant, GroupProjectGrant.group_id,
+                            group_ids),
+                           (GroupDomainGrant, GroupDomainGrant.group_id,
+                            group_ids)]
+
+            rows = []
+            for model, actor, actor_ids in grants:
+                for grant_ref in session.query(model).filter(
+                        actor.in_(actor_ids)):
+                    rows += self._effective_assignments(
+                        [user_id], *self._grant_target(grant_ref))
+            self._insert_effective_assignments(session, rows)
+
+    def rebuild_effective_roles(self):
+        session = self.get_session()
+        grant_refs = []
+        for model in (UserProjectGrant, UserDomainGrant,
+                      GroupProjectGrant, GroupDomainGrant):
+            grant_refs += session.query(model).all()
+
+        members = {}
+        rows = []
+        for grant_ref in grant_refs:
+            if isinstance(grant_ref, (UserProjectGrant, UserDomainGrant)):
+                user_ids = [grant_ref.user_id]
+            else:
+                group_id = grant_ref.group_id
+                if group_id not in members:
+                    members[group_id] = self._list_user_ids_in_group(
+                        group_id)
+                user_ids = members[group_id]
+            rows += self._effective_assignments(
+                user_ids, *self._grant_target(grant_ref))
+
+        with self.transaction() as session:
+            session.query(EffectiveAssignment).delete(False)
+            self._insert_effective_assignments(session, rows)
+        return len(rows)
+
+    def _list_user_ids_in_group(self, group_id):
+        try:
+            return [x['id'] for x in
+                    self.identity_api.list_users_in_group(group_id)]
+        except exception.GroupNotFound:
+            return []
+
+    def _grant_target(self, grant_ref):
+        source_id = getattr(grant_ref, 'user_id', None) or grant_ref.group_id
+        if getattr(grant_ref, 'project_id', None):
+            return source_id, 'project', grant_ref.project_id, grant_ref.data
+        return source_id, 'domain', grant_ref.domain_id, grant_ref.data
+
     def create_grant(self, role_id, user_id=None, group_id=None,
                      domain_id=None, project_id=None,
                      inherited_to_projects=False):
@@ -123,6 +368,8 @@ class Assignment(sql.Base, assignment.Driver):
                 self._update_metadata(session, user_id, project_id,
                                       metadata_ref, domain_id, group_id)
 
+        self._sync_effective_roles(user_id, project_id, domain_id, group_id)
+
     def list_grants(self, user_id=None, group_id=None,
                     domain_id=None, project_id=None,
                     inherited_to_projects=False):
@@ -174,6 +421,8 @@ class Assignment(sql.Base, assignment.Driver):
                                domain_id=domain_id, project_id=project_id,
                                inherited_to_projects=inherited_to_projects)
 
+        self._sync_effective_roles(user_id, project_id, domain_id, group_id)
+
     def _delete_grant(self, session, role_id, user_id=None, group_id=None,
                       domain_id=None, project_id=None,
                       inherited_to_projects=False):
@@ -208,7 +457,7 @@ class Assignment(sql.Base, assignment.Driver):
             self._update_metadata(session, user_id, project_id, metadata_ref,
                                   domain_id, group_id)
 
-    def list_projects(self, domain_id=None):
+    def list_projects(self, domain_id=None, hints=None):
         with self.transaction() as session:
             if domain_id:
                 self._get_domain(session, domain_id)
@@ -216,6 +465,7 @@ class Assignment(sql.Base, assignment.Driver):
             query = session.query(Project)
             if domain_id:
                 query = query.filter_by(domain_id=domain_id)
+            query = sql.filter_limit_query(Project, query, hints)
             project_refs = query.all()
             return [project_ref.to_dict() for project_ref in project_refs]
 
@@ -324,6 +574,8 @@ class Assignment(sql.Base, assignment.Driver):
                 self._update_metadata(session, user_id, tenant_id,
                                       metadata_ref)
 
+        self._sync_effective_roles(user_id=user_id, tenant_id=tenant_id)
+
     def remove_role_from_user_and_project(self, user_id, tenant_id, role_id):
         with self.transaction() as session:
             try:
@@ -350,7 +602,11 @@ class Assignment(sql.Base, assignment.Driver):
                 q = q.filter_by(project_id=tenant_id)
                 q.delete()
 
-    def list_role_assignments(self):
+        self._sync_effective_roles(user_id=user_id, tenant_id=tenant_id)
+
+    def list_role_assignments(self, role_id=None, user_id=None,
+                              group_ids=None, domain_id=None,
+                              project_ids=None, inherited_to_projects=None):
 
         # TODO(henry-nash): The current implementation is really simulating
         # us having a common role assignment table, rather than having the
@@ -359,46 +615,55 @@ class Assignment(sql.Base, assignment.Driver):
         # assignment table, simplifying the logic of this (and many other)
         # functions.
 
+        actors = {'user_id': None if user_id is None else [user_id],
+                  'group_id': group_ids}
+        targets = {'domain_id': None if domain_id is None else [domain_id],
+                   'project_id': project_ids}
+
+        def _wanted(filters, attr):
+            # Without a filter for either kind, everything is wanted
+            if filters[attr] is None:
+                return all(x is None for x in filters.values())
+            return bool(filters[attr])
+
+        assignment_list = []
         with self.transaction() as session:
-            assignment_list = []
-            refs = session.query(UserDomainGrant).all()
-            for x in refs:
-                roles = x.data.get('roles', {})
-                for r in self._roles_from_role_dicts(roles, False):
-                    assignment_list.append({'user_id': x.user_id,
-                                            'domain_id': x.domain_id,
-                                            'role_id': r})
-                for r in self._roles_from_role_dicts(roles, True):
-                    assignment_list.append({'user_id': x.user_id,
-                                            'domain_id': x.domain_id,
-                                            'role_id': r,
-                                            'inherited_to_projects': True})
-            refs = session.query(UserProjectGrant).all()
-            for x in refs:
-                roles = x.data.get('roles', {})
-                for r in self._roles_from_role_dicts(roles, False):
-                    assignment_list.append({'user_id': x.user_id,
-                                            'project_id': x.project_id,
-                                            'role_id': r})
-            refs = session.query(GroupDomainGrant).all()
-            for x in refs:
-                roles = x.data.get('roles', {})
-                for r in self._roles_from_role_dicts(roles, False):
-                    assignment_list.append({'group_id': x.group_id,
-                                            'domain_id': x.domain_id,
-                                            'role_id': r})
-                for r in self._roles_from_role_dicts(roles, True):
-                    assignment_list.append({'group_id': x.group_id,
-                                            'domain_id': x.domain_id,
-                                            'role_id': r,
-                                            'inherited_to_projects': True})
-            refs = session.query(GroupProjectGrant).all()
-            for x in refs:
-                roles = x.data.get('roles', {})
-                for r in self._roles_from_role_dicts(roles, False):
-                    assignment_list.append({'group_id': x.group_id,
-                                            'project_id': x.project_id,
-                                            'role_id': r})
+            for model, actor_attr, target_attr in (
+                    (UserDomainGrant, 'user_id', 'domain_id'),
+                    (UserProjectGrant, 'user_id', 'project_id'),
+                    (GroupDomainGrant, 'group_id', 'domain_id'),
+                    (GroupProjectGrant, 'group_id', 'project_id')):
+                if not (_wanted(actors, actor_attr) and
+                        _wanted(targets, target_attr)):
+                    continue
+                if inherited_to_projects and target_attr == 'project_id':
+                    continue
+
+                query = session.query(model)
+                if actors[actor_attr] is not None:
+                    query = query.filter(
+                        getattr(model, actor_attr).in_(actors[actor_attr]))
+                if targets[target_attr] is not None:
+                    query = query.filter(
+                        getattr(model, target_attr).in_(targets[target_attr]))
+
+                for x in query:
+                    roles = x.data.get('roles', {})
+                    for inherited in (False, True):
+                        if (inherited_to_projects is not None and
+                                inherited != inherited_to_projects):
+                            continue
+                        for r in self._roles_from_role_dicts(roles,
+                                                             inherited):
+                            if role_id is not None and r != role_id:
+                                continue
+                            assignment = {actor_attr: getattr(x, actor_attr),
+                                          target_attr: getattr(x,
+                                                               target_attr),
+                                          'role_id': r}
+                            if inherited:
+                                assignment['inherited_to_projects'] = True
+                            assignment_list.append(assignment)
             return assignment_list
 
     # CRUD
@@ -440,6 +705,8 @@ class Assignment(sql.Base, assignment.Driver):
             q = q.filter_by(project_id=tenant_id)
             q.delete(False)
 
+            self._delete_effective_roles(session, target_type='project',
+                                         target_id=tenant_id)
             session.delete(tenant_ref)
 
     @sql.handle_conflicts(conflict_type='metadata')
@@ -561,6 +828,8 @@ class Assignment(sql.Base, assignment.Driver):
     def delete_domain(self, domain_id):
         with self.transaction() as session:
             ref = self._get_domain(session, domain_id)
+            self._delete_effective_roles(session, target_type='domain',
+                                         target_id=domain_id)
             session.delete(ref)
 
     # role crud
@@ -633,6 +902,7 @@ class Assignment(sql.Base, assignment.Driver):
                 except exception.RoleNotFound:
                     pass
 
+            self._delete_effective_roles(session, role_id=role_id)
             session.delete(ref)
 
     def delete_user(self, user_id):
@@ -645,6 +915,8 @@ class Assignment(sql.Base, assignment.Driver):
             q = q.filter_by(user_id=user_id)
             q.delete(False)
 
+            self._delete_effective_roles(session, user_id=user_id)
+
     def delete_group(self, group_id):
         with self.transaction() as session:
             q = session.query(GroupProjectGrant)
@@ -655,6 +927,8 @@ class Assignment(sql.Base, assignment.Driver):
             q = q.filter_by(group_id=group_id)
             q.delete(False)
 
+            self._delete_effective_roles(session, source_id=group_id)
+
 
 class Domain(sql.ModelBase, sql.DictBase):
     __tablename__ = 'domain'
@@ -753,3 +1027,27 @@ class GroupDomainGrant(sql.ModelBase, BaseGrant):
     domain_id = sql.Column(sql.String(64), sql.ForeignKey('domain.id'),
                            primary_key=True)
     data = sql.Column(sql.JsonBlob())
+
+
+class EffectiveAssignment(sql.ModelBase, sql.DictBase):
+    """Materialized effective role assignments.
+
+    One row per role a user holds on a project or domain, by virtue of
+    either a direct grant (source_id is the user) or a group grant
+    (source_id is the group). Rows for inherited domain grants are kept
+    against the domain with inherited set, rather than expanded to every
+    project in it.
+
+    """
+    __tablename__ = 'effective_assignment'
+    attributes = ['user_id', 'target_type', 'target_id', 'role_id',
+                  'inherited', 'source_id']
+    user_id = sql.Column(sql.String(64), primary_key=True)
+    target_type = sql.Column(sql.String(16), primary_key=True)
+    target_id = sql.Column(sql.String(64), primary_key=True)
+    role_id = sql.Column(sql.String(64), primary_key=True)
+    inherited = sql.Column(sql.Boolean, primary_key=True)
+    source_id = sql.Column(sql.String(64), primary_key=True)
+    __table_args__ = (
+        sql.Index('ix_effective_assignment_source', 'source_id',
+                  'target_id'),)
@@ -109,60 +109,9 @@ class Manager(manager.Manager):
                  keystone.exception.ProjectNotFound
 
         """
-        def _get_group_project_roles(user_id, project_ref):
-            role_list = []
-            group_refs = self.identity_api.list_groups_for_user(user_id)
-            for x in group_refs:
-                try:
-                    metadata_ref = self._get_metadata(
-                        group_id=x['id'], tenant_id=project_ref['id'])
-                    role_list += self._roles_from_role_dicts(
-                        metadata_ref.get('roles', {}), False)
-                except exception.MetadataNotFound:
-                    # no group grant, skip
-                    pass
-
-                if CONF.os_inherit.enabled:
-                    # Now get any inherited group roles for the owning domain
-                    try:
-                        metadata_ref = self._get_metadata(
-                            group_id=x['id'],
-                            domain_id=project_ref['domain_id'])
-                        role_list += self._roles_from_role_dicts(
-                            metadata_ref.get('roles', {}), True)
-                    except (exception.MetadataNotFound,
-                            exception.NotImplemented):
-                        pass
-
-            return role_list
-
-        def _get_user_project_roles(user_id, project_ref):
-            role_list = []
-            try:
-                metadata_ref = self._get_metadata(user_id=user_id,
-                                                  tenant_id=project_ref['id'])
-                role_list = self._roles_from_role_dicts(
-                    metadata_ref.get('roles', {}), False)
-            except exception.MetadataNotFound:
-                pass
-
-            if CONF.os_inherit.enabled:
-                # Now get any inherited roles for the owning domain
-                try:
-                    metadata_ref = self._get_metadata(
-                        user_id=user_id, domain_id=project_ref['domain_id'])
-                    role_list += self._roles_from_role_dicts(
-                        metadata_ref.get('roles', {}), True)
-                except (exception.MetadataNotFound, exception.NotImplemented):
-                    pass
-
-            return role_list
-
         project_ref = self.get_project(tenant_id)
-        user_role_list = _get_user_project_roles(user_id, project_ref)
-        group_role_list = _get_group_project_roles(user_id, project_ref)
-        # Use set() to process the list to remove any duplicates
-        return list(set(user_role_list + group_role_list))
+        return self.driver.list_role_ids_for_user_and_project(
+            user_id, tenant_id, project_ref['domain_id'])
 
     def get_roles_for_user_and_domain(self, user_id, domain_id):
         """Get the roles associated with a user within given domain.
@@ -173,40 +122,9 @@ class Manager(manager.Manager):
 
         """
 
-        def _get_group_domain_roles(user_id, domain_id):
-            role_list = []
-            group_refs = self.identity_api.list_groups_for_user(user_id)
-            for x in group_refs:
-                try:
-                    metadata_ref = self._get_metadata(group_id=x['id'],
-                                                      domain_id=domain_id)
-                    role_list += self._roles_from_role_dicts(
-                        metadata_ref.get('roles', {}), False)
-                except (exception.MetadataNotFound, exception.NotImplemented):
-                    # MetadataNotFound implies no group grant, so skip.
-                    # Ignore NotImplemented since not all backends support
-                    # domains.
-                    pass
-            return role_list
-
-        def _get_user_domain_roles(user_id, domain_id):
-            metadata_ref = {}
-            try:
-                metadata_ref = self._get_metadata(user_id=user_id,
-                                                  domain_id=domain_id)
-            except (exception.MetadataNotFound, exception.NotImplemented):
-                # MetadataNotFound implies no user grants.
-                # Ignore NotImplemented since not all backends support
-                # domains
-                pass
-            return self._roles_from_role_dicts(
-                metadata_ref.get('roles', {}), False)
-
         self.get_domain(domain_id)
-        user_role_list = _get_user_domain_roles(user_id, domain_id)
-        group_role_list = _get_group_domain_roles(user_id, domain_id)
-        # Use set() to process the list to remove any duplicates
-        return list(set(user_role_list + group_role_list))
+        return self.driver.list_role_ids_for_user_and_domain(user_id,
+                                                             domain_id)
 
     def add_user_to_project(self, tenant_id, user_id):
         """Add user to a tenant by creating a default role relationship.
@@ -303,34 +221,52 @@ class Manager(manager.Manager):
     def get_role(self, role_id):
         return self.driver.get_role(role_id)
 
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=CONF.assignment.cache_time)
+    def get_role_name_map(self):
+        """Returns a dict mapping every role id to its name."""
+        return dict((role['id'], role['name'])
+                    for role in self.driver.list_roles())
+
+    def get_role_names(self, role_ids):
+        """Returns the names of the given roles, in the same order.
+
+        Resolves all of them from :meth:`get_role_name_map` rather than
+        fetching each role in turn.
+
+        :raises: keystone.exception.RoleNotFound
+
+        """
+        role_names = self.get_role_name_map()
+        try:
+            return [role_names[role_id] for role_id in role_ids]
+        except KeyError:
+            # the role may be newer than the cached map
+            return [self.get_role(role_id)['name'] for role_id in role_ids]
+
     @notifications.created('role')
     def create_role(self, role_id, role):
         ret = self.driver.create_role(role_id, role)
         if SHOULD_CACHE(ret):
             self.get_role.set(ret, self, role_id)
+        self.get_role_name_map.invalidate(self)
         return ret
 
     @notifications.updated('role')
     def update_role(self, role_id, role):
         ret = self.driver.update_role(role_id, role)
         self.get_role.invalidate(self, role_id)
+        self.get_role_name_map.invalidate(self)
         return ret
 
     @notifications.deleted('role')
     def delete_role(self, role_id):
         self.driver.delete_role(role_id)
         self.get_role.invalidate(self, role_id)
+        self.get_role_name_map.invalidate(self)
 
     def list_role_assignments_for_role(self, role_id=None):
-        # NOTE(henry-nash): Currently the efficiency of the key driver
-        # implementation (SQL) of list_role_assignments is severely hampered by
-        # the existence of the multiple grant tables - hence there is little
-        # advantage in pushing the logic of this method down into the driver.
-        # Once the single assignment table is implemented, then this situation
-        # will be different, and this method should have its own driver
-        # implementation.
-        return [r for r in self.driver.list_role_assignments()
-                if r['role_id'] == role_id]
+        return self.driver.list_role_assignments(role_id=role_id)
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -370,6 +306,89 @@ class Driver(object):
                                                      inherited).items()))
         return [dict(r) for r in role_set]
 
+    def _get_group_ids_for_user_id(self, user_id):
+        return [x['id'] for x in
+                self.identity_api.list_groups_for_user(user_id)]
+
+    def _get_role_ids_from_metadata(self, inherited, **kwargs):
+        try:
+            metadata_ref = self._get_metadata(**kwargs)
+        except (exception.MetadataNotFound, exception.NotImplemented):
+            # MetadataNotFound implies no grant. Ignore NotImplemented
+            # since not all backends support domains.
+            return []
+        return self._roles_from_role_dicts(metadata_ref.get('roles', {}),
+                                           inherited)
+
+    def list_role_ids_for_user_and_project(self, user_id, tenant_id,
+                                           domain_id):
+        """Lists the effective role ids of a user within given tenant.
+
+        This combines the roles granted on the tenant to the user and to
+        each of the groups the user belongs to, plus, if the OS-INHERIT
+        extension is enabled, the roles they inherit from the owning
+        domain_id.
+
+        The default implementation looks up each grant in turn; drivers
+        able to fetch them all in one round trip should override it.
+
+        :returns: a list of role ids.
+
+        """
+        group_ids = self._get_group_ids_for_user_id(user_id)
+        role_list = self._get_role_ids_from_metadata(
+            False, user_id=user_id, tenant_id=tenant_id)
+        for group_id in group_ids:
+            role_list += self._get_role_ids_from_metadata(
+                False, group_id=group_id, tenant_id=tenant_id)
+
+        if CONF.os_inherit.enabled:
+            role_list += self._get_role_ids_from_metadata(
+                True, user_id=user_id, domain_id=domain_id)
+            for group_id in group_ids:
+                role_list += self._get_role_ids_from_metadata(
+                    True, group_id=group_id, domain_id=domain_id)
+
+        # Use set() to process the list to remove any duplicates
+        return list(set(role_list))
+
+    def list_role_ids_for_user_and_domain(self, user_id, domain_id):
+        """Lists the effective role ids of a user within given domain.
+
+        This combines the roles granted on the domain to the user and to
+        each of the groups the user belongs to.
+
+        :returns: a list of role ids.
+
+        """
+        group_ids = self._get_group_ids_for_user_id(user_id)
+        role_list = self._get_role_ids_from_metadata(
+            False, user_id=user_id, domain_id=domain_id)
+        for group_id in group_ids:
+            role_list += self._get_role_ids_from_metadata(
+                False, group_id=group_id, domain_id=domain_id)
+
+        # Use set() to process the list to remove any duplicates
+        return list(set(role_list))
+
+    def refresh_effective_roles_for_user(self, user_id):
+        """Recompute any materialized effective roles of a user.
+
+        Called after the user's group membership changes. Drivers that
+        resolve effective roles from the grants on every request have
+        nothing to do.
+
+        """
+        pass
+
+    def rebuild_effective_roles(self):
+        """Recompute all materialized effective roles from the grants.
+
+        :returns: the number of effective role assignments stored.
+
+        """
+        raise exception.NotImplemented()
+
     @abc.abstractmethod
     def get_project_by_name(self, tenant_name, domain_id):
         """Get a tenant by name.
@@ -474,8 +493,25 @@ class Driver(object):
         raise exception.NotImplemented()
 
     @abc.abstractmethod
-    def list_role_assignments(self):
+    def list_role_assignments(self, role_id=None, user_id=None,
+                              group_ids=None, domain_id=None,
+                              project_ids=None, inherited_to_projects=None):
+        """List role assignments, optionally filtered.
+
+        :param role_id: only assignments of this role
+        :param user_id: assignments to this user
+        :param group_ids: assignments to any of these groups
+        :param domain_id: assignments on this domain
+        :param project_ids: assignments on any of these projects
+        :param inherited_to_projects: if True, only domain assignments
+                                      inherited to projects; if False, only
+                                      assignments which are not
+        :returns: a list of role assignment dicts; if only one of user_id
+                  and group_ids is given, assignments to the other kind of
+                  actor are left out, and likewise for domain_id and
+                  project_ids
 
+        """
         raise exception.NotImplemented()
 
     # domain crud
@@ -547,9 +583,11 @@ class Driver(object):
         raise exception.NotImplemented()
 
     @abc.abstractmethod
-    def list_projects(self, domain_id=None):
+    def list_projects(self, domain_id=None, hints=None):
         """List all projects in the system.
 
+        :param hints: optional keystone.common.driver_hints.Hints; filters
+                      the driver satisfies are removed from it
         :returns: a list of project_refs or an empty list.
 
         """
@@ -14,9 +14,6 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import json
-
-from keystone.common import cms
 from keystone.common import controller
 from keystone.common import dependency
 from keystone.common import wsgi
@@ -24,7 +21,7 @@ from keystone import config
 from keystone import exception
 from keystone.openstack.common import importutils
 from keystone.openstack.common import log as logging
-from keystone.openstack.common import timeutils
+from keystone.token import controllers as token_controllers
 
 
 LOG = logging.getLogger(__name__)
@@ -422,26 +419,13 @@ class Auth(controller.V3Controller):
         token_id = context.get('subject_token_id')
         include_catalog = 'nocatalog' not in context['query_string']
         token_data = self.token_provider_api.validate_v3_token(
-            token_id)
-        if not include_catalog and 'catalog' in token_data['token']:
-            del token_data['token']['catalog']
+            token_id, include_catalog=include_catalog)
         return render_token_data_response(token_id, token_data)
 
     @controller.protected()
     def revocation_list(self, context, auth=None):
-        tokens = self.token_api.list_revoked_tokens()
-
-        for t in tokens:
-            expires = t['expires']
-            if not (expires and isinstance(expires, unicode)):
-                    t['expires'] = timeutils.isotime(expires)
-        data = {'revoked': tokens}
-        json_data = json.dumps(data)
-        signed_text = cms.cms_sign_text(json_data,
-                                        CONF.signing.certfile,
-                                        CONF.signing.keyfile)
-
-        return {'signed': signed_text}
+        return token_controllers.render_revocation_list_response(
+            context, self.token_api)
 
 
 #FIXME(gyee): not sure if it belongs here or keystone.common. Park it here
@@ -37,7 +37,8 @@ class Token(auth.AuthMethodHandler):
                 raise exception.ValidationError(attribute='id',
                                                 target=METHOD_NAME)
             token_id = auth_payload['id']
-            response = self.provider.validate_token(token_id)
+            response = self.provider.validate_token(token_id,
+                                                    include_catalog=False)
             #for V3 tokens, the esential data is under  the 'token' value.
             #For V2, the comparable data was nested under 'access'
             token_ref = response.get('token', response.get('access'))
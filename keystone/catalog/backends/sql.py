@@ -147,11 +147,15 @@ class Catalog(sql.Base, catalog.Driver):
         return ref.to_dict()
 
     def get_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
+        return core.render_catalog(self.get_catalog_template(),
+                                   user_id, tenant_id)
 
-        session = self.get_session()
+    @sql.read_from_slave()
+    def get_catalog_template(self, session=None):
+        d = core.url_template_data()
+
+        if session is None:
+            session = self.get_session()
         endpoints = (session.query(Endpoint).
                      options(sql.joinedload(Endpoint.service)).
                      all())
@@ -161,32 +165,34 @@ class Catalog(sql.Base, catalog.Driver):
         for endpoint in endpoints:
             region = endpoint['region']
             service_type = endpoint.service['type']
-            default_service = {
-                'id': endpoint['id'],
-                'name': endpoint.service['name'],
-                'publicURL': ''
-            }
+            default_service = ({'id': endpoint['id'],
+                                'name': endpoint.service['name']},
+                               {'publicURL': ''})
             catalog.setdefault(region, {})
             catalog[region].setdefault(service_type, default_service)
-            url = core.format_url(endpoint['url'], d)
+            url = core.compile_url(endpoint['url'], d)
             interface_url = '%sURL' % endpoint['interface']
-            catalog[region][service_type][interface_url] = url
+            catalog[region][service_type][1][interface_url] = url
 
         return catalog
 
     def get_v3_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
+        return core.render_v3_catalog(self.get_v3_catalog_template(),
+                                      user_id, tenant_id)
 
-        session = self.get_session()
+    @sql.read_from_slave()
+    def get_v3_catalog_template(self, session=None):
+        d = core.url_template_data()
+
+        if session is None:
+            session = self.get_session()
         services = (session.query(Service).
                     options(sql.joinedload(Service.endpoints)).
                     all())
 
         def make_v3_endpoint(endpoint):
             del endpoint['service_id']
-            endpoint['url'] = core.format_url(endpoint['url'], d)
+            endpoint['url'] = core.compile_url(endpoint['url'], d)
             return endpoint
 
         catalog = [{'endpoints': [make_v3_endpoint(ep.to_dict())
@@ -108,17 +108,19 @@ class TemplatedCatalog(kvs.Catalog):
             raise
 
     def get_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
+        return core.render_catalog(self.get_catalog_template(),
+                                   user_id, tenant_id)
+
+    def get_catalog_template(self):
+        d = core.url_template_data()
 
         o = {}
         for region, region_ref in self.templates.iteritems():
             o[region] = {}
             for service, service_ref in region_ref.iteritems():
-                o[region][service] = {}
+                o[region][service] = ({}, {})
                 for k, v in service_ref.iteritems():
-                    o[region][service][k] = core.format_url(v, d)
+                    o[region][service][1][k] = core.compile_url(v, d)
 
         return o
 
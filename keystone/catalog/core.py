@@ -21,6 +21,7 @@ import abc
 
 import six
 
+from keystone.common import cache
 from keystone.common import dependency
 from keystone.common import manager
 from keystone import config
@@ -30,6 +31,12 @@ from keystone.openstack.common import log as logging
 
 CONF = config.CONF
 LOG = logging.getLogger(__name__)
+SHOULD_CACHE = cache.should_cache_fn('catalog')
+
+# Values which vary per request, and so are left unformatted in compiled
+# endpoint URLs.
+URL_TEMPLATE_KEYS = ('tenant_id', 'user_id')
+_URL_TEMPLATE_MARK = '\0'
 
 
 def format_url(url, data):
@@ -56,6 +63,78 @@ def format_url(url, data):
     return result
 
 
+def url_template_data():
+    """Build the data used to compile endpoint URLs with compile_url."""
+    data = dict(CONF.iteritems())
+    for key in URL_TEMPLATE_KEYS:
+        data[key] = '%s%s%s' % (_URL_TEMPLATE_MARK, key, _URL_TEMPLATE_MARK)
+    return data
+
+
+def compile_url(url, data):
+    """Format a user-defined URL with everything but per-request values.
+
+    :param data: the result of url_template_data()
+    :returns: a list alternating literal text with the names of the values
+              in URL_TEMPLATE_KEYS to be substituted between them by
+              render_url, or None if url is not a string.
+    :raises: keystone.exception.MalformedEndpoint
+
+    """
+    result = format_url(url, data)
+    if result is None:
+        return None
+    return result.split(_URL_TEMPLATE_MARK)
+
+
+def render_url(template, data):
+    """Substitute per-request values into a URL compiled by compile_url."""
+    if template is None:
+        return None
+    parts = list(template)
+    for i in range(1, len(parts), 2):
+        parts[i] = '%s' % data[parts[i]]
+    return ''.join(parts)
+
+
+def render_catalog(template, user_id, tenant_id):
+    """Build a catalog for get_catalog from a catalog template.
+
+    :param template: a nested dict of region and service type, holding a
+                     tuple of the service's static attributes and of its
+                     compiled URLs for each service.
+
+    """
+    data = {'tenant_id': tenant_id, 'user_id': user_id}
+    catalog = {}
+    for region, services in template.iteritems():
+        catalog[region] = {}
+        for service_type, (attrs, urls) in services.iteritems():
+            service = dict(attrs)
+            for key, url in urls.iteritems():
+                service[key] = render_url(url, data)
+            catalog[region][service_type] = service
+    return catalog
+
+
+def render_v3_catalog(template, user_id, tenant_id):
+    """Build a catalog for get_v3_catalog from a catalog template.
+
+    :param template: a catalog in the format returned by get_v3_catalog,
+                     with compiled endpoint URLs.
+
+    """
+    data = {'tenant_id': tenant_id, 'user_id': user_id}
+    catalog = []
+    for service in template:
+        service = dict(service)
+        service['endpoints'] = [
+            dict(endpoint, url=render_url(endpoint['url'], data))
+            for endpoint in service['endpoints']]
+        catalog.append(service)
+    return catalog
+
+
 @dependency.provider('catalog_api')
 class Manager(manager.Manager):
     """Default pivot point for the Catalog backend.
@@ -68,30 +147,55 @@ class Manager(manager.Manager):
     def __init__(self):
         super(Manager, self).__init__(CONF.catalog.driver)
 
+    def _invalidate_catalog_templates(self):
+        self.get_catalog_template.invalidate(self)
+        self.get_v3_catalog_template.invalidate(self)
+
+    def create_service(self, service_id, service_ref):
+        ret = self.driver.create_service(service_id, service_ref)
+        self._invalidate_catalog_templates()
+        return ret
+
     def get_service(self, service_id):
         try:
             return self.driver.get_service(service_id)
         except exception.NotFound:
             raise exception.ServiceNotFound(service_id=service_id)
 
+    def update_service(self, service_id, service_ref):
+        ret = self.driver.update_service(service_id, service_ref)
+        self._invalidate_catalog_templates()
+        return ret
+
     def delete_service(self, service_id):
         try:
-            return self.driver.delete_service(service_id)
+            ret = self.driver.delete_service(service_id)
         except exception.NotFound:
             raise exception.ServiceNotFound(service_id=service_id)
+        self._invalidate_catalog_templates()
+        return ret
 
     def create_endpoint(self, endpoint_id, endpoint_ref):
         try:
-            return self.driver.create_endpoint(endpoint_id, endpoint_ref)
+            ret = self.driver.create_endpoint(endpoint_id, endpoint_ref)
         except exception.NotFound:
             service_id = endpoint_ref.get('service_id')
             raise exception.ServiceNotFound(service_id=service_id)
+        self._invalidate_catalog_templates()
+        return ret
+
+    def update_endpoint(self, endpoint_id, endpoint_ref):
+        ret = self.driver.update_endpoint(endpoint_id, endpoint_ref)
+        self._invalidate_catalog_templates()
+        return ret
 
     def delete_endpoint(self, endpoint_id):
         try:
-            return self.driver.delete_endpoint(endpoint_id)
+            ret = self.driver.delete_endpoint(endpoint_id)
         except exception.NotFound:
             raise exception.EndpointNotFound(endpoint_id=endpoint_id)
+        self._invalidate_catalog_templates()
+        return ret
 
     def get_endpoint(self, endpoint_id):
         try:
@@ -99,12 +203,33 @@ class Manager(manager.Manager):
         except exception.NotFound:
             raise exception.EndpointNotFound(endpoint_id=endpoint_id)
 
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=CONF.catalog.cache_time)
+    def get_catalog_template(self):
+        return self.driver.get_catalog_template()
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=CONF.catalog.cache_time)
+    def get_v3_catalog_template(self):
+        return self.driver.get_v3_catalog_template()
+
     def get_catalog(self, user_id, tenant_id, metadata=None):
         try:
-            return self.driver.get_catalog(user_id, tenant_id, metadata)
+            try:
+                template = self.get_catalog_template()
+            except exception.NotImplemented:
+                return self.driver.get_catalog(user_id, tenant_id, metadata)
+            return render_catalog(template, user_id, tenant_id)
         except exception.NotFound:
             raise exception.NotFound('Catalog not found for user and tenant')
 
+    def get_v3_catalog(self, user_id, tenant_id, metadata=None):
+        try:
+            template = self.get_v3_catalog_template()
+        except exception.NotImplemented:
+            return self.driver.get_v3_catalog(user_id, tenant_id, metadata)
+        return render_v3_catalog(template, user_id, tenant_id)
+
 
 @six.add_metaclass(abc.ABCMeta)
 class Driver(object):
@@ -261,3 +386,31 @@ class Driver(object):
 
         """
         raise exception.NotImplemented()
+
+    def get_catalog_template(self):
+        """Retrieve the current service catalog, without per-request values.
+
+        The catalog is cached by the manager until a service or endpoint is
+        changed, and rendered with render_catalog for each request. Drivers
+        not implementing this are asked for get_catalog on every request.
+
+        :returns: A nested dict of region and service type, holding for each
+                  service a tuple of a dict of its static attributes and a
+                  dict of its URLs compiled with compile_url.
+
+        """
+        raise exception.NotImplemented()
+
+    def get_v3_catalog_template(self):
+        """Retrieve the current V3 service catalog, without per-request values.
+
+        The catalog is cached by the manager until a service or endpoint is
+        changed, and rendered with render_v3_catalog for each request.
+        Drivers not implementing this are asked for get_v3_catalog on every
+        request.
+
+        :returns: A list in the format returned by get_v3_catalog, with
+                  endpoint URLs compiled with compile_url.
+
+        """
+        raise exception.NotImplemented()
@@ -17,17 +17,21 @@
 from __future__ import absolute_import
 
 import os
+import time
 
 from migrate import exceptions
 
 from oslo.config import cfg
 import pbr.version
 
+from keystone import assignment
+from keystone.common import dependency
 from keystone.common import openssl
 from keystone.common.sql import migration
 from keystone.common import utils
 from keystone import config
 from keystone import contrib
+from keystone import identity
 from keystone.openstack.common import importutils
 from keystone import token
 
@@ -153,6 +157,20 @@ class BaseCertificateSetup(BaseApp):
         return keystone_user_id, keystone_group_id
 
 
+class EffectiveRolesRebuild(BaseApp):
+    """Recompute the materialized effective role assignments."""
+
+    name = 'effective_roles_rebuild'
+
+    @staticmethod
+    def main():
+        identity.Manager()
+        assignment_manager = assignment.Manager()
+        dependency.resolve_future_dependencies()
+        rebuilt = assignment_manager.driver.rebuild_effective_roles()
+        print(_('Stored %d effective role assignments.') % rebuilt)
+
+
 class PKISetup(BaseCertificateSetup):
     """Set up Key pairs and certificates for token signing and verification."""
 
@@ -182,15 +200,49 @@ class TokenFlush(BaseApp):
 
     name = 'token_flush'
 
+    @classmethod
+    def add_argument_parser(cls, subparsers):
+        parser = super(TokenFlush, cls).add_argument_parser(subparsers)
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help=('Remove expired tokens this many at a time, '
+                                  'each batch in its own transaction. If not '
+                                  'provided, all expired tokens are removed '
+                                  'at once.'))
+        parser.add_argument('--batch-delay', type=float, default=0,
+                            help=('Seconds to sleep between batches, to '
+                                  'leave room for concurrent requests.'))
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help='Only count the expired tokens.')
+        parser.add_argument('--archive', action='store_true', default=False,
+                            help=('Copy the expired tokens into the '
+                                  'token_archive table before removing '
+                                  'them.'))
+        return parser
+
     @classmethod
     def main(cls):
         token_manager = token.Manager()
-        token_manager.driver.flush_expired_tokens()
+        start = time.time()
+        flushed = token_manager.driver.flush_expired_tokens(
+            batch_size=CONF.command.batch_size,
+            batch_delay=CONF.command.batch_delay,
+            dry_run=CONF.command.dry_run,
+            archive=CONF.command.archive)
+        if CONF.command.dry_run:
+            print(_('%d expired tokens would be flushed.') % flushed)
+            return
+        elapsed = time.time() - start
+        print(_('Flushed %(flushed)d expired tokens in %(elapsed).1f seconds '
+                '(%(rate)d tokens/sec).') %
+              {'flushed': flushed,
+               'elapsed': elapsed,
+               'rate': flushed / elapsed if elapsed else flushed})
 
 
 CMDS = [
     DbSync,
     DbVersion,
+    EffectiveRolesRebuild,
     PKISetup,
     SSLSetup,
     TokenFlush,
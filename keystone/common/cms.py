@@ -14,29 +14,65 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
 import hashlib
+import zlib
+
+try:
+    from Crypto.Hash import SHA256
+    from Crypto.PublicKey import RSA
+    from Crypto.Signature import PKCS1_v1_5
+except ImportError:
+    RSA = None
 
 from keystone.common import environment
+from keystone.common import pemutils
 from keystone.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 PKI_ANS1_PREFIX = 'MII'
+PKIZ_PREFIX = 'PKIZ_'
+
+# DER encoded object identifiers and tags used to build the CMS SignedData
+# structure emitted by ``openssl cms -sign -nosmimecap -nodetach -nocerts
+# -noattr``.
+_OID_SIGNED_DATA = '\x06\x09\x2a\x86\x48\x86\xf7\x0d\x01\x07\x02'
+_OID_DATA = '\x06\x09\x2a\x86\x48\x86\xf7\x0d\x01\x07\x01'
+_OID_SHA256 = '\x06\x09\x60\x86\x48\x01\x65\x03\x04\x02\x01'
+_OID_RSA_ENCRYPTION = '\x06\x09\x2a\x86\x48\x86\xf7\x0d\x01\x01\x01'
+_DER_NULL = '\x05\x00'
+_DER_INTEGER = 0x02
+_DER_OCTET_STRING = 0x04
+_DER_SEQUENCE = 0x30
+_DER_SET = 0x31
+_DER_CONTEXT_0 = 0xa0
 
 
 def cms_verify(formatted, signing_cert_file_name, ca_file_name):
     """Verifies the signature of the contents IAW CMS syntax."""
+    return _cms_verify(formatted, signing_cert_file_name, ca_file_name,
+                       ["-inform", "PEM"])
+
+
+def cms_verify_data(signed_data, signing_cert_file_name, ca_file_name):
+    """Verifies a DER formatted CMS document signing binary content."""
+    return _cms_verify(signed_data, signing_cert_file_name, ca_file_name,
+                       ["-inform", "DER", "-binary"])
+
+
+def _cms_verify(signed, signing_cert_file_name, ca_file_name, format_args):
     process = environment.subprocess.Popen(["openssl", "cms", "-verify",
                                             "-certfile",
                                             signing_cert_file_name,
-                                            "-CAfile", ca_file_name,
-                                            "-inform", "PEM",
-                                            "-nosmimecap", "-nodetach",
+                                            "-CAfile", ca_file_name] +
+                                           format_args +
+                                           ["-nosmimecap", "-nodetach",
                                             "-nocerts", "-noattr"],
                                            stdin=environment.subprocess.PIPE,
                                            stdout=environment.subprocess.PIPE,
                                            stderr=environment.subprocess.PIPE)
-    output, err = process.communicate(formatted)
+    output, err = process.communicate(signed)
     retcode = process.poll()
     if retcode:
         LOG.error(_('Verify error: %s'), err)
@@ -70,6 +106,22 @@ def verify_token(token, signing_cert_file_name, ca_file_name):
                       ca_file_name)
 
 
+def compressed_token_to_cms(token):
+    """Return the DER formatted CMS document carried by a PKIZ token."""
+    return base64.urlsafe_b64decode(str(token[len(PKIZ_PREFIX):]))
+
+
+def verify_compressed_token(token, signing_cert_file_name, ca_file_name):
+    """Verifies a PKIZ token, returning the decompressed token data.
+
+    The content is only inflated once its signature has been verified.
+    """
+    compressed = cms_verify_data(compressed_token_to_cms(token),
+                                 signing_cert_file_name,
+                                 ca_file_name)
+    return zlib.decompress(compressed)
+
+
 def is_ans1_token(token):
     """Determine if a token appears to be PKI-based.
 
@@ -113,21 +165,44 @@ def is_ans1_token(token):
     return token[:3] == PKI_ANS1_PREFIX
 
 
+def is_pkiz_token(token):
+    """Determine if a token is a compressed PKI (PKIZ) token.
+
+    PKIZ tokens are a URL safe base64 encoding of a DER formatted CMS
+    document, signing the zlib compressed token data, behind PKIZ_PREFIX.
+    """
+    return token[:len(PKIZ_PREFIX)] == PKIZ_PREFIX
+
+
 def cms_sign_text(text, signing_cert_file_name, signing_key_file_name):
     """Uses OpenSSL to sign a document
     Produces a Base64 encoding of a DER formatted CMS Document
     http://en.wikipedia.org/wiki/Cryptographic_Message_Syntax
     """
+    return _cms_sign(text, signing_cert_file_name, signing_key_file_name,
+                     ["-outform", "PEM"])
+
+
+def cms_sign_data(data, signing_cert_file_name, signing_key_file_name):
+    """Uses OpenSSL to sign binary data, producing a DER formatted CMS
+    Document. Unlike cms_sign_text, line endings in data are left alone.
+    """
+    return _cms_sign(data, signing_cert_file_name, signing_key_file_name,
+                     ["-outform", "DER", "-binary"])
+
+
+def _cms_sign(data, signing_cert_file_name, signing_key_file_name,
+              format_args):
     process = environment.subprocess.Popen(["openssl", "cms", "-sign",
                                             "-signer", signing_cert_file_name,
-                                            "-inkey", signing_key_file_name,
-                                            "-outform", "PEM",
-                                            "-nosmimecap", "-nodetach",
+                                            "-inkey", signing_key_file_name] +
+                                           format_args +
+                                           ["-nosmimecap", "-nodetach",
                                             "-nocerts", "-noattr"],
                                            stdin=environment.subprocess.PIPE,
                                            stdout=environment.subprocess.PIPE,
                                            stderr=environment.subprocess.PIPE)
-    output, err = process.communicate(text)
+    output, err = process.communicate(data)
     retcode = process.poll()
     if retcode or "Error" in err:
         if retcode == 3:
@@ -145,6 +220,163 @@ def cms_sign_token(text, signing_cert_file_name, signing_key_file_name):
     return cms_to_token(output)
 
 
+def cms_to_compressed_token(signed_data):
+    """Return the PKIZ token for a DER formatted CMS document."""
+    return PKIZ_PREFIX + base64.urlsafe_b64encode(signed_data)
+
+
+def _der_encode(tag, content):
+    length = len(content)
+    if length < 0x80:
+        encoded_length = chr(length)
+    else:
+        encoded_length = ''
+        while length:
+            encoded_length = chr(length & 0xff) + encoded_length
+            length >>= 8
+        encoded_length = chr(0x80 | len(encoded_length)) + encoded_length
+    return chr(tag) + encoded_length + content
+
+
+def _der_element(data, offset):
+    """Return the (tag, start, end) of the DER element found at offset.
+
+    ``start`` is the offset of the element's contents and ``end`` the offset
+    just past them. ``data`` must be a bytearray.
+    """
+    tag = data[offset]
+    length = data[offset + 1]
+    start = offset + 2
+    if length & 0x80:
+        num_octets = length & 0x7f
+        length = 0
+        for octet in data[start:start + num_octets]:
+            length = (length << 8) | octet
+        start += num_octets
+    return tag, start, start + length
+
+
+def _issuer_and_serial_number(cert_der):
+    """Build the IssuerAndSerialNumber identifying a signer certificate."""
+    data = bytearray(cert_der)
+    # Certificate ::= SEQUENCE { tbsCertificate, ... }
+    _tag, offset, _end = _der_element(data, 0)
+    _tag, offset, _end = _der_element(data, offset)
+    # skip the optional explicitly tagged version
+    tag, _start, end = _der_element(data, offset)
+    if tag == _DER_CONTEXT_0:
+        offset = end
+    _tag, _start, serial_end = _der_element(data, offset)
+    serial = cert_der[offset:serial_end]
+    # skip the signature AlgorithmIdentifier
+    _tag, _start, offset = _der_element(data, serial_end)
+    _tag, _start, issuer_end = _der_element(data, offset)
+    issuer = cert_der[offset:issuer_end]
+    return _der_encode(_DER_SEQUENCE, issuer + serial)
+
+
+class SubprocessSigner(object):
+    """Signs tokens by running ``openssl cms -sign`` for each token."""
+
+    def __init__(self, signing_cert_file_name, signing_key_file_name):
+        self.signing_cert_file_name = signing_cert_file_name
+        self.signing_key_file_name = signing_key_file_name
+
+    def sign_token(self, text):
+        return cms_sign_token(text,
+                              self.signing_cert_file_name,
+                              self.signing_key_file_name)
+
+    def sign_data(self, data):
+        """Return the DER encoded CMS SignedData document for data."""
+        return cms_sign_data(data,
+                             self.signing_cert_file_name,
+                             self.signing_key_file_name)
+
+    def sign_compressed_token(self, text):
+        """Return a PKIZ token, signing the zlib compressed text."""
+        return cms_to_compressed_token(self.sign_data(zlib.compress(text)))
+
+    def verify_token(self, token, ca_file_name):
+        return verify_token(token, self.signing_cert_file_name, ca_file_name)
+
+    def verify_compressed_token(self, token, ca_file_name):
+        return verify_compressed_token(token, self.signing_cert_file_name,
+                                       ca_file_name)
+
+
+class InProcessSigner(SubprocessSigner):
+    """Signs tokens in process using a signing key loaded once.
+
+    Produces the same CMS SignedData document as ``openssl cms -sign`` (with
+    a SHA-256 digest) without forking a process per token. Requires
+    pycrypto; use ``load_signer`` to fall back to ``SubprocessSigner`` when
+    it is not available.
+    """
+
+    def __init__(self, signing_cert_file_name, signing_key_file_name):
+        super(InProcessSigner, self).__init__(signing_cert_file_name,
+                                              signing_key_file_name)
+        if RSA is None:
+            raise ImportError('pycrypto is required for in process signing')
+
+        with open(signing_cert_file_name) as f:
+            cert_der = pemutils.get_pem_data(f.read(), 'cert')
+        if cert_der is None:
+            raise ValueError('No certificate found in %s' %
+                             signing_cert_file_name)
+        with open(signing_key_file_name) as f:
+            key = RSA.importKey(f.read())
+
+        self._signer = PKCS1_v1_5.new(key)
+        self._signer_info_prefix = (
+            '\x02\x01\x01' +
+            _issuer_and_serial_number(cert_der) +
+            _der_encode(_DER_SEQUENCE, _OID_SHA256) +
+            _der_encode(_DER_SEQUENCE, _OID_RSA_ENCRYPTION + _DER_NULL))
+
+    def sign_text(self, text):
+        """Return the DER encoded CMS SignedData document for text."""
+        signature = self._signer.sign(SHA256.new(text))
+        signer_info = _der_encode(
+            _DER_SEQUENCE,
+            self._signer_info_prefix +
+            _der_encode(_DER_OCTET_STRING, signature))
+        encap_content_info = _der_encode(
+            _DER_SEQUENCE,
+            _OID_DATA +
+            _der_encode(_DER_CONTEXT_0,
+                        _der_encode(_DER_OCTET_STRING, text)))
+        signed_data = _der_encode(
+            _DER_SEQUENCE,
+            '\x02\x01\x01' +
+            _der_encode(_DER_SET, _der_encode(_DER_SEQUENCE, _OID_SHA256)) +
+            encap_content_info +
+            _der_encode(_DER_SET, signer_info))
+        return _der_encode(
+            _DER_SEQUENCE,
+            _OID_SIGNED_DATA + _der_encode(_DER_CONTEXT_0, signed_data))
+
+    def sign_token(self, text):
+        # equivalent to cms_to_token() applied to the PEM form of the document
+        return base64.b64encode(self.sign_text(text)).replace('/', '-')
+
+    def sign_data(self, data):
+        # content is signed as is, like openssl does with -binary
+        return self.sign_text(data)
+
+
+def load_signer(signer_class, signing_cert_file_name, signing_key_file_name):
+    """Instantiate a token signer, falling back to ``SubprocessSigner``."""
+    try:
+        return signer_class(signing_cert_file_name, signing_key_file_name)
+    except Exception as e:
+        LOG.warning(_('Unable to load token signer %(signer)s, falling back '
+                      'to openssl subprocess signing: %(error)s'),
+                    {'signer': signer_class.__name__, 'error': e})
+        return SubprocessSigner(signing_cert_file_name, signing_key_file_name)
+
+
 def cms_to_token(cms_text):
 
     start_delim = "-----BEGIN CMS-----"
@@ -161,12 +393,12 @@ def cms_to_token(cms_text):
 def cms_hash_token(token_id):
     """Hash PKI tokens.
 
-    return: for ans1_token, returns the hash of the passed in token
+    return: for ans1 and pkiz tokens, returns the hash of the passed in token
             otherwise, returns what it was passed in.
     """
     if token_id is None:
         return None
-    if is_ans1_token(token_id):
+    if is_ans1_token(token_id) or is_pkiz_token(token_id):
         hasher = hashlib.md5()
         hasher.update(token_id)
         return hasher.hexdigest()
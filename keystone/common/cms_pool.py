@@ -0,0 +1,279 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Pool of long-lived worker processes for CMS signing and verification.
+
+Each worker is a separate python process started once and fed requests over
+its stdin/stdout pipes. Workers sign and verify by running openssl, like
+``cms.SubprocessSigner``, so no crypto library is loaded into keystone; but
+openssl is forked by a small worker rather than by the keystone process, and
+the number of concurrent openssl processes is bounded by the pool size.
+
+Workers are started with ``[DEFAULT] worker_python``, or the interpreter
+running keystone if that is not set.
+
+Messages are JSON documents framed by their length on a line of its own.
+"""
+
+import sys
+import time
+
+from six.moves import queue
+
+from keystone.common import cms
+from keystone.common import environment
+from keystone import config
+from keystone import exception
+from keystone.openstack.common import jsonutils
+from keystone.openstack.common import log as logging
+
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+POOL_STATS_LOG_INTERVAL = 60
+
+# gettextutils.install() must run before keystone modules are imported
+_WORKER_COMMAND = ('from keystone.openstack.common import gettextutils; '
+                   'gettextutils.install("keystone"); '
+                   'from keystone.common import cms_pool; '
+                   'cms_pool.main()')
+
+
+def write_message(stream, message):
+    data = jsonutils.dumps(message)
+    stream.write('%d\n%s' % (len(data), data))
+    stream.flush()
+
+
+def read_message(stream):
+    length = stream.readline()
+    if not length:
+        return None
+    data = stream.read(int(length))
+    if len(data) != int(length):
+        return None
+    return jsonutils.loads(data)
+
+
+class Worker(object):
+    """A single worker process and its request counters."""
+
+    name = 'CMS'
+    command = _WORKER_COMMAND
+
+    def __init__(self):
+        self.process = None
+        self.requests = 0
+        self.failures = 0
+        self.restarts = 0
+        self.start()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def start(self):
+        # under mod_wsgi sys.executable is the web server, not python
+        self.process = environment.subprocess.Popen(
+            [CONF.worker_python or sys.executable, '-c', self.command],
+            stdin=environment.subprocess.PIPE,
+            stdout=environment.subprocess.PIPE)
+
+    def restart(self):
+        self.stop()
+        self.restarts += 1
+        self.start()
+
+    def stop(self):
+        try:
+            self.process.stdin.close()
+            self.process.kill()
+            self.process.wait()
+        except (IOError, OSError):
+            pass
+
+    def call(self, request):
+        """Send a request and wait for its response.
+
+        :raises: IOError if the worker process died
+        """
+        try:
+            write_message(self.process.stdin, request)
+            response = read_message(self.process.stdout)
+        except ValueError:
+            response = None
+        if response is None:
+            raise IOError('%s worker %s exited' % (self.name, self.pid))
+        self.requests += 1
+        if 'error' in response:
+            self.failures += 1
+            raise self.error(response)
+        return response['result']
+
+    def error(self, response):
+        """Build the exception to raise for an error response."""
+        return environment.subprocess.CalledProcessError(
+            response.get('returncode') or 1, 'openssl',
+            output=response['error'])
+
+
+class WorkerPool(object):
+    """A bounded set of workers handed out to one request at a time.
+
+    Requests wait up to ``timeout`` seconds for an idle worker, so a
+    saturated pool fails fast instead of queueing without bound; ``waiting``
+    is the number of requests currently queued. A worker that dies is
+    restarted and the request is retried once on the fresh process; if that
+    fails as well the request fails with an ``UnexpectedError``.
+
+    The statistics returned by ``stats()`` are logged at debug level as
+    workers are returned, at most once every POOL_STATS_LOG_INTERVAL seconds.
+    """
+
+    worker_class = Worker
+    exhausted_message = _('Token signing capacity exhausted.')
+
+    def __init__(self, size, timeout):
+        self.timeout = timeout
+        self.waiting = 0
+        self._stats_logged_at = time.time()
+        self.workers = [self.worker_class() for _i in range(size)]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def call(self, request):
+        self.waiting += 1
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            LOG.warning(_('All %(size)d %(name)s workers are busy, '
+                          '%(waiting)d requests waiting'),
+                        {'size': len(self.workers),
+                         'name': self.worker_class.name,
+                         'waiting': self.waiting})
+            raise exception.UnexpectedError(self.exhausted_message)
+        finally:
+            self.waiting -= 1
+        try:
+            try:
+                return worker.call(request)
+            except IOError:
+                LOG.warning(_('%(name)s worker %(pid)s died, restarting it'),
+                            {'name': worker.name, 'pid': worker.pid})
+                worker.restart()
+                try:
+                    return worker.call(request)
+                except IOError as e:
+                    LOG.error(e)
+                    raise exception.UnexpectedError(self.exhausted_message)
+        finally:
+            self._idle.put(worker)
+            self._log_stats()
+
+    def _log_stats(self):
+        now = time.time()
+        if now - self._stats_logged_at < POOL_STATS_LOG_INTERVAL:
+            return
+        self._stats_logged_at = now
+        LOG.debug(_('%(name)s worker pool: %(stats)s'),
+                  {'name': self.worker_class.name, 'stats': self.stats()})
+
+    def stats(self):
+        """Returns the queue depth and each worker's request counters."""
+        return {'size': len(self.workers),
+                'idle': self._idle.qsize(),
+                'waiting': self.waiting,
+                'workers': [{'pid': worker.pid,
+                             'requests': worker.requests,
+                             'failures': worker.failures,
+                             'restarts': worker.restarts}
+                            for worker in self.workers]}
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+class PooledSigner(cms.SubprocessSigner):
+    """Signs and verifies tokens using a pool of worker processes.
+
+    The pool size and the time to wait for an idle worker come from
+    ``[signing] pool_size`` and ``[signing] pool_timeout``.
+    """
+
+    def __init__(self, signing_cert_file_name, signing_key_file_name):
+        super(PooledSigner, self).__init__(signing_cert_file_name,
+                                           signing_key_file_name)
+        self.pool = WorkerPool(CONF.signing.pool_size,
+                               CONF.signing.pool_timeout)
+
+    def sign_token(self, text):
+        token_id = self.pool.call({'method': 'sign_token',
+                                   'text': text,
+                                   'certfile': self.signing_cert_file_name,
+                                   'keyfile': self.signing_key_file_name})
+        return str(token_id)
+
+    def sign_compressed_token(self, text):
+        token_id = self.pool.call({'method': 'sign_compressed_token',
+                                   'text': text,
+                                   'certfile': self.signing_cert_file_name,
+                                   'keyfile': self.signing_key_file_name})
+        return str(token_id)
+
+    def verify_token(self, token, ca_file_name):
+        return self.pool.call({'method': 'verify_token',
+                               'token': token,
+                               'certfile': self.signing_cert_file_name,
+                               'ca_certs': ca_file_name})
+
+    def verify_compressed_token(self, token, ca_file_name):
+        return self.pool.call({'method': 'verify_compressed_token',
+                               'token': token,
+                               'certfile': self.signing_cert_file_name,
+                               'ca_certs': ca_file_name})
+
+
+def _handle(request):
+    if request['method'] in ('sign_token', 'sign_compressed_token'):
+        signer = cms.SubprocessSigner(request['certfile'],
+                                      request['keyfile'])
+        sign = getattr(signer, request['method'])
+        return sign(request['text'].encode('utf-8'))
+    elif request['method'] in ('verify_token', 'verify_compressed_token'):
+        verify = getattr(cms, request['method'])
+        return verify(request['token'].encode('utf-8'),
+                      request['certfile'],
+                      request['ca_certs'])
+    raise ValueError('Unknown method %s' % request['method'])
+
+
+def main():
+    environment.use_stdlib()
+    while True:
+        request = read_message(sys.stdin)
+        if request is None:
+            break
+        try:
+            response = {'result': _handle(request)}
+        except environment.subprocess.CalledProcessError as e:
+            response = {'error': e.output or str(e),
+                        'returncode': e.returncode}
+        except Exception as e:
+            response = {'error': str(e)}
+        write_message(sys.stdout, response)
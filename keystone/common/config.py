@@ -49,7 +49,11 @@ FILE_OPTIONS = {
         cfg.StrOpt('member_role_id',
                    default='9fe2ff9ee4384b1894a90878d3e92bab'),
         cfg.StrOpt('member_role_name', default='_member_'),
-        cfg.IntOpt('crypt_strength', default=40000)],
+        cfg.IntOpt('crypt_strength', default=40000),
+        cfg.IntOpt('crypt_pool_size', default=0),
+        cfg.IntOpt('crypt_pool_timeout', default=30),
+        cfg.StrOpt('worker_python', default=None),
+        cfg.IntOpt('list_limit', default=None)],
     'identity': [
         cfg.StrOpt('default_domain_id', default='default'),
         cfg.BoolOpt('domain_specific_drivers_enabled',
@@ -59,7 +63,11 @@ FILE_OPTIONS = {
         cfg.StrOpt('driver',
                    default=('keystone.identity.backends'
                             '.sql.Identity')),
-        cfg.IntOpt('max_password_length', default=4096)],
+        cfg.IntOpt('max_password_length', default=4096),
+        cfg.IntOpt('verified_password_cache_size', default=0),
+        cfg.IntOpt('verified_password_cache_ttl', default=300),
+        cfg.BoolOpt('caching', default=True),
+        cfg.IntOpt('cache_time', default=None)],
     'trust': [
         cfg.BoolOpt('enabled', default=True),
         cfg.StrOpt('driver',
@@ -112,6 +120,10 @@ FILE_OPTIONS = {
                    default='/C=US/ST=Unset/L=Unset/O=Unset/CN=localhost')],
     'signing': [
         cfg.StrOpt('token_format', default=None),
+        cfg.StrOpt('signer',
+                   default='keystone.common.cms.SubprocessSigner'),
+        cfg.IntOpt('pool_size', default=4),
+        cfg.IntOpt('pool_timeout', default=10),
         cfg.StrOpt('certfile',
                    default="/etc/keystone/ssl/certs/signing_cert.pem"),
         cfg.StrOpt('keyfile',
@@ -128,14 +140,23 @@ FILE_OPTIONS = {
     'sql': [
         cfg.StrOpt('connection', secret=True,
                    default='sqlite:///keystone.db'),
-        cfg.IntOpt('idle_timeout', default=200)],
+        cfg.IntOpt('idle_timeout', default=200),
+        cfg.IntOpt('pool_size', default=None),
+        cfg.IntOpt('max_overflow', default=None),
+        cfg.IntOpt('pool_timeout', default=None),
+        cfg.IntOpt('ping_idle_threshold', default=10),
+        cfg.StrOpt('slave_connection', secret=True, default=None),
+        cfg.IntOpt('slave_max_lag', default=None),
+        cfg.IntOpt('slave_retry_interval', default=60),
+        cfg.BoolOpt('use_tpool', default=False)],
     'assignment': [
         # assignment has no default for backward compatibility reasons.
         # If assignment driver is not specified, the identity driver chooses
         # the backend
         cfg.StrOpt('driver', default=None),
         cfg.BoolOpt('caching', default=True),
-        cfg.IntOpt('cache_time', default=None)],
+        cfg.IntOpt('cache_time', default=None),
+        cfg.BoolOpt('materialize_effective_roles', default=False)],
     'credential': [
         cfg.StrOpt('driver',
                    default=('keystone.credential.backends'
@@ -147,7 +168,9 @@ FILE_OPTIONS = {
         cfg.IntOpt('access_token_duration', default=86400)],
     'policy': [
         cfg.StrOpt('driver',
-                   default='keystone.policy.backends.sql.Policy')],
+                   default='keystone.policy.backends.sql.Policy'),
+        cfg.IntOpt('reload_interval', default=1),
+        cfg.IntOpt('decision_cache_size', default=0)],
     'ec2': [
         cfg.StrOpt('driver',
                    default='keystone.contrib.ec2.backends.kvs.Ec2')],
@@ -242,7 +265,17 @@ FILE_OPTIONS = {
         cfg.StrOpt('tls_cacertfile', default=None),
         cfg.StrOpt('tls_cacertdir', default=None),
         cfg.BoolOpt('use_tls', default=False),
-        cfg.StrOpt('tls_req_cert', default='demand')],
+        cfg.StrOpt('tls_req_cert', default='demand'),
+
+        cfg.BoolOpt('use_pool', default=False),
+        cfg.IntOpt('pool_size', default=10),
+        cfg.IntOpt('pool_retry_max', default=3),
+        cfg.FloatOpt('pool_retry_delay', default=0.1),
+        cfg.IntOpt('pool_idle_timeout', default=600),
+        cfg.IntOpt('pool_connection_timeout', default=10),
+        cfg.BoolOpt('use_auth_pool', default=False),
+        cfg.IntOpt('auth_pool_size', default=100),
+        cfg.IntOpt('auth_pool_idle_timeout', default=60)],
     'pam': [
         cfg.StrOpt('userid', default=None),
         cfg.StrOpt('password', default=None)],
@@ -259,12 +292,16 @@ FILE_OPTIONS = {
         cfg.StrOpt('config_file', default=None)],
     'memcache': [
         cfg.ListOpt('servers', default=['localhost:11211']),
-        cfg.IntOpt('max_compare_and_set_retry', default=16)],
+        cfg.IntOpt('max_compare_and_set_retry', default=16),
+        cfg.IntOpt('user_index_shards', default=1),
+        cfg.IntOpt('previous_user_index_shards', default=None)],
     'catalog': [
         cfg.StrOpt('template_file',
                    default='default_catalog.templates'),
         cfg.StrOpt('driver',
-                   default='keystone.catalog.backends.sql.Catalog')],
+                   default='keystone.catalog.backends.sql.Catalog'),
+        cfg.BoolOpt('caching', default=True),
+        cfg.IntOpt('cache_time', default=None)],
     'kvs': [
         cfg.ListOpt('backends', default=[]),
         cfg.StrOpt('config_prefix', default='keystone.kvs'),
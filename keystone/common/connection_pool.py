@@ -0,0 +1,111 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import time
+
+from keystone import exception
+from keystone.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class ConnectionPool(object):
+    """A bounded pool of open connections.
+
+    The most recently released connection is handed out first. Connections
+    left idle for longer than idle_timeout seconds (unless it is negative)
+    are closed rather than reused. When size connections are already in
+    use, callers wait up to connection_timeout seconds (forever if it is
+    negative) for one to be released.
+
+    Subclasses name the kind of connection and override _close() to close
+    one without raising.
+
+    """
+
+    name = 'pooled'
+
+    def __init__(self, size, idle_timeout, connection_timeout=-1):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.connection_timeout = connection_timeout
+        self._idle = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, connect):
+        """Return an idle connection, or one made by calling connect().
+
+        :raises: keystone.exception.UnexpectedError if no connection was
+                 released within connection_timeout seconds
+
+        """
+        expired = []
+        deadline = None
+        if self.connection_timeout >= 0:
+            deadline = time.time() + self.connection_timeout
+        try:
+            with self._cond:
+                while True:
+                    now = time.time()
+                    while self._idle:
+                        conn, released_at = self._idle.pop()
+                        if (self.idle_timeout < 0 or
+                                now - released_at <= self.idle_timeout):
+                            self._in_use += 1
+                            return conn
+                        expired.append(conn)
+                    if self._in_use < self.size:
+                        self._in_use += 1
+                        break
+                    if deadline is None:
+                        self._cond.wait()
+                    elif now < deadline:
+                        self._cond.wait(deadline - now)
+                    else:
+                        LOG.warning(_('All %(size)d %(name)s connections are '
+                                      'in use'),
+                                    {'size': self.size, 'name': self.name})
+                        raise exception.UnexpectedError(
+                            _('No %s connection available.') % self.name)
+        finally:
+            for conn in expired:
+                self._close(conn)
+
+        try:
+            return connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, time.time()))
+            self._cond.notify()
+
+    def discard(self, conn):
+        self._close(conn)
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def _close(self, conn):
+        conn.close()
@@ -16,9 +16,11 @@
 
 import collections
 import functools
+import urllib
 import uuid
 
 from keystone.common import dependency
+from keystone.common import driver_hints
 from keystone.common import wsgi
 from keystone import config
 from keystone import exception
@@ -84,9 +86,13 @@ def _build_policy_check_credentials(self, action, context, kwargs):
             creds['project_id'] = token_ref['tenant'].get('id')
         except AttributeError:
             LOG.debug(_('RBAC: Proceeding without tenant'))
-        # NOTE(vish): this is pretty inefficient
-        creds['roles'] = [self.assignment_api.get_role(role)['name']
-                          for role in creds.get('roles', [])]
+        # role names are recorded when the token is issued; tokens issued
+        # before that only carry role ids
+        role_names = creds.pop('role_names', None)
+        if role_names is None:
+            role_names = self.assignment_api.get_role_names(
+                creds.get('roles', []))
+        creds['roles'] = role_names
 
     return creds
 
@@ -343,6 +349,10 @@ class V3Controller(V2Controller):
     member_name = 'entity'
     get_member_from_driver = None
 
+    def _get_response_code(self, req):
+        if req.environ['REQUEST_METHOD'] == 'POST':
+            return (201, 'Created')
+
     def _delete_tokens_for_group(self, group_id):
         user_refs = self.identity_api.list_users_in_group(group_id)
         for user in user_refs:
@@ -374,11 +384,22 @@ class V3Controller(V2Controller):
         return {cls.member_name: ref}
 
     @classmethod
-    def wrap_collection(cls, context, refs, filters=[]):
-        for f in filters:
-            refs = cls.filter_by_attribute(context, refs, f)
+    def wrap_collection(cls, context, refs, filters=[], hints=None):
+        """Wraps a list of references as a collection.
+
+        If hints were passed to the driver, the filters it left in them are
+        applied here, and the page selected by marker and limit is returned
+        with links to its neighbours. Otherwise refs are filtered by the
+        query string attributes named in filters.
 
-        refs = cls.paginate(context, refs)
+        """
+        if hints is None:
+            for f in filters:
+                refs = cls.filter_by_attribute(context, refs, f)
+        else:
+            for f in hints.filters:
+                refs = cls.filter_by_attribute(context, refs, f['name'])
+            refs = hints.paginate(refs)
 
         for ref in refs:
             cls.wrap_member(context, ref)
@@ -388,17 +409,71 @@ class V3Controller(V2Controller):
             'next': None,
             'self': cls.base_url(path=context['path']),
             'previous': None}
+
+        if hints is not None and hints.pagination_requested and refs:
+            # a marker means there are entities on the side we came from
+            if hints.page_reverse:
+                has_next = hints.marker is not None
+                has_previous = hints.more
+            else:
+                has_next = hints.more
+                has_previous = hints.marker is not None
+            if has_next:
+                container['links']['next'] = cls._page_link(
+                    context, hints, refs[-1]['id'])
+            if has_previous:
+                container['links']['previous'] = cls._page_link(
+                    context, hints, refs[0]['id'], page_reverse=True)
         return container
 
     @classmethod
-    def paginate(cls, context, refs):
-        """Paginates a list of references by page & per_page query strings."""
-        # FIXME(dolph): client needs to support pagination first
-        return refs
+    def build_driver_hints(cls, context, supported_filters):
+        """Builds the hints for a driver's list call from the query string.
+
+        :param supported_filters: the attributes the caller may filter on
+        :raises: keystone.exception.ValidationError if limit is invalid
 
-        page = context['query_string'].get('page', 1)
-        per_page = context['query_string'].get('per_page', 30)
-        return refs[per_page * (page - 1):per_page * page]
+        """
+        query = context['query_string']
+        hints = driver_hints.Hints()
+        for attr in supported_filters:
+            if attr in query:
+                hints.add_filter(attr, query[attr])
+
+        limit = query.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                raise exception.ValidationError(
+                    message=_('limit must be a positive integer'))
+        if CONF.list_limit:
+            limit = min(limit or CONF.list_limit, CONF.list_limit)
+
+        hints.limit = limit
+        hints.marker = query.get('marker')
+        hints.page_reverse = query.get('page_reverse', '0') != '0'
+        return hints
+
+    @classmethod
+    def _page_link(cls, context, hints, marker, page_reverse=False):
+        query = dict(context['query_string'])
+        query.pop('page_reverse', None)
+        query['marker'] = marker
+        if hints.limit is not None:
+            query['limit'] = hints.limit
+        if page_reverse:
+            query['page_reverse'] = 1
+
+        params = []
+        for key, value in sorted(query.items()):
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            params.append((key, value))
+        return '%s?%s' % (cls.base_url(path=context['path']),
+                          urllib.urlencode(params))
 
     @classmethod
     def filter_by_attribute(cls, context, refs, attr):
@@ -0,0 +1,121 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Pool of long-lived worker processes for password hashing.
+
+sha512_crypt spends tens of milliseconds of CPU per password without
+releasing the GIL, stalling every other request on the same eventlet hub
+(a native thread pool would not help for the same reason). When
+``crypt_pool_size`` is set, ``keystone.common.utils`` hashes and verifies
+passwords in these workers instead, which speak the protocol of
+``keystone.common.cms_pool``.
+"""
+
+import sys
+
+import passlib.hash
+
+from keystone.common import cms_pool
+from keystone.common import environment
+from keystone import config
+
+
+CONF = config.CONF
+
+# gettextutils.install() must run before keystone modules are imported
+_WORKER_COMMAND = ('from keystone.openstack.common import gettextutils; '
+                   'gettextutils.install("keystone"); '
+                   'from keystone.common import crypt_pool; '
+                   'crypt_pool.main()')
+
+_POOL = None
+
+
+class Worker(cms_pool.Worker):
+    name = 'password hashing'
+    command = _WORKER_COMMAND
+
+    def error(self, response):
+        return ValueError(response['error'])
+
+
+class WorkerPool(cms_pool.WorkerPool):
+    """Workers hashing passwords, sized by ``crypt_pool_size``.
+
+    Requests wait up to ``crypt_pool_timeout`` seconds for an idle worker.
+    """
+
+    worker_class = Worker
+    exhausted_message = _('Password hashing capacity exhausted.')
+
+
+def get_pool():
+    global _POOL
+    if _POOL is None:
+        _POOL = WorkerPool(CONF.crypt_pool_size, CONF.crypt_pool_timeout)
+    return _POOL
+
+
+def get_pool_stats():
+    """Returns the pool's queue depth and worker counters, for monitoring.
+
+    Returns None if passwords are not hashed in a pool, or no password has
+    been hashed yet.
+
+    """
+    if _POOL is None:
+        return None
+    return _POOL.stats()
+
+
+def _call(request):
+    return get_pool().call(request)
+
+
+def hash_password(password_utf8, rounds):
+    return str(_call({'method': 'hash_password',
+                      'password': password_utf8.decode('utf-8'),
+                      'rounds': rounds}))
+
+
+def check_password(password_utf8, hashed):
+    return _call({'method': 'check_password',
+                  'password': password_utf8.decode('utf-8'),
+                  'hashed': hashed})
+
+
+def _handle(request):
+    password_utf8 = request['password'].encode('utf-8')
+    if request['method'] == 'hash_password':
+        return passlib.hash.sha512_crypt.encrypt(password_utf8,
+                                                 rounds=request['rounds'])
+    elif request['method'] == 'check_password':
+        return passlib.hash.sha512_crypt.verify(
+            password_utf8, request['hashed'].encode('utf-8'))
+    raise ValueError('Unknown method %s' % request['method'])
+
+
+def main():
+    environment.use_stdlib()
+    while True:
+        request = cms_pool.read_message(sys.stdin)
+        if request is None:
+            break
+        try:
+            response = {'result': _handle(request)}
+        except Exception as e:
+            response = {'error': str(e)}
+        cms_pool.write_message(sys.stdout, response)
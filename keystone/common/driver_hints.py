@@ -0,0 +1,88 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+class Hints(object):
+    """Filtering and pagination requested of a ``list_<entities>`` call.
+
+    The v3 controllers build a Hints object from the query string and pass
+    it down to the driver. A driver that can satisfy a filter in its own
+    query (a ``WHERE`` clause, an LDAP filter) removes it from ``filters``;
+    whatever remains is applied by the controller once the list returns.
+
+    A driver may only apply ``marker`` and ``limit`` once it has satisfied
+    every filter. It then sets ``paginated``, orders its results by id
+    (descending when ``page_reverse`` is set) and returns up to ``limit + 1``
+    entities, the extra one telling ``paginate()`` that another page exists.
+
+    """
+
+    def __init__(self, limit=None, marker=None, page_reverse=False):
+        self.filters = []
+        self.limit = limit
+        self.marker = marker
+        self.page_reverse = page_reverse
+        self.paginated = False
+        self.more = False
+
+    def add_filter(self, name, value):
+        self.filters.append({'name': name, 'value': value})
+
+    def remove_filter(self, filter_):
+        self.filters.remove(filter_)
+
+    def pop_filters(self, names):
+        """Removes and returns the filters on any of the given names.
+
+        A driver passes the attributes it can match in its own query; filters
+        on anything else stay behind for the controller.
+
+        """
+        popped = [filter_ for filter_ in self.filters
+                  if filter_['name'] in names]
+        for filter_ in popped:
+            self.remove_filter(filter_)
+        return popped
+
+    @property
+    def pagination_requested(self):
+        return self.limit is not None or self.marker is not None
+
+    def paginate(self, refs):
+        """Returns the page of refs selected by marker and limit.
+
+        If the driver did not paginate, the whole (filtered) list is ordered
+        and cut here. Either way ``more`` records whether entities remain
+        beyond the page, in the direction of travel.
+
+        """
+        if not self.pagination_requested:
+            return refs
+
+        if not self.paginated:
+            refs = sorted(refs, key=lambda ref: ref['id'],
+                          reverse=self.page_reverse)
+            if self.marker is not None and self.page_reverse:
+                refs = [ref for ref in refs if ref['id'] < self.marker]
+            elif self.marker is not None:
+                refs = [ref for ref in refs if ref['id'] > self.marker]
+
+        if self.limit is not None and len(refs) > self.limit:
+            self.more = True
+            refs = refs[:self.limit]
+        if self.page_reverse:
+            refs = refs[::-1]
+        return refs
@@ -15,10 +15,13 @@
 # under the License.
 
 import os.path
+import threading
+import time
 
 import ldap
 import ldap.filter
 
+from keystone.common import connection_pool
 from keystone import exception
 from keystone.openstack.common import log as logging
 
@@ -143,6 +146,15 @@ class BaseLdap(object):
         self.tls_cacertfile = conf.ldap.tls_cacertfile
         self.tls_cacertdir = conf.ldap.tls_cacertdir
         self.tls_req_cert = parse_tls_cert(conf.ldap.tls_req_cert)
+        self.use_pool = conf.ldap.use_pool
+        self.pool_size = conf.ldap.pool_size
+        self.pool_retry_max = conf.ldap.pool_retry_max
+        self.pool_retry_delay = conf.ldap.pool_retry_delay
+        self.pool_idle_timeout = conf.ldap.pool_idle_timeout
+        self.pool_connection_timeout = conf.ldap.pool_connection_timeout
+        self.use_auth_pool = conf.ldap.use_auth_pool
+        self.auth_pool_size = conf.ldap.auth_pool_size
+        self.auth_pool_idle_timeout = conf.ldap.auth_pool_idle_timeout
         self.attribute_mapping = {}
 
         if self.options_name is not None:
@@ -224,7 +236,61 @@ class BaseLdap(object):
             mapping[ldap_attr] = attr_map
         return mapping
 
+    def _pool_key(self, *credentials):
+        """Identifies the pool of connections opened with these settings.
+
+        Every setting _connect() opens a connection with is part of the key,
+        so that BaseLdap instances configured differently (as for different
+        domains) never share connections.
+
+        """
+        return ((self.LDAP_URL, self.page_size, self.alias_dereferencing,
+                 self.use_tls, self.tls_cacertfile, self.tls_cacertdir,
+                 self.tls_req_cert) + credentials)
+
     def get_connection(self, user=None, password=None):
+        """Returns a connection bound as user, or as the service user.
+
+        With use_pool, service connections come from a pool shared by every
+        BaseLdap with the same connection settings and service user, and
+        with use_auth_pool, connections bound as other users (as when
+        authenticating) come from a separate pool. Either way, callers hand
+        the connection back with unbind_s().
+
+        """
+        if user is not None or password is not None:
+            if not self.use_auth_pool:
+                return self._connect(user, password)
+            conn = PooledLdapConnection(
+                _get_pool(self._pool_key('auth'),
+                          self.auth_pool_size,
+                          self.auth_pool_idle_timeout,
+                          self.pool_connection_timeout),
+                self._connect_anonymous,
+                self.pool_retry_max,
+                self.pool_retry_delay)
+            try:
+                conn.simple_bind_s(user, password)
+            except Exception:
+                conn.unbind_s()
+                raise
+            return conn
+
+        if not self.use_pool:
+            return self._connect()
+        return PooledLdapConnection(
+            _get_pool(self._pool_key(self.LDAP_USER, self.LDAP_PASSWORD),
+                      self.pool_size,
+                      self.pool_idle_timeout,
+                      self.pool_connection_timeout),
+            self._connect,
+            self.pool_retry_max,
+            self.pool_retry_delay)
+
+    def _connect_anonymous(self):
+        return self._connect(user='', password='')
+
+    def _connect(self, user=None, password=None):
         handler = get_handler(self.LDAP_URL)
 
         conn = handler(self.LDAP_URL,
@@ -402,6 +468,34 @@ class BaseLdap(object):
         return [self._ldap_res_to_model(x)
                 for x in self._ldap_get_all(ldap_filter)]
 
+    def filter_query(self, hints):
+        """Builds an LDAP filter from driver hints, for get_all().
+
+        Equality filters on the id and on mapped attributes are added to the
+        configured filter and removed from hints. Enabled is left to the
+        caller, since it may be masked, inverted or emulated, and so is
+        domain_id, which is never stored: every entity is in the default
+        domain.
+
+        """
+        query = self.ldap_filter or ''
+        if hints is None:
+            return query
+
+        attrs = dict((name, attr)
+                     for name, attr in self.attribute_mapping.iteritems()
+                     if name not in ('domain_id', 'enabled', 'password') and
+                     name not in self.attribute_ignore)
+        attrs['id'] = self.id_attr
+        for filter_ in hints.pop_filters(attrs):
+            attr = attrs[filter_['name']]
+            value = filter_['value']
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            query += '(%s=%s)' % (attr, ldap.filter.escape_filter_chars(
+                py2ldap(value)))
+        return query
+
     def update(self, object_id, values, old_obj=None):
         if not self.allow_update:
             action = _('LDAP %s update') % self.options_name
@@ -662,6 +756,117 @@ class LdapWrapper(object):
         self.page_size = 0
 
 
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _get_pool(key, size, idle_timeout, connection_timeout):
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = LdapConnectionPool(size, idle_timeout,
+                                                    connection_timeout)
+        return pool
+
+
+class LdapConnectionPool(connection_pool.ConnectionPool):
+    """A bounded pool of open LDAP connections."""
+
+    name = 'LDAP'
+
+    def _close(self, conn):
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+
+class PooledLdapConnection(object):
+    """An LDAP connection borrowed from a ConnectionPool.
+
+    Supports the same operations as LdapWrapper, except that unbind_s()
+    returns the connection to the pool instead of closing it. A bind or
+    search failing with SERVER_DOWN is retried on a new connection, up to
+    retry_max times, retry_delay seconds apart. A write failing that way may
+    have been applied already, so it is never sent twice; instead the
+    connection is checked before the write, and replaced if it is dead.
+
+    """
+
+    def __init__(self, pool, connect, retry_max, retry_delay):
+        self._pool = pool
+        self._connect = connect
+        self._retry_max = retry_max
+        self._retry_delay = retry_delay
+        self._conn = None
+        self._retry(lambda conn: None)
+
+    def _retry(self, func):
+        attempt = 0
+        while True:
+            try:
+                if self._conn is None:
+                    self._conn = self._pool.acquire(self._connect)
+                return func(self._conn)
+            except ldap.SERVER_DOWN:
+                if self._conn is not None:
+                    self._pool.discard(self._conn)
+                    self._conn = None
+                if attempt >= self._retry_max:
+                    raise
+                attempt += 1
+                LOG.warning(_('LDAP server down, reconnecting (attempt '
+                              '%(attempt)d of %(retry_max)d)'),
+                            {'attempt': attempt,
+                             'retry_max': self._retry_max})
+                time.sleep(self._retry_delay)
+
+    def _call(self, name, *args, **kwargs):
+        return self._retry(lambda conn: getattr(conn, name)(*args, **kwargs))
+
+    @staticmethod
+    def _check_alive(conn):
+        try:
+            conn.search_s('', ldap.SCOPE_BASE, '(objectClass=*)', ['1.1'])
+        except ldap.SERVER_DOWN:
+            raise
+        except ldap.LDAPError:
+            # any answer at all shows that the connection works
+            pass
+
+    def _write(self, name, *args):
+        self._retry(self._check_alive)
+        try:
+            return getattr(self._conn, name)(*args)
+        except ldap.SERVER_DOWN:
+            self._pool.discard(self._conn)
+            self._conn = None
+            raise
+
+    def simple_bind_s(self, user, password):
+        return self._call('simple_bind_s', user, password)
+
+    def unbind_s(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+    def add_s(self, dn, attrs):
+        return self._write('add_s', dn, attrs)
+
+    def search_s(self, dn, scope, query, attrlist=None):
+        return self._call('search_s', dn, scope, query, attrlist)
+
+    def modify_s(self, dn, modlist):
+        return self._write('modify_s', dn, modlist)
+
+    def delete_s(self, dn):
+        return self._write('delete_s', dn)
+
+    def delete_ext_s(self, dn, serverctrls):
+        return self._write('delete_ext_s', dn, serverctrls)
+
+
 class EnabledEmuMixIn(BaseLdap):
     """Emulates boolean 'enabled' attribute if turned on.
 
@@ -17,6 +17,8 @@
 """SQL backends for the various services."""
 import contextlib
 import functools
+import threading
+import time
 
 import sqlalchemy as sql
 import sqlalchemy.engine.url
@@ -41,6 +43,14 @@ CONF = config.CONF
 GLOBAL_ENGINE = None
 GLOBAL_ENGINE_CALLBACKS = set()
 
+# engine for [sql] slave_connection, shared by all backends
+SLAVE_ENGINE = None
+# how often the replica's replication lag is measured, in seconds
+SLAVE_LAG_CHECK_INTERVAL = 5
+# how often the connection pool's statistics are logged, in seconds
+POOL_STATS_LOG_INTERVAL = 60
+_SLAVE_STATE = {'unavailable_until': 0, 'lag': None, 'lag_checked': 0}
+
 
 ModelBase = declarative.declarative_base()
 
@@ -51,6 +61,8 @@ Index = sql.Index
 String = sql.String
 ForeignKey = sql.ForeignKey
 DateTime = sql.DateTime
+Integer = sql.Integer
+BigInteger = sql.BigInteger
 IntegrityError = sql.exc.IntegrityError
 OperationalError = sql.exc.OperationalError
 NotFound = sql.orm.exc.NoResultFound
@@ -228,10 +240,281 @@ def db2_on_checkout(engine, dbapi_conn, connection_rec, connection_proxy):
             raise
 
 
+def ping_when_idle(ping):
+    """Wraps a checkout ping so only connections left idle are pinged.
+
+    Connections returned to the pool within ``[sql] ping_idle_threshold``
+    seconds are assumed to be alive, saving a round trip on most checkouts.
+    A connection that dies anyway, as when the database restarts, raises a
+    disconnect error on use: the request using it fails, and SQLAlchemy
+    discards the pool's connections so that later requests reconnect.
+
+    """
+    def on_checkout(dbapi_conn, connection_rec, connection_proxy):
+        checked_in = connection_rec.info.get('keystone_checked_in')
+        if (checked_in is not None and
+                time.time() - checked_in >= CONF.sql.ping_idle_threshold):
+            ping(dbapi_conn, connection_rec, connection_proxy)
+    return on_checkout
+
+
+def record_checkin(dbapi_conn, connection_rec):
+    if connection_rec is not None:
+        connection_rec.info['keystone_checked_in'] = time.time()
+
+
+class InstrumentedQueuePool(sqlalchemy.pool.QueuePool):
+    """QueuePool that counts checkouts and time spent waiting for one.
+
+    The statistics are logged at debug level as connections are returned,
+    at most once every POOL_STATS_LOG_INTERVAL seconds.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedQueuePool, self).__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._stats = {'checkouts': 0, 'waits': 0, 'wait_time': 0.0}
+        self._stats_logged = {'at': time.time()}
+        self._getting = threading.local()
+
+    def _exhausted(self):
+        return (self._max_overflow > -1 and
+                self.overflow() >= self._max_overflow and
+                self.checkedin() == 0)
+
+    def _do_get(self):
+        if not self._exhausted() or getattr(self._getting, 'active', False):
+            # QueuePool retries by calling itself; only count the outer call
+            with self._stats_lock:
+                self._stats['checkouts'] += 1
+            return super(InstrumentedQueuePool, self)._do_get()
+
+        start = time.time()
+        self._getting.active = True
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        finally:
+            self._getting.active = False
+            with self._stats_lock:
+                self._stats['checkouts'] += 1
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += time.time() - start
+
+    def recreate(self):
+        pool = super(InstrumentedQueuePool, self).recreate()
+        # keep counting across a dispose after a disconnect
+        pool._stats = self._stats
+        pool._stats_lock = self._stats_lock
+        pool._stats_logged = self._stats_logged
+        return pool
+
+    def _do_return_conn(self, conn):
+        super(InstrumentedQueuePool, self)._do_return_conn(conn)
+        now = time.time()
+        with self._stats_lock:
+            if now - self._stats_logged['at'] < POOL_STATS_LOG_INTERVAL:
+                return
+            self._stats_logged['at'] = now
+        LOG.debug(_('SQL connection pool: %s'), self.stats())
+
+    def stats(self):
+        """Returns pool occupancy and checkout counters."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(size=self.size(),
+                     checked_in=self.checkedin(),
+                     checked_out=self.checkedout(),
+                     overflow=self.overflow())
+        return stats
+
+
+# exception classes PEP 249 allows connections to expose as attributes
+DBAPI_EXCEPTIONS = ('Warning', 'Error', 'InterfaceError', 'DatabaseError',
+                    'DataError', 'OperationalError', 'IntegrityError',
+                    'InternalError', 'ProgrammingError', 'NotSupportedError')
+
+
+class TpoolDBAPI(object):
+    """Wraps a DBAPI module to run its blocking calls in native threads.
+
+    Connections and their cursors are wrapped in eventlet's tpool.Proxy, so a
+    query waiting on the database blocks a thread of eventlet's pool rather
+    than the hub, and every other green thread. See ``[sql] use_tpool``.
+
+    """
+
+    def __init__(self, dbapi):
+        self._dbapi = dbapi
+
+    def __getattr__(self, name):
+        return getattr(self._dbapi, name)
+
+    def connect(self, *args, **kwargs):
+        from eventlet import tpool
+
+        connection = tpool.execute(self._dbapi.connect, *args, **kwargs)
+        proxy = tpool.Proxy(connection, autowrap_names=('cursor',))
+        # tpool.Proxy would turn these classes into functions
+        for name in DBAPI_EXCEPTIONS:
+            if hasattr(connection, name):
+                setattr(proxy, name, getattr(connection, name))
+        return proxy
+
+
+def build_engine(connection):
+    """Return a new SQLAlchemy engine for the given connection string."""
+    connection_dict = sql.engine.url.make_url(connection)
+
+    engine_config = {
+        'convert_unicode': True,
+        'echo': CONF.debug and CONF.verbose,
+        'pool_recycle': CONF.sql.idle_timeout,
+    }
+
+    if 'sqlite' in connection_dict.drivername:
+        engine_config['poolclass'] = sqlalchemy.pool.StaticPool
+    else:
+        engine_config['poolclass'] = InstrumentedQueuePool
+        if CONF.sql.pool_size is not None:
+            engine_config['pool_size'] = CONF.sql.pool_size
+        if CONF.sql.max_overflow is not None:
+            engine_config['max_overflow'] = CONF.sql.max_overflow
+        if CONF.sql.pool_timeout is not None:
+            engine_config['pool_timeout'] = CONF.sql.pool_timeout
+        if CONF.sql.use_tpool:
+            dbapi = connection_dict.get_dialect().dbapi()
+            engine_config['module'] = TpoolDBAPI(dbapi)
+
+    engine = sql.create_engine(connection, **engine_config)
+
+    ping = None
+    if engine.name == 'mysql':
+        ping = mysql_on_checkout
+    elif engine.name == 'ibm_db_sa':
+        ping = functools.partial(db2_on_checkout, engine)
+    if ping is not None:
+        sql.event.listen(engine, 'checkout', ping_when_idle(ping))
+        sql.event.listen(engine, 'checkin', record_checkin)
+
+    return engine
+
+
+def _mysql_slave_lag(engine):
+    row = engine.execute('SHOW SLAVE STATUS').first()
+    if row is not None:
+        return row['Seconds_Behind_Master']
+
+
+def _postgresql_slave_lag(engine):
+    return engine.execute(
+        'SELECT CASE WHEN pg_last_xlog_receive_location() = '
+        'pg_last_xlog_replay_location() THEN 0 '
+        'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) '
+        'END').scalar()
+
+
+# Functions measuring a replica's lag in seconds, by engine name. They return
+# None if the lag is unknown, for instance because replication is stopped.
+SLAVE_LAG_FUNCTIONS = {
+    'mysql': _mysql_slave_lag,
+    'postgresql': _postgresql_slave_lag,
+}
+
+
+def set_slave_engine(engine):
+    """Set the engine used for ``[sql] slave_connection``.
+
+    Passing None makes the next read build a new engine from the
+    configuration, and forgets any earlier replica failure.
+
+    """
+    global SLAVE_ENGINE
+
+    SLAVE_ENGINE = engine
+    _SLAVE_STATE.update(unavailable_until=0, lag=None, lag_checked=0)
+
+
+def get_slave_engine():
+    """Return the replica engine, or None if no replica is configured."""
+    if not CONF.sql.slave_connection:
+        return None
+    if SLAVE_ENGINE is None:
+        engine = build_engine(CONF.sql.slave_connection)
+        if (CONF.sql.slave_max_lag is not None and
+                engine.name not in SLAVE_LAG_FUNCTIONS):
+            LOG.warning(_('Replication lag cannot be measured for %s '
+                          'databases; slave_max_lag is ignored.'),
+                        engine.name)
+        set_slave_engine(engine)
+    return SLAVE_ENGINE
+
+
+def mark_slave_unavailable(error):
+    """Send reads to the primary for ``[sql] slave_retry_interval``."""
+    LOG.warning(_('Read replica failed, using the primary database for '
+                  '%(interval)s seconds: %(error)s'),
+                {'interval': CONF.sql.slave_retry_interval, 'error': error})
+    _SLAVE_STATE['unavailable_until'] = (time.time() +
+                                         CONF.sql.slave_retry_interval)
+
+
+def slave_available(engine):
+    """Whether reads may currently go to the replica.
+
+    The replica is skipped for a while after it fails, and while its
+    measured replication lag exceeds ``[sql] slave_max_lag`` seconds.
+
+    """
+    now = time.time()
+    if now < _SLAVE_STATE['unavailable_until']:
+        return False
+
+    max_lag = CONF.sql.slave_max_lag
+    lag_function = SLAVE_LAG_FUNCTIONS.get(engine.name)
+    if max_lag is None or lag_function is None:
+        return True
+
+    if now - _SLAVE_STATE['lag_checked'] >= SLAVE_LAG_CHECK_INTERVAL:
+        # concurrent callers keep using the last measurement meanwhile
+        _SLAVE_STATE['lag_checked'] = now
+        try:
+            _SLAVE_STATE['lag'] = lag_function(engine)
+        except (sql.exc.DBAPIError, DisconnectionError) as e:
+            mark_slave_unavailable(e)
+            return False
+
+    lag = _SLAVE_STATE['lag']
+    return lag is not None and lag <= max_lag
+
+
+def slave_lag_bounded(engine):
+    """Whether the replica's lag is checked against ``slave_max_lag``."""
+    return (CONF.sql.slave_max_lag is not None and
+            engine.name in SLAVE_LAG_FUNCTIONS)
+
+
+def get_pool_stats():
+    """Returns the global engine's pool statistics, for monitoring.
+
+    Returns None if there is no global engine or its pool is not
+    instrumented (as with sqlite).
+
+    """
+    if GLOBAL_ENGINE is None:
+        return None
+    pool = GLOBAL_ENGINE.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return None
+    return pool.stats()
+
+
 # Backends
 class Base(object):
     _engine = None
     _sessionmaker = None
+    _slave_engine = None
+    _slave_sessionmaker = None
 
     def get_session(self, autocommit=True, expire_on_commit=False):
         """Return a SQLAlchemy session."""
@@ -242,6 +525,26 @@ class Base(object):
         return self._sessionmaker(autocommit=autocommit,
                                   expire_on_commit=expire_on_commit)
 
+    def get_slave_session(self, bounded_lag=False):
+        """Return a SQLAlchemy session on the read replica.
+
+        Returns None, meaning the primary should be used, when
+        ``[sql] slave_connection`` is not set or the replica is unavailable
+        (see slave_available), and with bounded_lag, unless the replica's
+        lag is checked against ``[sql] slave_max_lag``. Only reads tolerating
+        slightly stale data should use it; see read_from_slave.
+
+        """
+        engine = get_slave_engine()
+        if engine is None or not slave_available(engine):
+            return None
+        if bounded_lag and not slave_lag_bounded(engine):
+            return None
+        if engine is not self._slave_engine:
+            self._slave_engine = engine
+            self._slave_sessionmaker = self.get_sessionmaker(engine)
+        return self._slave_sessionmaker()
+
     @contextlib.contextmanager
     def transaction(self, expire_on_commit=False):
         """Return a SQLAlchemy session in a scoped transaction."""
@@ -258,26 +561,7 @@ class Base(object):
 
         """
         def new_engine():
-            connection_dict = sql.engine.url.make_url(CONF.sql.connection)
-
-            engine_config = {
-                'convert_unicode': True,
-                'echo': CONF.debug and CONF.verbose,
-                'pool_recycle': CONF.sql.idle_timeout,
-            }
-
-            if 'sqlite' in connection_dict.drivername:
-                engine_config['poolclass'] = sqlalchemy.pool.StaticPool
-
-            engine = sql.create_engine(CONF.sql.connection, **engine_config)
-
-            if engine.name == 'mysql':
-                sql.event.listen(engine, 'checkout', mysql_on_checkout)
-            elif engine.name == 'ibm_db_sa':
-                callback = functools.partial(db2_on_checkout, engine)
-                sql.event.listen(engine, 'checkout', callback)
-
-            return engine
+            return build_engine(CONF.sql.connection)
 
         if not allow_global_engine:
             return new_engine()
@@ -306,6 +590,86 @@ class Base(object):
     def clear_engine(self):
         self._engine = None
         self._sessionmaker = None
+        self._slave_engine = None
+        self._slave_sessionmaker = None
+
+
+def read_from_slave(*fallback_exceptions, **options):
+    """Runs a read-only driver method against the read replica.
+
+    The method must accept a ``session`` keyword argument. Calls passing a
+    session are left alone, so reads made within a write transaction stay on
+    the primary. If the replica raises a database error, or the method
+    raises one of fallback_exceptions (such as the not found error for a row
+    the replica has not received yet), the call is repeated on the primary.
+
+    With ``bounded_lag=True``, the replica is only used while its lag is
+    checked against ``[sql] slave_max_lag``, for reads that must not be
+    arbitrarily stale, such as those of revoked tokens.
+
+    """
+    bounded_lag = options.pop('bounded_lag', False)
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if kwargs.get('session') is not None:
+                return method(self, *args, **kwargs)
+            session = self.get_slave_session(bounded_lag=bounded_lag)
+            if session is None:
+                return method(self, *args, **kwargs)
+            kwargs['session'] = session
+            try:
+                return method(self, *args, **kwargs)
+            except fallback_exceptions:
+                pass
+            except (sql.exc.DBAPIError, DisconnectionError) as e:
+                mark_slave_unavailable(e)
+            del kwargs['session']
+            return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def filter_limit_query(model, query, hints):
+    """Applies driver hints to a query for model.
+
+    Equality filters on the model's columns become ``WHERE`` clauses and are
+    removed from hints. Boolean columns take query string values the way the
+    controllers do: ``0`` is False, anything else True. If no filter is left
+    over, marker and limit are applied too; see
+    ``keystone.common.driver_hints.Hints``.
+
+    """
+    if hints is None:
+        return query
+
+    columns = model.__table__.columns
+    for filter_ in list(hints.filters):
+        if filter_['name'] not in columns:
+            continue
+        column = getattr(model, filter_['name'])
+        value = filter_['value']
+        if isinstance(columns[filter_['name']].type, Boolean):
+            value = value != '0'
+        query = query.filter(column == value)
+        hints.remove_filter(filter_)
+
+    if hints.filters or not hints.pagination_requested:
+        return query
+
+    if hints.page_reverse:
+        if hints.marker is not None:
+            query = query.filter(model.id < hints.marker)
+        query = query.order_by(model.id.desc())
+    else:
+        if hints.marker is not None:
+            query = query.filter(model.id > hints.marker)
+        query = query.order_by(model.id)
+    if hints.limit is not None:
+        query = query.limit(hints.limit + 1)
+    hints.paginated = True
+    return query
 
 
 def handle_conflicts(conflict_type='object'):
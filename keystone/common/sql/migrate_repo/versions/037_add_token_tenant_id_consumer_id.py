@@ -0,0 +1,82 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+
+import sqlalchemy as sql
+from sqlalchemy.orm import sessionmaker
+
+from keystone.openstack.common import timeutils
+
+
+INDEXED_COLUMNS = ['user_id', 'trust_id', 'tenant_id', 'consumer_id']
+
+
+def _tenant_id(extra):
+    return (extra.get('tenant') or {}).get('id')
+
+
+def _consumer_id(extra):
+    try:
+        oauth = extra['token_data']['token'].get('OS-OAUTH1') or {}
+        return oauth.get('consumer_id')
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token = sql.Table('token', meta, autoload=True)
+    token.create_column(sql.Column('tenant_id', sql.String(64)))
+    token.create_column(sql.Column('consumer_id', sql.String(64)))
+
+    # Only tokens that can still be revoked need the new columns.
+    session = sessionmaker(bind=migrate_engine)()
+    query = session.query(token.c.id, token.c.extra)
+    query = query.filter(token.c.expires > timeutils.utcnow())
+    query = query.filter(token.c.valid == sql.sql.expression.true())
+    for token_id, extra in query:
+        extra = json.loads(extra) if extra else {}
+        values = {'tenant_id': _tenant_id(extra),
+                  'consumer_id': _consumer_id(extra)}
+        if values['tenant_id'] or values['consumer_id']:
+            update = token.update().\
+                where(token.c.id == token_id).\
+                values(values)
+            migrate_engine.execute(update)
+    session.close()
+
+    for column in INDEXED_COLUMNS:
+        sql.Index('ix_token_%s' % column, token.c[column]).create(
+            migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token = sql.Table('token', meta, autoload=True)
+    for column in INDEXED_COLUMNS:
+        sql.Index('ix_token_%s' % column, token.c[column]).drop(
+            migrate_engine)
+
+    # NOTE: reload the table, as sqlite recreates it (and its indexes) to
+    # drop a column.
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token = sql.Table('token', meta, autoload=True)
+    token.drop_column('consumer_id')
+    token.drop_column('tenant_id')
@@ -0,0 +1,46 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sqlalchemy as sql
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    effective_assignment_table = sql.Table(
+        'effective_assignment',
+        meta,
+        sql.Column('user_id', sql.String(64), primary_key=True),
+        sql.Column('target_type', sql.String(16), primary_key=True),
+        sql.Column('target_id', sql.String(64), primary_key=True),
+        sql.Column('role_id', sql.String(64), primary_key=True),
+        sql.Column('inherited', sql.Boolean(), primary_key=True),
+        sql.Column('source_id', sql.String(64), primary_key=True),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8')
+    effective_assignment_table.create(migrate_engine, checkfirst=True)
+
+    sql.Index('ix_effective_assignment_source',
+              effective_assignment_table.c.source_id,
+              effective_assignment_table.c.target_id).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    table = sql.Table('effective_assignment', meta, autoload=True)
+    table.drop()
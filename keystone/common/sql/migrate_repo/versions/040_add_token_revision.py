@@ -0,0 +1,52 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import sqlalchemy as sql
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    for table_name in ('token', 'token_archive'):
+        table = sql.Table(table_name, meta, autoload=True)
+        revision = sql.Column('revision', sql.BigInteger(), nullable=True)
+        table.create_column(revision)
+
+    # a single row counting revocations
+    revision_table = sql.Table(
+        'token_revision',
+        meta,
+        sql.Column('id', sql.Integer(), primary_key=True,
+                   autoincrement=False),
+        sql.Column('revision', sql.BigInteger(), nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8')
+    revision_table.create(migrate_engine, checkfirst=True)
+    revision_table.insert().execute(id=1, revision=0)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    table = sql.Table('token_revision', meta, autoload=True)
+    table.drop()
+
+    for table_name in ('token', 'token_archive'):
+        table = sql.Table(table_name, meta, autoload=True)
+        table.drop_column('revision')
@@ -19,15 +19,20 @@
 #    under the License.
 
 import calendar
+import collections
 import grp
 import hashlib
+import hmac
 import json
 import os
 import pwd
+import threading
+import time
 
 import passlib.hash
 
 from keystone.common import config
+from keystone.common import crypt_pool
 from keystone.common import environment
 from keystone import exception
 from keystone.openstack.common import log as logging
@@ -107,6 +112,8 @@ def hash_password(password):
     password_utf8 = trunc_password(password).encode('utf-8')
     if passlib.hash.sha512_crypt.identify(password_utf8):
         return password_utf8
+    if CONF.crypt_pool_size:
+        return crypt_pool.hash_password(password_utf8, CONF.crypt_strength)
     h = passlib.hash.sha512_crypt.encrypt(password_utf8,
                                           rounds=CONF.crypt_strength)
     return h
@@ -136,9 +143,70 @@ def check_password(password, hashed):
     if password is None or hashed is None:
         return False
     password_utf8 = trunc_password(password).encode('utf-8')
+    if CONF.crypt_pool_size:
+        return crypt_pool.check_password(password_utf8, hashed)
     return passlib.hash.sha512_crypt.verify(password_utf8, hashed)
 
 
+class VerifiedPasswordCache(object):
+    """Remember recently verified passwords to skip repeated hashing.
+
+    Entries are keyed by an HMAC of the user ID, the password and the stored
+    hash, using a key generated for this process, so passwords are never
+    kept in memory and a changed password never matches an old entry. Only
+    successful verifications are remembered, for up to ``ttl`` seconds, and
+    the least recently used entries are evicted beyond ``size``.
+
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._key = os.urandom(32)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, user_id, password, hashed):
+        values = [x.encode('utf-8') if isinstance(x, unicode) else x
+                  for x in (user_id, password, hashed)]
+        return hmac.new(self._key, '\0'.join(values), hashlib.sha256).digest()
+
+    def check_password(self, user_id, password, hashed):
+        """Check a password as check_password does, remembering matches."""
+        if password is None or hashed is None:
+            return False
+        digest = self._digest(user_id, password, hashed)
+        with self._lock:
+            entry = self._entries.pop(digest, None)
+            if entry is not None and entry[1] > time.time():
+                self._entries[digest] = entry
+                self.hits += 1
+                return True
+            self.misses += 1
+
+        if not check_password(password, hashed):
+            return False
+        with self._lock:
+            self._entries[digest] = (user_id, time.time() + self.ttl)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return True
+
+    def invalidate(self, user_id):
+        """Forget every password remembered for a user."""
+        with self._lock:
+            for digest, entry in self._entries.items():
+                if entry[0] == user_id:
+                    del self._entries[digest]
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries)}
+
+
 # From python 2.7
 def check_output(*popenargs, **kwargs):
     r"""Run command with arguments and return its output as a byte string.
@@ -30,7 +30,6 @@ from keystone.common import config
 from keystone.common import utils
 from keystone import exception
 from keystone.openstack.common import gettextutils
-from keystone.openstack.common import importutils
 from keystone.openstack.common import jsonutils
 from keystone.openstack.common import log as logging
 
@@ -263,12 +262,12 @@ class Application(BaseApplication):
         return render_response(body=result, status=response_code)
 
     def _get_response_code(self, req):
-        req_method = req.environ['REQUEST_METHOD']
-        controller = importutils.import_class('keystone.common.controller')
-        code = None
-        if isinstance(self, controller.V3Controller) and req_method == 'POST':
-            code = (201, 'Created')
-        return code
+        """Returns the status to use for a successful response.
+
+        None results in the default of 200 OK.
+
+        """
+        return None
 
     def _normalize_arg(self, arg):
         return str(arg).replace(':', '_').replace('-', '_')
@@ -299,9 +298,11 @@ class Application(BaseApplication):
                 LOG.debug('Invalid tenant')
                 raise exception.Unauthorized()
 
-            # NOTE(vish): this is pretty inefficient
-            creds['roles'] = [self.assignment_api.get_role(role)['name']
-                              for role in creds.get('roles', [])]
+            role_names = creds.pop('role_names', None)
+            if role_names is None:
+                role_names = self.assignment_api.get_role_names(
+                    creds.get('roles', []))
+            creds['roles'] = role_names
             # Accept either is_admin or the admin role
             self.policy_api.enforce(creds, 'admin_required', {})
 
@@ -460,15 +461,89 @@ class Router(object):
         self.map = mapper
         self._router = routes.middleware.RoutesMiddleware(self._dispatch,
                                                           self.map)
+        self._route_index = None
+        self._indexed_routes = None
 
-    @webob.dec.wsgify(RequestClass=Request)
-    def __call__(self, req):
+    def __call__(self, environ, start_response):
         """Route the incoming request to a controller based on self.map.
 
         If no match, return a 404.
 
         """
-        return self._router
+        path = environ['PATH_INFO']
+        index = self._get_route_index()
+        if (index is None or not path.startswith('/') or
+                _has_method_override(environ)):
+            return self._router(environ, start_response)
+
+        routes_by_segment, other_routes = index
+        segment = path[1:].split('/', 1)[0]
+        mapper = self.map
+        match = None
+        for route in routes_by_segment.get(segment, other_routes):
+            match = route.match(path, environ, mapper.sub_domains,
+                                mapper.sub_domains_ignore,
+                                mapper.domain_match)
+            if isinstance(match, dict) or match:
+                break
+        else:
+            route = None
+
+        if not match:
+            response = render_exception(
+                exception.NotFound(_('The resource could not be found.')),
+                user_locale=Request(environ).best_match_language())
+            return response(environ, start_response)
+
+        environ['wsgiorg.routing_args'] = ((), match)
+        environ['routes.route'] = route
+        if 'path_info' in match:
+            # hand the rest of the path to the routed application, as
+            # routes.middleware.RoutesMiddleware does
+            old_path = path
+            path = match['path_info'] or ''
+            environ['PATH_INFO'] = path if path.startswith('/') else '/' + path
+            if old_path.endswith('/' + path):
+                old_path = old_path[:-len(path) - 1]
+            environ['SCRIPT_NAME'] += old_path
+        return match['controller'](environ, start_response)
+
+    def _get_route_index(self):
+        """Groups the mapper's routes by the first segment of their path.
+
+        A request is only matched against the routes for its first path
+        segment and those whose path does not start with a literal segment,
+        in the mapper's order. Returns None if the mapper uses features that
+        need routes' own matching.
+
+        """
+        mapper = self.map
+        if self._indexed_routes == len(mapper.matchlist):
+            return self._route_index
+
+        index = None
+        if not (mapper.minimization or mapper.prefix or mapper.sub_domains or
+                any(route.redirect for route in mapper.matchlist)):
+            mapper.create_regs()
+            by_segment = {}
+            other = []
+            for position, route in enumerate(mapper.matchlist):
+                if route.static:
+                    continue
+                segment = _route_segment(route)
+                if segment is None:
+                    other.append((position, route))
+                else:
+                    by_segment.setdefault(segment, []).append(
+                        (position, route))
+            routes_by_segment = dict(
+                (segment, [r for _p, r in sorted(segment_routes + other)])
+                for segment, segment_routes in by_segment.iteritems())
+            index = (routes_by_segment, [r for _p, r in other])
+
+        self._route_index = index
+        self._indexed_routes = len(mapper.matchlist)
+        return index
 
     @staticmethod
     @webob.dec.wsgify(RequestClass=Request)
@@ -489,6 +564,28 @@ class Router(object):
         return app
 
 
+def _route_segment(route):
+    """Returns the literal first path segment of a route, or None."""
+    parts = route.routelist
+    if not parts or not isinstance(parts[0], basestring):
+        return None
+    if not parts[0].startswith('/'):
+        return None
+    segment, sep, _rest = parts[0][1:].partition('/')
+    if sep or len(parts) == 1:
+        return segment
+    # a variable continues the first segment
+    return None
+
+
+def _has_method_override(environ):
+    """Whether routes.middleware would look for a _method override."""
+    if '_method' in environ.get('QUERY_STRING', ''):
+        return True
+    return (environ['REQUEST_METHOD'] == 'POST' and
+            routes.middleware.is_form_post(environ))
+
+
 class ComposingRouter(Router):
     def __init__(self, mapper=None, routers=None):
         if mapper is None:
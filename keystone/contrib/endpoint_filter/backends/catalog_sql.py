@@ -35,8 +35,9 @@ class EndpointFilterCatalog(sql.Catalog):
 
         if (len(refs) == 0 and
                 CONF.endpoint_filter.return_all_endpoints_if_no_filter):
-            return super(EndpointFilterCatalog, self).get_v3_catalog(
-                user_id, project_id, metadata=metadata)
+            return catalog_core.render_v3_catalog(
+                super(EndpointFilterCatalog, self).get_v3_catalog_template(),
+                user_id, project_id)
 
         for entry in refs:
             try:
@@ -69,3 +70,8 @@ class EndpointFilterCatalog(sql.Catalog):
             catalog.append(formatted_service)
 
         return catalog
+
+    def get_v3_catalog_template(self):
+        # NOTE: the filtered catalog differs for each project, so it is not
+        # served from a catalog template shared by all of them.
+        raise exception.NotImplemented()
@@ -48,11 +48,12 @@ class Credential(sql.Base, credential.Driver):
             session.flush()
         return ref.to_dict()
 
-    def list_credentials(self, **filters):
+    def list_credentials(self, hints=None, **filters):
         session = self.get_session()
         query = session.query(CredentialModel)
         if 'user_id' in filters:
             query = query.filter_by(user_id=filters.get('user_id'))
+        query = sql.filter_limit_query(CredentialModel, query, hints)
         refs = query.all()
         return [ref.to_dict() for ref in refs]
 
@@ -58,10 +58,11 @@ class CredentialV3(controller.V3Controller):
         ref = self.credential_api.create_credential(ref['id'], ref)
         return CredentialV3.wrap_member(context, ref)
 
-    @controller.protected()
-    def list_credentials(self, context):
-        refs = self.credential_api.list_credentials()
-        return CredentialV3.wrap_collection(context, refs)
+    @controller.filterprotected('user_id')
+    def list_credentials(self, context, filters):
+        hints = CredentialV3.build_driver_hints(context, filters)
+        refs = self.credential_api.list_credentials(hints=hints)
+        return CredentialV3.wrap_collection(context, refs, hints=hints)
 
     @controller.protected()
     def get_credential(self, context, credential_id):
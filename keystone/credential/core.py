@@ -59,9 +59,11 @@ class Driver(object):
         raise exception.NotImplemented()
 
     @abc.abstractmethod
-    def list_credentials(self, **filters):
+    def list_credentials(self, hints=None, **filters):
         """List all credentials in the system applying filters.
 
+        :param hints: optional keystone.common.driver_hints.Hints; filters
+                      the driver satisfies are removed from it
         :returns: a list of credential_refs or an empty list.
 
         """
@@ -76,8 +76,8 @@ class Identity(identity.Driver):
     def get_user(self, user_id):
         return identity.filter_user(self._get_user(user_id))
 
-    def list_users(self):
-        return self.user.get_all_filtered()
+    def list_users(self, hints=None):
+        return self.user.get_all_filtered(self.user.filter_query(hints))
 
     def get_user_by_name(self, user_name, domain_id):
         # domain_id will already have been handled in the Manager layer,
@@ -147,8 +147,8 @@ class Identity(identity.Driver):
         user_dn = self.user._id_to_dn(user_id)
         return self.group.list_user_groups(user_dn)
 
-    def list_groups(self):
-        return self.group.get_all()
+    def list_groups(self, hints=None):
+        return self.group.get_all(self.group.filter_query(hints))
 
     def list_users_in_group(self, group_id):
         self.get_group(group_id)
@@ -233,8 +233,9 @@ class UserApi(common_ldap.EnabledEmuMixIn, common_ldap.BaseLdap):
         user = self.get(user_id)
         return identity.filter_user(user)
 
-    def get_all_filtered(self):
-        return [identity.filter_user(user) for user in self.get_all()]
+    def get_all_filtered(self, ldap_filter=None):
+        return [identity.filter_user(user)
+                for user in self.get_all(ldap_filter)]
 
 
 class GroupApi(common_ldap.BaseLdap):
@@ -84,7 +84,7 @@ class PamIdentity(identity.Driver):
         # in LDAP backend
         return {'id': user_name, 'name': user_name}
 
-    def list_users(self):
+    def list_users(self, hints=None):
         raise NotImplementedError()
 
     def add_user_to_project(self, tenant_id, user_id):
@@ -129,7 +129,7 @@ class PamIdentity(identity.Driver):
     def create_group(self, group_id, group):
         raise NotImplementedError()
 
-    def list_groups(self):
+    def list_groups(self, hints=None):
         raise NotImplementedError()
 
     def list_groups_for_user(self, user_id):
@@ -18,10 +18,14 @@ from keystone.common import dependency
 from keystone.common import sql
 from keystone.common.sql import migration
 from keystone.common import utils
+from keystone import config
 from keystone import exception
 from keystone import identity
 
 
+CONF = config.CONF
+
+
 class User(sql.ModelBase, sql.DictBase):
     __tablename__ = 'user'
     attributes = ['id', 'name', 'domain_id', 'password', 'enabled',
@@ -72,6 +76,14 @@ class UserGroupMembership(sql.ModelBase, sql.DictBase):
 
 @dependency.requires('assignment_api')
 class Identity(sql.Base, identity.Driver):
+    def __init__(self):
+        super(Identity, self).__init__()
+        self.password_cache = None
+        if CONF.identity.verified_password_cache_size:
+            self.password_cache = utils.VerifiedPasswordCache(
+                CONF.identity.verified_password_cache_size,
+                CONF.identity.verified_password_cache_ttl)
+
     def default_assignment_driver(self):
         return "keystone.assignment.backends.sql.Assignment"
 
@@ -91,6 +103,9 @@ class Identity(sql.Base, identity.Driver):
         https://blueprints.launchpad.net/keystone/+spec/sql-identiy-pam
 
         """
+        if self.password_cache:
+            return self.password_cache.check_password(
+                user_ref.id, password, user_ref.password)
         return utils.check_password(password, user_ref.password)
 
     def is_domain_aware(self):
@@ -120,10 +135,10 @@ class Identity(sql.Base, identity.Driver):
             session.flush()
         return identity.filter_user(user_ref.to_dict())
 
-    def list_users(self):
+    def list_users(self, hints=None):
         session = self.get_session()
-        user_refs = session.query(User)
-        return [identity.filter_user(x.to_dict()) for x in user_refs]
+        query = sql.filter_limit_query(User, session.query(User), hints)
+        return [identity.filter_user(x.to_dict()) for x in query]
 
     def _get_user(self, session, user_id):
         user_ref = session.query(User).get(user_id)
@@ -164,6 +179,8 @@ class Identity(sql.Base, identity.Driver):
                     setattr(user_ref, attr, getattr(new_user, attr))
             user_ref.extra = new_user.extra
             session.flush()
+        if self.password_cache:
+            self.password_cache.invalidate(user_id)
         return identity.filter_user(user_ref.to_dict(include_extra_dict=True))
 
     def add_user_to_group(self, user_id, group_id):
@@ -233,6 +250,8 @@ class Identity(sql.Base, identity.Driver):
 
             session.delete(ref)
             session.flush()
+        if self.password_cache:
+            self.password_cache.invalidate(user_id)
         self.assignment_api.delete_user(user_id)
 
     # group crud
@@ -246,10 +265,10 @@ class Identity(sql.Base, identity.Driver):
             session.flush()
         return ref.to_dict()
 
-    def list_groups(self):
+    def list_groups(self, hints=None):
         session = self.get_session()
-        refs = session.query(Group).all()
-        return [ref.to_dict() for ref in refs]
+        query = sql.filter_limit_query(Group, session.query(Group), hints)
+        return [ref.to_dict() for ref in query]
 
     def _get_group(self, session, group_id):
         ref = session.query(Group).get(group_id)
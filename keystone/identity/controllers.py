@@ -16,7 +16,6 @@
 
 """Workflow Logic the Identity service."""
 
-import copy
 import urllib
 import urlparse
 import uuid
@@ -666,8 +665,9 @@ class ProjectV3(controller.V3Controller):
 
     @controller.filterprotected('domain_id', 'enabled', 'name')
     def list_projects(self, context, filters):
-        refs = self.assignment_api.list_projects()
-        return ProjectV3.wrap_collection(context, refs, filters)
+        hints = ProjectV3.build_driver_hints(context, filters)
+        refs = self.assignment_api.list_projects(hints=hints)
+        return ProjectV3.wrap_collection(context, refs, hints=hints)
 
     @controller.filterprotected('enabled', 'name')
     def list_user_projects(self, context, filters, user_id):
@@ -736,9 +736,11 @@ class UserV3(controller.V3Controller):
 
     @controller.filterprotected('domain_id', 'email', 'enabled', 'name')
     def list_users(self, context, filters):
+        hints = UserV3.build_driver_hints(context, filters)
         refs = self.identity_api.list_users(
-            domain_scope=self._get_domain_id_for_request(context))
-        return UserV3.wrap_collection(context, refs, filters)
+            domain_scope=self._get_domain_id_for_request(context),
+            hints=hints)
+        return UserV3.wrap_collection(context, refs, hints=hints)
 
     @controller.filterprotected('domain_id', 'email', 'enabled', 'name')
     def list_users_in_group(self, context, filters, group_id):
@@ -855,9 +857,11 @@ class GroupV3(controller.V3Controller):
 
     @controller.filterprotected('domain_id', 'name')
     def list_groups(self, context, filters):
+        hints = GroupV3.build_driver_hints(context, filters)
         refs = self.identity_api.list_groups(
-            domain_scope=self._get_domain_id_for_request(context))
-        return GroupV3.wrap_collection(context, refs, filters)
+            domain_scope=self._get_domain_id_for_request(context),
+            hints=hints)
+        return GroupV3.wrap_collection(context, refs, hints=hints)
 
     @controller.filterprotected('name')
     def list_groups_for_user(self, context, filters, user_id):
@@ -1140,7 +1144,8 @@ class RoleAssignmentV3(controller.V3Controller):
 
         return formatted_entity
 
-    def _expand_indirect_assignments(self, refs):
+    def _expand_indirect_assignments(self, refs, user_id=None,
+                                     project_id=None):
         """Processes entity list into all-direct assignments.
 
         For any group role assignments in the list, create a role assignment
@@ -1154,27 +1159,38 @@ class RoleAssignmentV3(controller.V3Controller):
         For any new entity created by virtue of group membership, add in an
         additional link to that membership.
 
+        Entries are generated as refs is consumed. Group members and domain
+        projects are fetched once per call. If the caller is filtering on
+        user_id or project_id (and only passed in assignments which can
+        apply to them), expansion is limited to that user or project.
+
         """
-        def _get_group_members(ref):
-            """Get a list of group members.
+        group_members = {}
+        domain_projects = {}
 
-            Get the list of group members.  If this fails with
-            GroupNotFound, then log this as a warning, but allow
-            overall processing to continue.
+        def _get_group_members(group_id, ref):
+            """Get the IDs of a group's members, at most once per group.
+
+            If this fails with GroupNotFound, then log this as a warning,
+            but allow overall processing to continue.
 
             """
+            if user_id is not None:
+                return [user_id]
+            if group_id in group_members:
+                return group_members[group_id]
             try:
-                members = self.identity_api.list_users_in_group(
-                    ref['group']['id'])
+                members = [x['id'] for x in
+                           self.identity_api.list_users_in_group(group_id)]
             except exception.GroupNotFound:
                 members = []
                 # The group is missing, which should not happen since
                 # group deletion should remove any related assignments, so
                 # log a warning
-                if 'domain' in ref:
-                    target = 'Domain: %s' % ref['domain'].get('domain_id')
-                elif 'project' in ref:
-                    target = 'Project: %s' % ref['project'].get('project_id')
+                if 'domain' in ref['scope']:
+                    target = 'Domain: %s' % ref['scope']['domain']['id']
+                elif 'project' in ref['scope']:
+                    target = 'Project: %s' % ref['scope']['project']['id']
                 else:
                     # Should always be a domain or project, but since to get
                     # here things have gone astray, let's be cautious.
@@ -1182,68 +1198,24 @@ class RoleAssignmentV3(controller.V3Controller):
                 LOG.warning(
                     _('Group %(group)s not found for role-assignment - '
                       '%(target)s with Role: %(role)s'), {
-                          'group': ref['group_id'], 'target': target,
-                          'role': ref.get('role_id')})
+                          'group': group_id, 'target': target,
+                          'role': ref['role']['id']})
+            group_members[group_id] = members
             return members
 
-        def _build_user_assignment_equivalent_of_group(
-                user, group_id, template):
-            """Create a user assignment equivalent to the group one.
-
-            The template has had the 'group' entity removed, so
-            substitute a 'user' one. The 'assignment' link stays as it is,
-            referring to the group assignment that led to this role.
-            A 'membership' link is added that refers to this particular
-            user's membership of this group.
+        def _get_domain_projects(domain_id):
+            """Get the IDs of the projects owned by a domain, once."""
+            if project_id is not None:
+                return [project_id]
+            if domain_id not in domain_projects:
+                domain_projects[domain_id] = (
+                    [x['id'] for x in
+                     self.assignment_api.list_projects(domain_id)])
+            return domain_projects[domain_id]
 
-            """
-            user_entry = copy.deepcopy(template)
-            user_entry['user'] = {'id': user['id']}
-            user_entry['links']['membership'] = (
-                self.base_url('/groups/%s/users/%s' %
-                              (group_id, user['id'])))
-            return user_entry
-
-        def _build_project_equivalent_of_user_domain_role(
-                project_id, domain_id, template):
-            """Create a user project assignment equivalent to the domain one.
-
-            The template has had the 'domain' entity removed, so
-            substitute a 'project' one, modifying the 'assignment' link
-            to match.
-
-            """
-            project_entry = copy.deepcopy(template)
-            project_entry['scope']['project'] = {'id': project_id}
-            project_entry['links']['assignment'] = (
-                self.base_url(
-                    '/OS-INHERIT/domains/%s/users/%s/roles/%s'
-                    '/inherited_to_projects' % (
-                        domain_id, project_entry['user']['id'],
-                        project_entry['role']['id'])))
-            return project_entry
-
-        def _build_project_equivalent_of_group_domain_role(
-                user_id, group_id, project_id, domain_id, template):
-            """Create a user project equivalent to the domain group one.
-
-            The template has had the 'domain' and 'group' entities removed, so
-            substitute a 'user-project' one, modifying the 'assignment' link
-            to match.
-
-            """
-            project_entry = copy.deepcopy(template)
-            project_entry['user'] = {'id': user_id}
-            project_entry['scope']['project'] = {'id': project_id}
-            project_entry['links']['assignment'] = (
-                self.base_url('/OS-INHERIT/domains/%s/groups/%s/roles/%s'
-                              '/inherited_to_projects' % (
-                                  domain_id, group_id,
-                                  project_entry['role']['id'])))
-            project_entry['links']['membership'] = (
-                self.base_url('/groups/%s/users/%s' %
-                              (group_id, user_id)))
-            return project_entry
+        def _membership_link(group_id, member_id):
+            return self.base_url('/groups/%s/users/%s' %
+                                 (group_id, member_id))
 
         # Scan the list of entities for any assignments that need to be
         # expanded.
@@ -1255,60 +1227,69 @@ class RoleAssignmentV3(controller.V3Controller):
         # For any regular group entries, expand these into user entries based
         # on membership of that group.
         #
-        # Due to the potentially large expansions, rather than modify the
-        # list we are enumerating, we build a new one as we go.
-        #
+        # Each generated entry is built from scratch, rather than copied
+        # from the assignment it derives from.
 
-        new_refs = []
         for r in refs:
+            role_id = r['role']['id']
             if 'OS-INHERIT:inherited_to' in r['scope']:
-                # It's an inherited domain role - so get the list of projects
-                # owned by this domain. A domain scope is guaranteed since we
-                # checked this when we built the refs list
-                project_ids = (
-                    [x['id'] for x in self.assignment_api.list_projects(
-                        r['scope']['domain']['id'])])
-                base_entry = copy.deepcopy(r)
-                domain_id = base_entry['scope']['domain']['id']
-                base_entry['scope'].pop('domain')
-                # For each project, create an equivalent role assignment
-                for p in project_ids:
-                    # If it's a group assignment, then create equivalent user
+                # It's an inherited domain role - so create an equivalent
+                # role assignment on each project owned by this domain. A
+                # domain scope is guaranteed since we checked this when we
+                # built the refs list
+                domain_id = r['scope']['domain']['id']
+                project_ids = _get_domain_projects(domain_id)
+                if 'group' in r:
+                    # It's a group assignment, so create equivalent user
                     # roles based on membership of the group
-                    if 'group' in base_entry:
-                        members = _get_group_members(base_entry)
-                        sub_entry = copy.deepcopy(base_entry)
-                        group_id = sub_entry['group']['id']
-                        sub_entry.pop('group')
+                    group_id = r['group']['id']
+                    assignment_link = self.base_url(
+                        '/OS-INHERIT/domains/%s/groups/%s/roles/%s'
+                        '/inherited_to_projects' % (
+                            domain_id, group_id, role_id))
+                    members = _get_group_members(group_id, r)
+                    for p in project_ids:
                         for m in members:
-                            new_entry = (
-                                _build_project_equivalent_of_group_domain_role(
-                                    m['id'], group_id, p,
-                                    domain_id, sub_entry))
-                            new_refs.append(new_entry)
-                    else:
-                        new_entry = (
-                            _build_project_equivalent_of_user_domain_role(
-                                p, domain_id, base_entry))
-                        new_refs.append(new_entry)
+                            yield {
+                                'user': {'id': m},
+                                'role': {'id': role_id},
+                                'scope': {
+                                    'project': {'id': p},
+                                    'OS-INHERIT:inherited_to': 'projects'},
+                                'links': {
+                                    'assignment': assignment_link,
+                                    'membership': _membership_link(group_id,
+                                                                   m)}}
+                else:
+                    assignment_link = self.base_url(
+                        '/OS-INHERIT/domains/%s/users/%s/roles/%s'
+                        '/inherited_to_projects' % (
+                            domain_id, r['user']['id'], role_id))
+                    for p in project_ids:
+                        yield {
+                            'user': {'id': r['user']['id']},
+                            'role': {'id': role_id},
+                            'scope': {
+                                'project': {'id': p},
+                                'OS-INHERIT:inherited_to': 'projects'},
+                            'links': {'assignment': assignment_link}}
             elif 'group' in r:
-                # It's a non-inherited group role assignment, so get the list
-                # of members.
-                members = _get_group_members(r)
-
-                # Now replace that group role assignment entry with an
-                # equivalent user role assignment for each of the group members
-                base_entry = copy.deepcopy(r)
-                group_id = base_entry['group']['id']
-                base_entry.pop('group')
-                for m in members:
-                    user_entry = _build_user_assignment_equivalent_of_group(
-                        m, group_id, base_entry)
-                    new_refs.append(user_entry)
+                # It's a non-inherited group role assignment, so replace it
+                # with an equivalent user role assignment for each of the
+                # group members
+                group_id = r['group']['id']
+                for m in _get_group_members(group_id, r):
+                    scope = dict((k, v.copy())
+                                 for k, v in r['scope'].iteritems())
+                    yield {
+                        'user': {'id': m},
+                        'role': {'id': role_id},
+                        'scope': scope,
+                        'links': {
+                            'assignment': r['links']['assignment'],
+                            'membership': _membership_link(group_id, m)}}
             else:
-                new_refs.append(r)
-
-        return new_refs
+                yield r
 
     def _query_filter_is_true(self, filter_value):
         """Determine if bool query param is 'True'.
@@ -1337,29 +1318,84 @@ class RoleAssignmentV3(controller.V3Controller):
         else:
             return True
 
+    def _driver_filters(self, query, effective):
+        """Translates query filters for the driver's list_role_assignments.
+
+        The driver returns a superset of the assignments the filters can
+        match, and the exact filters are applied once the list is formatted.
+        For effective assignments, a user filter must also take in the
+        user's groups and a project filter its domain's inherited roles,
+        since these expand into entries for that user or project.
+
+        """
+        kwargs = {}
+        if 'role.id' in query:
+            kwargs['role_id'] = query['role.id']
+        if 'scope.OS-INHERIT:inherited_to' in query:
+            kwargs['inherited_to_projects'] = True
+
+        user_id = query.get('user.id')
+        project_id = query.get('scope.project.id')
+        domain_id = query.get('scope.domain.id')
+
+        if not effective:
+            if user_id is not None:
+                kwargs['user_id'] = user_id
+            if 'group.id' in query:
+                kwargs['group_ids'] = [query['group.id']]
+            if project_id is not None:
+                kwargs['project_ids'] = [project_id]
+            if domain_id is not None:
+                kwargs['domain_id'] = domain_id
+            return kwargs
+
+        if user_id is not None:
+            kwargs['user_id'] = user_id
+            try:
+                kwargs['group_ids'] = [
+                    x['id'] for x in
+                    self.identity_api.list_groups_for_user(user_id)]
+            except exception.UserNotFound:
+                kwargs['group_ids'] = []
+        if project_id is not None:
+            kwargs['project_ids'] = [project_id]
+            try:
+                kwargs['domain_id'] = (
+                    self.assignment_api.get_project(project_id)['domain_id'])
+            except exception.ProjectNotFound:
+                pass
+        elif domain_id is not None:
+            # inherited assignments would only expand onto projects
+            kwargs['domain_id'] = domain_id
+            kwargs['project_ids'] = []
+            kwargs.setdefault('inherited_to_projects', False)
+        return kwargs
+
     @controller.filterprotected('group.id', 'role.id',
                                 'scope.domain.id', 'scope.project.id',
                                 'scope.OS-INHERIT:inherited_to', 'user.id')
     def list_role_assignments(self, context, filters):
-
-        # TODO(henry-nash): This implementation uses the standard filtering
-        # in the V3.wrap_collection. Given the large number of individual
-        # assignments, this is pretty inefficient.  An alternative would be
-        # to pass the filters into the driver call, so that the list size is
-        # kept a minimum.
-
-        refs = self.assignment_api.list_role_assignments()
-        formatted_refs = (
-            [self._format_entity(x) for x in refs
-             if self._filter_inherited(x)])
-
-        if ('effective' in context['query_string'] and
-                self._query_filter_is_true(
-                    context['query_string']['effective'])):
-
-            formatted_refs = self._expand_indirect_assignments(formatted_refs)
-
-        return self.wrap_collection(context, formatted_refs, filters)
+        query = context['query_string']
+        effective = ('effective' in query and
+                     self._query_filter_is_true(query['effective']))
+
+        # The driver applies what it can of the filters, and entries are
+        # generated lazily, so that only the matching entries are ever held
+        # in a list.
+        refs = self.assignment_api.list_role_assignments(
+            **self._driver_filters(query, effective))
+        formatted_refs = (self._format_entity(x) for x in refs
+                          if self._filter_inherited(x))
+
+        if effective:
+            formatted_refs = self._expand_indirect_assignments(
+                formatted_refs, user_id=query.get('user.id'),
+                project_id=query.get('scope.project.id'))
+
+        for f in filters:
+            formatted_refs = self.filter_by_attribute(context, formatted_refs,
+                                                      f)
+        return self.wrap_collection(context, list(formatted_refs))
 
     @controller.protected()
     def get_role_assignment(self, context):
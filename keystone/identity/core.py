@@ -24,6 +24,7 @@ from oslo.config import cfg
 import six
 
 from keystone import clean
+from keystone.common import cache
 from keystone.common import controller
 from keystone.common import dependency
 from keystone.common import manager
@@ -38,6 +39,7 @@ from keystone.openstack.common import versionutils
 CONF = config.CONF
 
 LOG = logging.getLogger(__name__)
+SHOULD_CACHE = cache.should_cache_fn('identity')
 
 
 def moved_to_assignment(f):
@@ -304,6 +306,35 @@ class Manager(manager.Manager):
         driver = self._select_identity_driver(domain_id)
         return (domain_id, driver)
 
+    # Cache invalidation methods
+    #
+    # Users are cached per domain scope, since the scope selects the driver
+    # (and, for drivers which are not domain aware, sets the domain_id of the
+    # refs returned). A user is invalidated under the scope of the change, its
+    # own domain and the default domain, which covers v2 requests and v3
+    # requests scoped to the user's domain.
+
+    def _invalidate_user(self, user_ref, domain_id):
+        user_domain_id = user_ref.get('domain_id', domain_id)
+        self._scoped_get_user_by_name.invalidate(self, user_ref['name'],
+                                                 user_domain_id)
+        for scope in set([domain_id, user_domain_id,
+                          CONF.identity.default_domain_id]):
+            self._scoped_get_user.invalidate(self, user_ref['id'], scope)
+        self._invalidate_groups_for_user(user_ref['id'], domain_id,
+                                         user_domain_id)
+
+    def _invalidate_groups_for_user(self, user_id, *domain_ids):
+        for scope in set(domain_ids + (CONF.identity.default_domain_id,)):
+            self._scoped_list_groups_for_user.invalidate(self, user_id,
+                                                         scope)
+
+    def _invalidate_groups_for_members(self, user_refs, domain_id):
+        for user_ref in user_refs:
+            self._invalidate_groups_for_user(
+                user_ref['id'], domain_id,
+                user_ref.get('domain_id', domain_id))
+
     # The actual driver calls - these are pre/post processed here as
     # part of the Manager layer to make sure we:
     #
@@ -338,7 +369,13 @@ class Manager(manager.Manager):
 
     @domains_configured
     def get_user(self, user_id, domain_scope=None):
-        domain_id, driver = self._get_domain_id_and_driver(domain_scope)
+        return self._scoped_get_user(user_id,
+                                     self._normalize_scope(domain_scope))
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=CONF.identity.cache_time)
+    def _scoped_get_user(self, user_id, domain_id):
+        driver = self._select_identity_driver(domain_id)
         ref = driver.get_user(user_id)
         if not driver.is_domain_aware():
             ref = self._set_domain_id(ref, domain_id)
@@ -346,6 +383,11 @@ class Manager(manager.Manager):
 
     @domains_configured
     def get_user_by_name(self, user_name, domain_id):
+        return self._scoped_get_user_by_name(user_name, domain_id)
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=CONF.identity.cache_time)
+    def _scoped_get_user_by_name(self, user_name, domain_id):
         driver = self._select_identity_driver(domain_id)
         ref = driver.get_user_by_name(user_name, domain_id)
         if not driver.is_domain_aware():
@@ -353,9 +395,9 @@ class Manager(manager.Manager):
         return ref
 
     @domains_configured
-    def list_users(self, domain_scope=None):
+    def list_users(self, domain_scope=None, hints=None):
         domain_id, driver = self._get_domain_id_and_driver(domain_scope)
-        user_list = driver.list_users()
+        user_list = driver.list_users(hints)
         if not driver.is_domain_aware():
             user_list = self._set_domain_id(user_list, domain_id)
         return user_list
@@ -372,7 +414,10 @@ class Manager(manager.Manager):
         domain_id, driver = self._get_domain_id_and_driver(domain_scope)
         if not driver.is_domain_aware():
             user = self._clear_domain_id(user)
+        old_ref = driver.get_user(user_id)
         ref = driver.update_user(user_id, user)
+        self._invalidate_user(old_ref, domain_id)
+        self._invalidate_user(ref, domain_id)
         if not driver.is_domain_aware():
             ref = self._set_domain_id(ref, domain_id)
         return ref
@@ -381,7 +426,9 @@ class Manager(manager.Manager):
     @domains_configured
     def delete_user(self, user_id, domain_scope=None):
         domain_id, driver = self._get_domain_id_and_driver(domain_scope)
+        user_ref = driver.get_user(user_id)
         driver.delete_user(user_id)
+        self._invalidate_user(user_ref, domain_id)
 
     @notifications.created('group')
     @domains_configured
@@ -414,6 +461,8 @@ class Manager(manager.Manager):
         if not driver.is_domain_aware():
             group = self._clear_domain_id(group)
         ref = driver.update_group(group_id, group)
+        self._invalidate_groups_for_members(
+            driver.list_users_in_group(group_id), domain_id)
         if not driver.is_domain_aware():
             ref = self._set_domain_id(ref, domain_id)
         return ref
@@ -422,30 +471,42 @@ class Manager(manager.Manager):
     @domains_configured
     def delete_group(self, group_id, domain_scope=None):
         domain_id, driver = self._get_domain_id_and_driver(domain_scope)
+        user_refs = driver.list_users_in_group(group_id)
         driver.delete_group(group_id)
+        self._invalidate_groups_for_members(user_refs, domain_id)
 
     @domains_configured
     def add_user_to_group(self, user_id, group_id, domain_scope=None):
         domain_id, driver = self._get_domain_id_and_driver(domain_scope)
         driver.add_user_to_group(user_id, group_id)
+        self._invalidate_groups_for_user(user_id, domain_id)
+        self.assignment_api.refresh_effective_roles_for_user(user_id)
 
     @domains_configured
     def remove_user_from_group(self, user_id, group_id, domain_scope=None):
         domain_id, driver = self._get_domain_id_and_driver(domain_scope)
         driver.remove_user_from_group(user_id, group_id)
+        self._invalidate_groups_for_user(user_id, domain_id)
+        self.assignment_api.refresh_effective_roles_for_user(user_id)
 
     @domains_configured
     def list_groups_for_user(self, user_id, domain_scope=None):
-        domain_id, driver = self._get_domain_id_and_driver(domain_scope)
+        return self._scoped_list_groups_for_user(
+            user_id, self._normalize_scope(domain_scope))
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=CONF.identity.cache_time)
+    def _scoped_list_groups_for_user(self, user_id, domain_id):
+        driver = self._select_identity_driver(domain_id)
         group_list = driver.list_groups_for_user(user_id)
         if not driver.is_domain_aware():
             group_list = self._set_domain_id(group_list, domain_id)
         return group_list
 
     @domains_configured
-    def list_groups(self, domain_scope=None):
+    def list_groups(self, domain_scope=None, hints=None):
         domain_id, driver = self._get_domain_id_and_driver(domain_scope)
-        group_list = driver.list_groups()
+        group_list = driver.list_groups(hints)
         if not driver.is_domain_aware():
             group_list = self._set_domain_id(group_list, domain_id)
         return group_list
@@ -613,9 +674,11 @@ class Driver(object):
         raise exception.NotImplemented()
 
     @abc.abstractmethod
-    def list_users(self):
+    def list_users(self, hints=None):
         """List all users in the system.
 
+        :param hints: optional keystone.common.driver_hints.Hints; filters
+                      the driver satisfies are removed from it
         :returns: a list of user_refs or an empty list.
 
         """
@@ -710,9 +773,11 @@ class Driver(object):
         raise exception.NotImplemented()
 
     @abc.abstractmethod
-    def list_groups(self):
+    def list_groups(self, hints=None):
         """List all groups in the system.
 
+        :param hints: optional keystone.common.driver_hints.Hints; filters
+                      the driver satisfies are removed from it
         :returns: a list of group_refs or an empty list.
 
         """
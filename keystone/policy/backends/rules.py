@@ -15,9 +15,24 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-"""Policy engine for keystone"""
+"""Policy engine for keystone
 
+Rules are parsed by the common policy module and then compiled into plain
+closures so that enforcement does not walk the check tree on every call:
+nested and/or checks are flattened, role checks collapse into set
+operations against the caller's (lower-cased) roles, and ``rule:``
+references are inlined. Checks the compiler does not know about (such as
+``http:``) are still evaluated by the common policy module.
+
+"""
+
+import collections
 import os.path
+import re
+import threading
+import time
+
+import six
 
 from keystone.common import utils
 from keystone import config
@@ -34,15 +49,22 @@ LOG = logging.getLogger(__name__)
 _ENFORCER = None
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+_COMPILED = None
+
+# matches the %(name)s substitutions of a generic check
+_TARGET_KEY_RE = re.compile(r'%\(([^)]*)\)s')
+_MISSING = object()
 
 
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
     global _ENFORCER
+    global _COMPILED
     _POLICY_PATH = None
     _POLICY_CACHE = {}
     _ENFORCER = None
+    _COMPILED = None
 
 
 def init():
@@ -55,9 +77,15 @@ def init():
             _POLICY_PATH = CONF.find_file(_POLICY_PATH)
     if not _ENFORCER:
         _ENFORCER = common_policy.Enforcer(policy_file=_POLICY_PATH)
+
+    # only stat the policy file once per reload interval
+    now = time.time()
+    if now < _POLICY_CACHE.get('next_check', 0):
+        return
     utils.read_cached_file(_POLICY_PATH,
                            _POLICY_CACHE,
                            reload_func=_set_rules)
+    _POLICY_CACHE['next_check'] = now + CONF.policy.reload_interval
 
 
 def _set_rules(data):
@@ -65,6 +93,255 @@ def _set_rules(data):
     default_rule = CONF.policy_default_rule
     _ENFORCER.set_rules(common_policy.Rules.load_json(
         data, default_rule))
+    LOG.debug(_('Policy rules reloaded from %s'), _POLICY_PATH)
+
+
+class DecisionCache(object):
+    """Bounded LRU of policy decisions.
+
+    Only rules whose outcome depends solely on the caller's roles, the
+    credential attributes and target keys they name are memoized, keyed on
+    exactly those values.
+
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.pop(key, None)
+            if result is not None:
+                self._entries[key] = result
+            return result
+
+    def set(self, key, result):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = result
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+class _Compiler(object):
+    """Compiles a set of parsed rules into functions of the form
+    ``func(target, creds, roles)``, where roles is the frozenset of the
+    caller's lower-cased role names.
+
+    """
+
+    def __init__(self, rules, enforcer):
+        self.rules = rules
+        self.enforcer = enforcer
+        self.compiled = {}
+        self.dependencies = {}
+        self._compiling = set()
+
+    def resolve(self, name):
+        """Returns the rule name the common policy module would evaluate
+        for ``name``, honouring the default rule, or None.
+
+        """
+        if name in self.rules:
+            return name
+        default_rule = self.rules.default_rule
+        if (isinstance(default_rule, six.string_types) and
+                default_rule in self.rules):
+            return default_rule
+
+    def rule(self, name):
+        """Returns (func, dependencies) for the named rule.
+
+        ``dependencies`` is a (target_keys, cred_kinds) pair naming every
+        value the decision depends on besides roles, or None if the rule
+        cannot be memoized.
+
+        """
+        resolved = self.resolve(name)
+        if resolved is None:
+            return _false, ((), ())
+        if resolved in self.compiled:
+            return self.compiled[resolved], self.dependencies[resolved]
+        if resolved in self._compiling:
+            # a reference cycle; leave it to the common policy module
+            check = common_policy.RuleCheck('rule', resolved)
+            return self._interpreted(check), None
+
+        self._compiling.add(resolved)
+        try:
+            func, deps = self.check(self.rules[resolved])
+        finally:
+            self._compiling.discard(resolved)
+        self.compiled[resolved] = func
+        self.dependencies[resolved] = deps
+        return func, deps
+
+    def check(self, check):
+        if isinstance(check, common_policy.TrueCheck):
+            return _true, ((), ())
+        if isinstance(check, common_policy.FalseCheck):
+            return _false, ((), ())
+        if isinstance(check, common_policy.NotCheck):
+            func, deps = self.check(check.rule)
+            return (lambda target, creds, roles:
+                    not func(target, creds, roles)), deps
+        if isinstance(check, common_policy.AndCheck):
+            return self.combine(check, common_policy.AndCheck)
+        if isinstance(check, common_policy.OrCheck):
+            return self.combine(check, common_policy.OrCheck)
+        if type(check) is common_policy.RuleCheck:
+            return self.rule(check.match)
+        if type(check) is common_policy.RoleCheck:
+            wanted = check.match.lower()
+            return (lambda target, creds, roles: wanted in roles), ((), ())
+        if type(check) is common_policy.GenericCheck:
+            return self.generic(check)
+        return self._interpreted(check), None
+
+    def combine(self, check, check_class):
+        """Flattens nested and/or checks of the same kind, merging their
+        role checks into a single set operation.
+
+        """
+        role_names = set()
+        funcs = []
+        deps = [set(), set()]
+        pending = list(check.rules)
+        while pending:
+            sub = pending.pop(0)
+            if isinstance(sub, check_class):
+                pending[0:0] = sub.rules
+            elif type(sub) is common_policy.RoleCheck:
+                role_names.add(sub.match.lower())
+            else:
+                func, sub_deps = self.check(sub)
+                funcs.append(func)
+                if sub_deps is None or deps is None:
+                    deps = None
+                else:
+                    deps[0].update(sub_deps[0])
+                    deps[1].update(sub_deps[1])
+        if deps is not None:
+            deps = (tuple(sorted(deps[0])), tuple(sorted(deps[1])))
+
+        role_names = frozenset(role_names)
+        if check_class is common_policy.AndCheck:
+            if role_names:
+                funcs.insert(0, lambda target, creds, roles:
+                             role_names <= roles)
+
+            def all_of(target, creds, roles):
+                for f in funcs:
+                    if not f(target, creds, roles):
+                        return False
+                return True
+            func = all_of
+        else:
+            if role_names:
+                funcs.insert(0, lambda target, creds, roles:
+                             not role_names.isdisjoint(roles))
+
+            def any_of(target, creds, roles):
+                for f in funcs:
+                    if f(target, creds, roles):
+                        return True
+                return False
+            func = any_of
+
+        if len(funcs) == 1:
+            func = funcs[0]
+        return func, deps
+
+    def generic(self, check):
+        kind = check.kind
+        match = check.match
+        if '%' not in match:
+            match = six.text_type(match)
+
+            def func(target, creds, roles):
+                return (kind in creds and
+                        match == six.text_type(creds[kind]))
+            return func, ((), (kind,))
+
+        def func(target, creds, roles):
+            try:
+                value = match % target
+            except KeyError:
+                return False
+            if kind in creds:
+                return value == six.text_type(creds[kind])
+            return False
+
+        if '%' in _TARGET_KEY_RE.sub('', match.replace('%%', '')):
+            # substitution not keyed by name; depends on the whole target
+            return func, None
+        return func, (tuple(_TARGET_KEY_RE.findall(match)), (kind,))
+
+    def _interpreted(self, check):
+        enforcer = self.enforcer
+        return lambda target, creds, roles: check(target, creds, enforcer)
+
+
+def _true(target, creds, roles):
+    return True
+
+
+def _false(target, creds, roles):
+    return False
+
+
+class _CompiledRules(object):
+    """Compiled form of one version of the enforcer's rules."""
+
+    def __init__(self, rules, enforcer):
+        self.source = rules
+        self.compiler = _Compiler(rules, enforcer)
+        self.actions = {}
+        self.decisions = None
+        if CONF.policy.decision_cache_size > 0:
+            self.decisions = DecisionCache(CONF.policy.decision_cache_size)
+
+    def _decision_key(self, action, deps, target, creds, roles):
+        target_keys, cred_kinds = deps
+        key = [action, roles]
+        for name in target_keys:
+            value = target.get(name, _MISSING)
+            key.append((type(value), value))
+        for kind in cred_kinds:
+            value = creds.get(kind, _MISSING)
+            key.append((type(value), value))
+        return tuple(key)
+
+    def enforce(self, action, target, creds):
+        roles = frozenset(x.lower() for x in creds['roles'])
+        try:
+            func, deps = self.actions[action]
+        except KeyError:
+            func, deps = self.actions[action] = self.compiler.rule(action)
+        if self.decisions is None or deps is None:
+            return func(target, creds, roles)
+
+        key = self._decision_key(action, deps, target, creds, roles)
+        try:
+            result = self.decisions.get(key)
+        except TypeError:
+            # an unhashable value; not worth remembering
+            return func(target, creds, roles)
+        if result is None:
+            result = bool(func(target, creds, roles))
+            self.decisions.set(key, result)
+        return result
+
+
+def _get_compiled():
+    global _COMPILED
+    # set_rules() always installs a new Rules object, so identity tells us
+    # whether the compiled form is still current
+    if _COMPILED is None or _COMPILED.source is not _ENFORCER.rules:
+        _COMPILED = _CompiledRules(_ENFORCER.rules, _ENFORCER)
+    return _COMPILED
 
 
 def enforce(credentials, action, target, do_raise=True):
@@ -86,13 +363,23 @@ def enforce(credentials, action, target, do_raise=True):
     """
     init()
 
-    # Add the exception arguments if asked to do a raise
-    extra = {}
-    if do_raise:
-        extra.update(exc=exception.ForbiddenAction, action=action,
-                     do_raise=do_raise)
+    if 'roles' not in credentials:
+        # role checks raise KeyError part way through the rule; keep the
+        # common policy module's semantics for such credentials
+        extra = {}
+        if do_raise:
+            extra.update(exc=exception.ForbiddenAction, action=action,
+                         do_raise=do_raise)
+        return _ENFORCER.enforce(action, target, credentials, **extra)
+
+    try:
+        result = _get_compiled().enforce(action, target, credentials)
+    except KeyError:
+        result = False
 
-    return _ENFORCER.enforce(action, target, credentials, **extra)
+    if do_raise and not result:
+        raise exception.ForbiddenAction(action=action)
+    return result
 
 
 class Policy(policy.Driver):
@@ -254,6 +254,33 @@ class AuthWithToken(AuthTest):
         self.assertEqual(tenant["id"], self.tenant_bar['id'])
         self.assertEqual(roles[0], self.role_member['id'])
 
+        # role names are stored for policy checks
+        token_ref = self.token_api.get_token(
+            scoped_token["access"]["token"]["id"])
+        self.assertIn(self.role_member['name'],
+                      token_ref['metadata']['role_names'])
+
+    def test_catalog_not_persisted(self):
+        body_dict = _build_user_auth(
+            username='FOO',
+            password='foo2',
+            tenant_name='BAR')
+        scoped_token = self.controller.authenticate({}, body_dict)
+        token_id = scoped_token['access']['token']['id']
+        catalog = scoped_token['access']['serviceCatalog']
+        self.assertTrue(catalog)
+
+        token_ref = self.token_api.get_token(token_id)
+        self.assertNotIn('serviceCatalog', token_ref['token_data']['access'])
+        self.assertEqual({'user_id': self.user_foo['id'],
+                          'project_id': self.tenant_bar['id']},
+                         token_ref['catalog_scope'])
+
+        token_data = self.token_provider_api.validate_v2_token(token_id)
+        self.assertEqual(catalog, token_data['access']['serviceCatalog'])
+        token_ref = self.token_api.get_token(token_id)
+        self.assertNotIn('serviceCatalog', token_ref['token_data']['access'])
+
     def test_auth_token_project_group_role(self):
         """Verify getting a token in a tenant with group roles."""
         # Add a v2 style role in so we can check we get this back
@@ -545,6 +545,55 @@ class IdentityTests(object):
             role_id=uuid.uuid4().hex)
         self.assertEqual(assignment_list, [])
 
+    def test_list_role_assignments_filtered(self):
+        new_domain = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        self.assignment_api.create_domain(new_domain['id'], new_domain)
+        new_user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                    'password': uuid.uuid4().hex, 'enabled': True,
+                    'domain_id': new_domain['id']}
+        self.identity_api.create_user(new_user['id'], new_user)
+        new_group = {'id': uuid.uuid4().hex, 'domain_id': new_domain['id'],
+                     'name': uuid.uuid4().hex}
+        self.identity_api.create_group(new_group['id'], new_group)
+        new_project = {'id': uuid.uuid4().hex,
+                       'name': uuid.uuid4().hex,
+                       'domain_id': new_domain['id']}
+        self.assignment_api.create_project(new_project['id'], new_project)
+        user_domain = {'user_id': new_user['id'],
+                       'domain_id': new_domain['id'], 'role_id': 'member'}
+        user_project = {'user_id': new_user['id'],
+                        'project_id': new_project['id'], 'role_id': 'other'}
+        group_domain = {'group_id': new_group['id'],
+                        'domain_id': new_domain['id'], 'role_id': 'admin'}
+        group_project = {'group_id': new_group['id'],
+                         'project_id': new_project['id'], 'role_id': 'admin'}
+        for grant in (user_domain, user_project, group_domain, group_project):
+            self.assignment_api.create_grant(**grant)
+
+        def _assertAssignments(expected, **kwargs):
+            assignment_list = self.assignment_api.list_role_assignments(
+                **kwargs)
+            self.assertEqual(sorted(expected), sorted(assignment_list))
+
+        _assertAssignments([user_domain, user_project],
+                           user_id=new_user['id'])
+        _assertAssignments([group_domain, group_project],
+                           group_ids=[new_group['id']])
+        _assertAssignments(
+            [user_domain, user_project, group_domain, group_project],
+            user_id=new_user['id'], group_ids=[new_group['id']])
+        _assertAssignments([user_project, group_project],
+                           project_ids=[new_project['id']])
+        _assertAssignments([user_domain, group_domain],
+                           domain_id=new_domain['id'])
+        _assertAssignments([user_domain], user_id=new_user['id'],
+                           domain_id=new_domain['id'])
+        _assertAssignments([group_domain, group_project],
+                           role_id='admin', user_id=new_user['id'],
+                           group_ids=[new_group['id']])
+        _assertAssignments([], user_id=new_user['id'], group_ids=[],
+                           domain_id=uuid.uuid4().hex)
+
     def test_add_duplicate_role_grant(self):
         roles_ref = self.assignment_api.get_roles_for_user_and_project(
             self.user_foo['id'], self.tenant_bar['id'])
@@ -2746,6 +2795,108 @@ class IdentityTests(object):
                           self.assignment_api.get_role,
                           role_id)
 
+    def test_get_role_names(self):
+        role_ids = [self.role_member['id'], self.role_admin['id']]
+        self.assertEqual(
+            [self.role_member['name'], self.role_admin['name']],
+            self.assignment_api.get_role_names(role_ids))
+        self.assertEqual([], self.assignment_api.get_role_names([]))
+        self.assertRaises(exception.RoleNotFound,
+                          self.assignment_api.get_role_names,
+                          [self.role_member['id'], uuid.uuid4().hex])
+
+    @tests.skip_if_cache_disabled('assignment')
+    def test_cache_layer_role_names(self):
+        role = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        role_id = role['id']
+        self.assignment_api.get_role_name_map()
+        # Create role via the assignment api manager
+        self.assignment_api.create_role(role_id, role)
+        self.assertEqual([role['name']],
+                         self.assignment_api.get_role_names([role_id]))
+        # Update role, bypassing the assignment api manager
+        updated_role = {'id': role_id, 'name': uuid.uuid4().hex}
+        self.assignment_api.driver.update_role(role_id, updated_role)
+        # Verify the cached name is still returned
+        self.assertEqual([role['name']],
+                         self.assignment_api.get_role_names([role_id]))
+        # Update role back via the assignment api manager
+        self.assignment_api.update_role(role_id, role)
+        self.assertEqual([role['name']],
+                         self.assignment_api.get_role_names([role_id]))
+        # Delete role via the assignment api manager
+        self.assignment_api.delete_role(role_id)
+        self.assertNotIn(role_id, self.assignment_api.get_role_name_map())
+
+    @tests.skip_if_cache_disabled('identity')
+    def test_cache_layer_user_crud(self):
+        user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                'domain_id': DEFAULT_DOMAIN_ID, 'password': uuid.uuid4().hex,
+                'email': uuid.uuid4().hex}
+        user_id = user['id']
+        self.identity_api.create_user(user_id, user)
+        user_ref = self.identity_api.get_user(user_id)
+        user_ref_by_name = self.identity_api.get_user_by_name(
+            user['name'], DEFAULT_DOMAIN_ID)
+        # Update user, bypassing the identity api manager
+        self.identity_api.driver.update_user(user_id,
+                                             {'email': uuid.uuid4().hex})
+        # Verify get_user and get_user_by_name still return the old ref
+        self.assertDictEqual(user_ref, self.identity_api.get_user(user_id))
+        self.assertDictEqual(
+            user_ref_by_name,
+            self.identity_api.get_user_by_name(user['name'],
+                                               DEFAULT_DOMAIN_ID))
+        # Update user via the identity api manager
+        email = uuid.uuid4().hex
+        self.identity_api.update_user(user_id, {'email': email})
+        # Verify get_user and get_user_by_name return the new ref
+        self.assertEqual(self.identity_api.get_user(user_id)['email'], email)
+        self.assertEqual(
+            self.identity_api.get_user_by_name(
+                user['name'], DEFAULT_DOMAIN_ID)['email'],
+            email)
+        # Delete user via the identity api manager
+        self.identity_api.delete_user(user_id)
+        # Verify UserNotFound is now raised
+        self.assertRaises(exception.UserNotFound,
+                          self.identity_api.get_user,
+                          user_id)
+        self.assertRaises(exception.UserNotFound,
+                          self.identity_api.get_user_by_name,
+                          user['name'],
+                          DEFAULT_DOMAIN_ID)
+
+    @tests.skip_if_cache_disabled('identity')
+    def test_cache_layer_groups_for_user(self):
+        group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                 'domain_id': DEFAULT_DOMAIN_ID}
+        self.identity_api.create_group(group['id'], group)
+        user_id = self.user_foo['id']
+        groups = self.identity_api.list_groups_for_user(user_id)
+        # Add user to group, bypassing the identity api manager
+        self.identity_api.driver.add_user_to_group(user_id, group['id'])
+        # Verify list_groups_for_user still returns the old list
+        self.assertEqual(groups,
+                         self.identity_api.list_groups_for_user(user_id))
+        # Remove and add the user via the identity api manager
+        self.identity_api.remove_user_from_group(user_id, group['id'])
+        self.identity_api.add_user_to_group(user_id, group['id'])
+        group_ids = [x['id'] for x in
+                     self.identity_api.list_groups_for_user(user_id)]
+        self.assertIn(group['id'], group_ids)
+        # Rename the group via the identity api manager
+        group['name'] = uuid.uuid4().hex
+        self.identity_api.update_group(group['id'], group)
+        group_names = [x['name'] for x in
+                       self.identity_api.list_groups_for_user(user_id)]
+        self.assertIn(group['name'], group_names)
+        # Delete the group via the identity api manager
+        self.identity_api.delete_group(group['id'])
+        group_ids = [x['id'] for x in
+                     self.identity_api.list_groups_for_user(user_id)]
+        self.assertNotIn(group['id'], group_ids)
+
     def create_user_dict(self, **attributes):
         user_dict = {'id': uuid.uuid4().hex,
                      'name': uuid.uuid4().hex,
@@ -2879,6 +3030,21 @@ class TokenTests(object):
 
         self.token_api.get_token(token_id3)
 
+    def test_delete_tokens_returns_deleted_ids(self):
+        token_id1 = self.create_token_sample_data('testtenantid')
+        token_id2 = self.create_token_sample_data('testtenantid')
+        token_id3 = self.create_token_sample_data('othertenantid')
+        token_id4 = self.create_token_sample_data()
+        deleted = self.token_api.driver.delete_tokens(
+            user_id='testuserid', tenant_id='testtenantid')
+        self.assertItemsEqual([token_id1, token_id2], deleted)
+        self.token_api.get_token(token_id3)
+
+        deleted = self.token_api.driver.delete_tokens(user_id='testuserid')
+        self.assertItemsEqual([token_id3, token_id4], deleted)
+        self.assertEqual([], self.token_api.driver.delete_tokens(
+            user_id='testuserid'))
+
     def test_delete_tokens_trust(self):
         tokens = self.token_api._list_tokens(user_id='testuserid')
         self.assertEqual(len(tokens), 0)
@@ -3151,6 +3317,55 @@ class TokenTests(object):
         for t in self.token_api.list_revoked_tokens():
             self.assertIn('expires', t)
 
+    def test_revocation_list_revision(self):
+        self.assertEqual({'revoked': [], 'revision': None},
+                         self.token_api.get_revocation_list())
+
+        # both tokens are revoked within the same second
+        now = timeutils.utcnow().replace(microsecond=0)
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.set_time_override(now)
+        first_id = self.delete_token()
+        first_revision = self.token_api.get_revocation_list()['revision']
+
+        second_id = self.delete_token()
+        revocation_list = self.token_api.get_revocation_list()
+        self.assertGreater(revocation_list['revision'], first_revision)
+        self.assertEqual(sorted([first_id, second_id]),
+                         [t['id'] for t in revocation_list['revoked']])
+        for t in revocation_list['revoked']:
+            self.assertEqual(['expires', 'id'], sorted(t.keys()))
+
+        delta = self.token_api.get_revocation_list(since=first_revision)
+        self.assertEqual([second_id], [t['id'] for t in delta['revoked']])
+        self.assertEqual(revocation_list['revision'], delta['revision'])
+        delta = self.token_api.get_revocation_list(
+            since=str(revocation_list['revision']))
+        self.assertEqual([], delta['revoked'])
+        self.assertEqual(revocation_list['revision'], delta['revision'])
+
+    def test_revocation_list_revision_never_decreases(self):
+        now = timeutils.utcnow()
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.set_time_override(now)
+        token_id = uuid.uuid4().hex
+        self.token_api.create_token(
+            token_id, {'id': token_id, 'user': {'id': 'testuserid'},
+                       'expires': now + datetime.timedelta(minutes=1)})
+        self.token_api.delete_token(token_id)
+        revision = self.token_api.get_revocation_list()['revision']
+
+        # the only revoked token expires
+        timeutils.set_time_override(now + datetime.timedelta(minutes=2))
+        self.token_api.invalidate_revocation_list()
+        self.assertEqual({'revoked': [], 'revision': revision},
+                         self.token_api.get_revocation_list(since=revision))
+
+    def test_revocation_list_invalid_since(self):
+        self.assertRaises(exception.ValidationError,
+                          self.token_api.get_revocation_list,
+                          since='yesterday')
+
 
 class TokenCacheInvalidation(object):
     def _create_test_data(self):
@@ -3796,3 +4011,33 @@ class InheritanceTests(object):
         # project3 (since it has both a direct user role and an inherited role)
         user_projects = self.assignment_api.list_projects_for_user(user1['id'])
         self.assertEqual(len(user_projects), 5)
+
+    def test_list_role_assignments_filtered_by_inheritance(self):
+        self.opt_in_group('os_inherit', enabled=True)
+        domain = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        self.assignment_api.create_domain(domain['id'], domain)
+        user1 = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                 'domain_id': domain['id'], 'password': uuid.uuid4().hex,
+                 'enabled': True}
+        self.identity_api.create_user(user1['id'], user1)
+        self.assignment_api.create_grant(user_id=user1['id'],
+                                         domain_id=domain['id'],
+                                         role_id=self.role_member['id'])
+        self.assignment_api.create_grant(user_id=user1['id'],
+                                         domain_id=domain['id'],
+                                         role_id=self.role_admin['id'],
+                                         inherited_to_projects=True)
+
+        assignment_list = self.assignment_api.list_role_assignments(
+            user_id=user1['id'], inherited_to_projects=True)
+        self.assertEqual([{'user_id': user1['id'],
+                           'domain_id': domain['id'],
+                           'role_id': self.role_admin['id'],
+                           'inherited_to_projects': True}],
+                         assignment_list)
+        assignment_list = self.assignment_api.list_role_assignments(
+            user_id=user1['id'], inherited_to_projects=False)
+        self.assertEqual([{'user_id': user1['id'],
+                           'domain_id': domain['id'],
+                           'role_id': self.role_member['id']}],
+                         assignment_list)
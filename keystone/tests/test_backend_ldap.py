@@ -22,6 +22,7 @@ import ldap
 
 from keystone import assignment
 from keystone.common import cache
+from keystone.common import driver_hints
 from keystone.common import ldap as common_ldap
 from keystone.common import sql
 from keystone import config
@@ -119,6 +120,12 @@ class BaseLDAPIdentity(test_backend.IdentityTests):
         conf = self.get_config(user_ref['domain_id'])
         conf.ldap.user_filter = '(CN=DOES_NOT_MATCH)'
         self.reload_backends(user_ref['domain_id'])
+        # NOTE: CONF.ldap.user_filter will not be dynamically changed at
+        # runtime. This invalidate is a work-around for the expectation that
+        # it is safe to change config values in tests that could affect what
+        # the drivers would return up to the manager.
+        self.identity_api._scoped_get_user.invalidate(
+            self.identity_api, self.user_foo['id'], user_ref['domain_id'])
         self.assertRaises(exception.UserNotFound,
                           self.identity_api.get_user,
                           self.user_foo['id'])
@@ -221,6 +228,9 @@ class BaseLDAPIdentity(test_backend.IdentityTests):
     def test_list_role_assignments_bad_role(self):
         self.skipTest('Blocked by bug 1221805')
 
+    def test_list_role_assignments_filtered(self):
+        self.skipTest('Blocked by bug 1221805')
+
     def test_multi_group_grants_on_project_domain(self):
         self.skipTest('Blocked by bug 1101287')
 
@@ -904,6 +914,18 @@ class LDAPIdentity(tests.TestCase, BaseLDAPIdentity):
         self.skipTest(
             'N/A: LDAP does not support multiple domains')
 
+    def test_list_projects_filtered_by_domain(self):
+        # domain_id is not stored, so the filter is left to the controller
+        hints = driver_hints.Hints()
+        hints.add_filter('domain_id', CONF.identity.default_domain_id)
+        hints.add_filter('name', self.tenant_bar['name'])
+        projects = self.assignment_api.driver.list_projects(hints=hints)
+        self.assertEqual([self.tenant_bar['id']],
+                         [project['id'] for project in projects])
+        self.assertEqual([{'name': 'domain_id',
+                           'value': CONF.identity.default_domain_id}],
+                         hints.filters)
+
     def test_create_grant_no_user(self):
         # The LDAP assignment backend doesn't implement create_grant.
         self.assertRaises(
@@ -991,6 +1013,153 @@ class LDAPIdentityEnabledEmulation(LDAPIdentity):
             "Enabled emulation conflicts with enabled mask")
 
 
+class LDAPIdentityPooled(LDAPIdentity):
+    def setUp(self):
+        super(LDAPIdentityPooled, self).setUp()
+        self.opt_in_group('ldap', use_pool=True, pool_size=2,
+                          pool_retry_delay=0, use_auth_pool=True)
+        common_ldap.core._POOLS.clear()
+        self.addCleanup(common_ldap.core._POOLS.clear)
+        self.addCleanup(setattr, fakeldap, 'server_fail', False)
+        self.clear_database()
+        self.load_backends()
+        self.load_fixtures(default_fixtures)
+
+    def test_connections_are_reused(self):
+        user_api = self.identity_api.driver.user
+        conn = user_api.get_connection()
+        ldap_conn = conn._conn
+        conn.unbind_s()
+
+        # Every LDAP backend bound as the service user shares the pool.
+        conn = self.identity_api.driver.group.get_connection()
+        self.assertIs(ldap_conn, conn._conn)
+        conn.unbind_s()
+
+    def test_connections_not_shared_across_settings(self):
+        user_api = self.identity_api.driver.user
+        conn = user_api.get_connection()
+        ldap_conn = conn._conn
+        conn.unbind_s()
+
+        # as with a domain specific configuration using the same server
+        other_api = identity.backends.ldap.UserApi(CONF)
+        other_api.LDAP_USER = user_api._id_to_dn(self.user_foo['id'])
+        other_api.LDAP_PASSWORD = self.user_foo['password']
+        conn = other_api.get_connection()
+        self.assertIsNot(ldap_conn, conn._conn)
+        conn.unbind_s()
+
+        other_api = identity.backends.ldap.UserApi(CONF)
+        other_api.tls_cacertfile = tests.dirs.tmp('other_ca.pem')
+        conn = other_api.get_connection()
+        self.assertIsNot(ldap_conn, conn._conn)
+        conn.unbind_s()
+
+    def test_auth_binds_use_separate_pool(self):
+        user_api = self.identity_api.driver.user
+        conn = user_api.get_connection()
+        ldap_conn = conn._conn
+        conn.unbind_s()
+
+        auth_conn = user_api.get_connection(
+            user_api._id_to_dn(self.user_foo['id']),
+            self.user_foo['password'])
+        self.assertIsNot(ldap_conn, auth_conn._conn)
+        auth_conn.unbind_s()
+
+        self.identity_api.authenticate(user_id=self.user_foo['id'],
+                                       password=self.user_foo['password'])
+        conn = user_api.get_connection()
+        self.assertIs(ldap_conn, conn._conn)
+        conn.unbind_s()
+
+    def test_failed_auth_bind_releases_connection(self):
+        for _ in range(3):
+            self.assertRaises(AssertionError,
+                              self.identity_api.authenticate,
+                              user_id=self.user_foo['id'],
+                              password=uuid.uuid4().hex)
+        user_api = self.identity_api.driver.user
+        pool = common_ldap.core._POOLS[user_api._pool_key('auth')]
+        self.assertEqual(0, pool._in_use)
+
+    def test_reconnect_on_server_down(self):
+        user_api = self.identity_api.driver.user
+        conn = user_api.get_connection()
+        ldap_conn = conn._conn
+
+        def _server_down(*args, **kwargs):
+            raise ldap.SERVER_DOWN
+
+        self.stubs.Set(ldap_conn, 'search_s', _server_down)
+        conn.search_s(user_api.tree_dn, ldap.SCOPE_ONELEVEL,
+                      '(objectclass=*)')
+        self.assertIsNot(ldap_conn, conn._conn)
+        conn.unbind_s()
+
+    def test_server_down_after_retries(self):
+        user_api = self.identity_api.driver.user
+        conn = user_api.get_connection()
+        fakeldap.server_fail = True
+        self.assertRaises(ldap.SERVER_DOWN, conn.search_s,
+                          user_api.tree_dn, ldap.SCOPE_ONELEVEL,
+                          '(objectclass=*)')
+        conn.unbind_s()
+        fakeldap.server_fail = False
+
+        pool = common_ldap.core._POOLS[
+            user_api._pool_key(CONF.ldap.user, CONF.ldap.password)]
+        self.assertEqual(0, pool._in_use)
+
+    def test_write_is_not_replayed(self):
+        user_api = self.identity_api.driver.user
+        conn = user_api.get_connection()
+        ldap_conn = conn._conn
+        calls = []
+
+        def _server_down(*args, **kwargs):
+            calls.append(args)
+            raise ldap.SERVER_DOWN
+
+        self.stubs.Set(ldap_conn, 'delete_s', _server_down)
+        self.assertRaises(ldap.SERVER_DOWN, conn.delete_s,
+                          user_api._id_to_dn(self.user_foo['id']))
+        self.assertEqual(1, len(calls))
+        conn.unbind_s()
+
+        pool = common_ldap.core._POOLS[
+            user_api._pool_key(CONF.ldap.user, CONF.ldap.password)]
+        self.assertEqual(0, pool._in_use)
+
+    def test_dead_connection_replaced_before_write(self):
+        user_api = self.identity_api.driver.user
+        conn = user_api.get_connection()
+        ldap_conn = conn._conn
+
+        def _server_down(*args, **kwargs):
+            raise ldap.SERVER_DOWN
+
+        self.stubs.Set(ldap_conn, 'search_s', _server_down)
+        self.stubs.Set(ldap_conn, 'delete_s', _server_down)
+        conn.delete_s(user_api._id_to_dn(self.user_foo['id']))
+        self.assertIsNot(ldap_conn, conn._conn)
+        conn.unbind_s()
+        self.assertRaises(exception.UserNotFound,
+                          self.identity_api.get_user, self.user_foo['id'])
+
+    def test_pool_connection_timeout(self):
+        common_ldap.core._POOLS.clear()
+        user_api = self.identity_api.driver.user
+        user_api.pool_connection_timeout = 0
+        conns = [user_api.get_connection() for _ in range(2)]
+        self.assertRaises(exception.UnexpectedError,
+                          user_api.get_connection)
+        conns.pop().unbind_s()
+        user_api.get_connection().unbind_s()
+        conns.pop().unbind_s()
+
+
 class LdapIdentitySqlAssignment(sql.Base, tests.TestCase, BaseLDAPIdentity):
 
     def _set_config(self):
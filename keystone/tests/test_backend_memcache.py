@@ -41,19 +41,29 @@ class MemcacheClient(object):
         """Ignores the passed in args."""
         self.cache = {}
         self.reject_cas = False
+        self.get_calls = 0
+        self.get_multi_calls = 0
 
-    def add(self, key, value):
+    def add(self, key, value, time=0):
         if self.get(key):
             return False
-        return self.set(key, value)
+        return self.set(key, value, time=time)
 
     def append(self, key, value):
         existing_value = self.get(key)
         if existing_value:
-            self.set(key, existing_value + value)
+            self.set(key, existing_value + value, time=self.cache[key][1])
             return True
         return False
 
+    def incr(self, key, delta=1):
+        existing_value = self.get(key)
+        if existing_value is None:
+            return None
+        value = int(existing_value) + delta
+        self.set(key, str(value), time=self.cache[key][1])
+        return value
+
     def check_key(self, key):
         if not isinstance(key, str):
             raise memcache.Client.MemcachedStringEncodingError()
@@ -65,6 +75,7 @@ class MemcacheClient(object):
     def get(self, key):
         """Retrieves the value for a key or None."""
         self.check_key(key)
+        self.get_calls += 1
         obj = self.cache.get(key)
         now = utils.unixtime(timeutils.utcnow())
         if obj and (obj[1] == 0 or obj[1] > now):
@@ -78,6 +89,16 @@ class MemcacheClient(object):
             data_copy = copy.deepcopy(obj[0])
             return data_copy
 
+    def get_multi(self, keys):
+        """Retrieves the values for the keys that have one."""
+        self.get_multi_calls += 1
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
     def set(self, key, value, time=0):
         """Sets the value for a key."""
         self.check_key(key)
@@ -149,14 +170,15 @@ class MemcacheToken(tests.TestCase, test_backend.TokenTests):
         expired_token_id = uuid.uuid4().hex
         user_id = unicode(uuid.uuid4().hex)
 
-        expire_delta = datetime.timedelta(seconds=86400)
+        now = timeutils.utcnow()
 
         valid_data = {'id': valid_token_id, 'a': 'b',
                       'user': {'id': user_id}}
         second_valid_data = {'id': second_valid_token_id, 'a': 'b',
                              'user': {'id': user_id}}
         expired_data = {'id': expired_token_id, 'a': 'b',
-                        'user': {'id': user_id}}
+                        'user': {'id': user_id},
+                        'expires': now + datetime.timedelta(minutes=1)}
         self.token_api.create_token(valid_token_id, valid_data)
         self.token_api.create_token(expired_token_id, expired_data)
         # NOTE(morganfainberg): Directly access the data cache since we need to
@@ -166,16 +188,211 @@ class MemcacheToken(tests.TestCase, test_backend.TokenTests):
         user_record = self.token_api.driver.client.get(user_key)
         user_token_list = jsonutils.loads('[%s]' % user_record)
         self.assertEqual(len(user_token_list), 2)
-        expired_token_ptk = self.token_api.driver._prefix_token_id(
-            expired_token_id)
-        expired_token = self.token_api.driver.client.get(expired_token_ptk)
-        expired_token['expires'] = (timeutils.utcnow() - expire_delta)
-        self.token_api.driver.client.set(expired_token_ptk, expired_token)
 
+        timeutils.set_time_override(now + datetime.timedelta(minutes=2))
+        client = self.token_api.driver.client
+        client.get_calls = 0
         self.token_api.create_token(second_valid_token_id, second_valid_data)
+        # the expiry stored in the index is enough to prune expired tokens,
+        # only the index itself is read
+        self.assertEqual(1, client.get_calls)
         user_record = self.token_api.driver.client.get(user_key)
         user_token_list = jsonutils.loads('[%s]' % user_record)
         self.assertEqual(len(user_token_list), 2)
+        self.assertNotIn(expired_token_id,
+                         [entry[0] for entry in user_token_list])
+
+    def test_cleanup_legacy_user_index_on_create(self):
+        valid_token_id = uuid.uuid4().hex
+        missing_token_id = uuid.uuid4().hex
+        new_token_id = uuid.uuid4().hex
+        user_id = unicode(uuid.uuid4().hex)
+        self.token_api.create_token(valid_token_id,
+                                    {'id': valid_token_id,
+                                     'user': {'id': user_id}})
+        # index entries written without an expiry are checked against the
+        # token itself
+        user_key = self.token_api.driver._prefix_user_id(user_id)
+        client = self.token_api.driver.client
+        client.set(user_key, ','.join([jsonutils.dumps(valid_token_id),
+                                       jsonutils.dumps(missing_token_id)]))
+
+        self.token_api.create_token(new_token_id,
+                                    {'id': new_token_id,
+                                     'user': {'id': user_id}})
+        user_token_list = jsonutils.loads('[%s]' % client.get(user_key))
+        self.assertEqual([valid_token_id, new_token_id],
+                         [entry[0] for entry in user_token_list])
+        self.assertIsNotNone(user_token_list[0][1])
+        self.assertItemsEqual([valid_token_id, new_token_id],
+                              self.token_api._list_tokens(user_id))
+
+    def test_list_tokens_uses_batched_gets(self):
+        user_id = unicode(uuid.uuid4().hex)
+        token_ids = []
+        for _i in range(10):
+            token_id = uuid.uuid4().hex
+            self.token_api.create_token(token_id,
+                                        {'id': token_id,
+                                         'user': {'id': user_id}})
+            token_ids.append(token_id)
+        client = self.token_api.driver.client
+        client.get_multi_calls = 0
+        self.assertItemsEqual(token_ids, self.token_api._list_tokens(user_id))
+        # one read for the index and one for all of the tokens
+        self.assertEqual(2, client.get_multi_calls)
+
+    def test_sharded_user_index(self):
+        self.opt_in_group('memcache', user_index_shards=4)
+        user_id = unicode(uuid.uuid4().hex)
+        token_ids = []
+        for _i in range(20):
+            token_id = uuid.uuid4().hex
+            self.token_api.create_token(token_id,
+                                        {'id': token_id,
+                                         'user': {'id': user_id}})
+            token_ids.append(token_id)
+        client = self.token_api.driver.client
+        user_keys = self.token_api.driver._user_index_keys(user_id)
+        self.assertEqual(4, len(user_keys))
+        indexed = []
+        for user_key in user_keys:
+            record = client.get(user_key)
+            if record:
+                indexed.extend(entry[0] for entry in
+                               jsonutils.loads('[%s]' % record))
+        self.assertItemsEqual(token_ids, indexed)
+        self.assertItemsEqual(token_ids, self.token_api._list_tokens(user_id))
+
+        self.token_api.delete_tokens(user_id)
+        self.assertEqual([], self.token_api._list_tokens(user_id))
+
+    def test_lowered_user_index_shards(self):
+        self.opt_in_group('memcache', user_index_shards=4)
+        user_id = unicode(uuid.uuid4().hex)
+        token_ids = []
+        for _i in range(20):
+            token_id = uuid.uuid4().hex
+            self.token_api.create_token(token_id,
+                                        {'id': token_id,
+                                         'user': {'id': user_id}})
+            token_ids.append(token_id)
+
+        self.opt_in_group('memcache', user_index_shards=1,
+                          previous_user_index_shards=4)
+        self.assertItemsEqual(token_ids, self.token_api._list_tokens(user_id))
+        self.token_api.delete_tokens(user_id)
+        self.assertEqual([], self.token_api._list_tokens(user_id))
+
+    def _revoke_token(self, expires):
+        token_id = uuid.uuid4().hex
+        self.token_api.create_token(token_id,
+                                    {'id': token_id,
+                                     'expires': expires,
+                                     'user': {'id': uuid.uuid4().hex}})
+        self.token_api.driver.delete_token(token_id)
+        return token_id
+
+    def test_revocation_list_is_bucketed_by_expiry(self):
+        now = timeutils.utcnow()
+        soon_id = self._revoke_token(now + datetime.timedelta(minutes=10))
+        later_id = self._revoke_token(now + datetime.timedelta(hours=5))
+        driver = self.token_api.driver
+        bucket_keys = [key for key in driver.client.cache
+                       if key.startswith(driver.revocation_key)]
+        self.assertEqual(2, len(bucket_keys))
+        self.assertItemsEqual(
+            [soon_id, later_id],
+            [t['id'] for t in driver.list_revoked_tokens()])
+        for t in driver.list_revoked_tokens():
+            self.assertEqual(['expires', 'id', 'revision', 'revoked_at'],
+                             sorted(t.keys()))
+
+        # the bucket of the first token disappears once its tokens expire
+        timeutils.set_time_override(now + datetime.timedelta(hours=2))
+        self.assertEqual([later_id],
+                         [t['id'] for t in driver.list_revoked_tokens()])
+        self.assertIsNone(driver.client.get(
+            driver._revocation_bucket_key(driver._revocation_bucket(now))))
+
+    def test_revoked_token_without_expiry(self):
+        driver = self.token_api.driver
+        token_id = uuid.uuid4().hex
+        driver._add_to_revocation_list({'id': token_id, 'expires': None})
+        bucket_key = driver._revocation_bucket_key(None)
+        self.assertEqual(0, driver.client.cache[bucket_key][1])
+        self.assertEqual([token_id],
+                         [t['id'] for t in driver.list_revoked_tokens()])
+
+        timeutils.set_time_override(
+            timeutils.utcnow() + datetime.timedelta(days=365))
+        self.assertEqual([{'id': token_id, 'expires': None}],
+                         self.token_api.get_revocation_list()['revoked'])
+
+    def test_lowered_token_expiration(self):
+        now = timeutils.utcnow()
+        token_id = self._revoke_token(now + datetime.timedelta(hours=5))
+        self.opt_in_group('token', expiration=600)
+        self.assertEqual(
+            [token_id],
+            [t['id'] for t in self.token_api.driver.list_revoked_tokens()])
+
+    def test_legacy_revoked_token_without_expiry(self):
+        token_ref = {'id': uuid.uuid4().hex,
+                     'expires': None,
+                     'user': {'id': uuid.uuid4().hex}}
+        driver = self.token_api.driver
+        driver.client.set(driver.revocation_key, jsonutils.dumps(token_ref))
+        self.assertEqual([{'id': token_ref['id'], 'expires': None}],
+                         driver.list_revoked_tokens())
+
+        timeutils.set_time_override(
+            timeutils.utcnow() + datetime.timedelta(days=365))
+        self.assertEqual([token_ref['id']],
+                         [t['id'] for t in driver.list_revoked_tokens()])
+
+    def test_revision_counter_lost(self):
+        now = timeutils.utcnow()
+        driver = self.token_api.driver
+        self._revoke_token(now + datetime.timedelta(hours=1))
+        revision = driver.list_revoked_tokens()[0]['revision']
+
+        # evicted: the next revision follows those still listed
+        timeutils.set_time_override(now - datetime.timedelta(days=1))
+        driver.client.delete(driver.revision_key)
+        second_id = self._revoke_token(now + datetime.timedelta(hours=1))
+        revisions = dict((t['id'], t['revision'])
+                         for t in driver.list_revoked_tokens())
+        self.assertEqual(revision + 1, revisions[second_id])
+
+        # restarted: the next revision is above any reached before
+        timeutils.set_time_override(now + datetime.timedelta(seconds=1))
+        driver.client.cache.clear()
+        third_id = self._revoke_token(now + datetime.timedelta(hours=1))
+        self.assertEqual([third_id],
+                         [t['id'] for t in driver.list_revoked_tokens()])
+        self.assertGreater(driver.list_revoked_tokens()[0]['revision'],
+                           revisions[second_id])
+
+    def test_legacy_revocation_list(self):
+        now = timeutils.utcnow()
+        valid = {'id': uuid.uuid4().hex,
+                 'expires': now + datetime.timedelta(hours=1),
+                 'user': {'id': uuid.uuid4().hex}}
+        expired = {'id': uuid.uuid4().hex,
+                   'expires': now - datetime.timedelta(hours=1),
+                   'user': {'id': uuid.uuid4().hex}}
+        driver = self.token_api.driver
+        driver.client.set(driver.revocation_key,
+                          ','.join([jsonutils.dumps(valid),
+                                    jsonutils.dumps(expired)]))
+        self.assertEqual([valid['id']],
+                         [t['id'] for t in driver.list_revoked_tokens()])
+
+        # the legacy key is dropped once everything in it has expired
+        timeutils.set_time_override(now + datetime.timedelta(hours=2))
+        self.assertEqual([], driver.list_revoked_tokens())
+        self.assertIsNone(driver.client.get(driver.revocation_key))
 
     def test_cas_failure(self):
         self.token_api.driver.client.reject_cas = True
@@ -14,18 +14,24 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
+import time
 import uuid
 
 import sqlalchemy
 
+from keystone.assignment.backends import sql as assignment_sql
+from keystone.common import driver_hints
 from keystone.common import sql
 from keystone import config
 from keystone import exception
 from keystone.identity.backends import sql as identity_sql
 from keystone.openstack.common.fixture import moxstubout
+from keystone.openstack.common import timeutils
 from keystone import tests
 from keystone.tests import default_fixtures
 from keystone.tests import test_backend
+from keystone import token
 from keystone.token.backends import sql as token_sql
 
 
@@ -348,6 +354,88 @@ class SqlIdentity(SqlTests, test_backend.IdentityTests):
         self.assertNotIn('default_project_id', user_ref)
         session.close()
 
+    def test_get_roles_for_user_and_project_in_one_query(self):
+        self.opt_in_group('os_inherit', enabled=True)
+        role_list = []
+        for _ in range(3):
+            role = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+            self.assignment_api.create_role(role['id'], role)
+            role_list.append(role)
+        user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                'domain_id': DEFAULT_DOMAIN_ID,
+                'password': uuid.uuid4().hex, 'enabled': True}
+        self.identity_api.create_user(user['id'], user)
+        for i in range(10):
+            group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                     'domain_id': DEFAULT_DOMAIN_ID}
+            self.identity_api.create_group(group['id'], group)
+            self.identity_api.add_user_to_group(user['id'], group['id'])
+            # Every group shares the same project role, and half of them
+            # also hold an inherited role on the owning domain.
+            self.assignment_api.create_grant(group_id=group['id'],
+                                             project_id=self.tenant_bar['id'],
+                                             role_id=role_list[0]['id'])
+            if i % 2:
+                self.assignment_api.create_grant(
+                    group_id=group['id'], domain_id=DEFAULT_DOMAIN_ID,
+                    role_id=role_list[1]['id'], inherited_to_projects=True)
+        self.assignment_api.create_grant(user_id=user['id'],
+                                         project_id=self.tenant_bar['id'],
+                                         role_id=role_list[2]['id'])
+
+        statements = []
+
+        def _count_grant_queries(conn, cursor, statement, *args):
+            if '_metadata' in statement:
+                statements.append(statement)
+
+        sqlalchemy.event.listen(self.engine, 'before_cursor_execute',
+                                _count_grant_queries)
+        roles_ref = self.assignment_api.get_roles_for_user_and_project(
+            user['id'], self.tenant_bar['id'])
+        self.assertEqual(1, len(statements))
+        self.assertEqual(sorted(r['id'] for r in role_list),
+                         sorted(roles_ref))
+
+    def test_list_users_filtered_and_paginated_in_query(self):
+        for i in range(3):
+            user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                    'domain_id': DEFAULT_DOMAIN_ID,
+                    'password': uuid.uuid4().hex, 'enabled': False}
+            self.identity_api.create_user(user['id'], user)
+        disabled_ids = sorted(x['id'] for x in self.identity_api.list_users()
+                              if not x['enabled'])
+
+        statements = []
+
+        def _record_user_queries(conn, cursor, statement, *args):
+            if 'FROM user' in statement:
+                statements.append(statement)
+
+        sqlalchemy.event.listen(self.engine, 'before_cursor_execute',
+                                _record_user_queries)
+        hints = driver_hints.Hints(limit=2, marker=disabled_ids[0])
+        hints.add_filter('enabled', '0')
+        refs = self.identity_api.list_users(hints=hints)
+
+        self.assertEqual([], hints.filters)
+        self.assertTrue(hints.paginated)
+        self.assertEqual(1, len(statements))
+        self.assertIn('LIMIT', statements[0])
+        self.assertEqual(disabled_ids[1:3],
+                         [x['id'] for x in hints.paginate(refs)])
+        self.assertTrue(hints.more)
+
+    def test_list_users_unhandled_filter_not_paginated(self):
+        hints = driver_hints.Hints(limit=1)
+        hints.add_filter('email', uuid.uuid4().hex)
+        hints.add_filter('name', self.user_foo['name'])
+        refs = self.identity_api.list_users(hints=hints)
+
+        self.assertEqual(['email'], [f['name'] for f in hints.filters])
+        self.assertFalse(hints.paginated)
+        self.assertEqual([self.user_foo['id']], [x['id'] for x in refs])
+
 
 class SqlTrust(SqlTests, test_backend.TrustTests):
     pass
@@ -363,15 +451,216 @@ class SqlToken(SqlTests, test_backend.TokenTests):
         tok = token_sql.Token()
         session = tok.get_session()
         q = session.query(token_sql.TokenModel.id,
-                          token_sql.TokenModel.expires)
+                          token_sql.TokenModel.expires,
+                          token_sql.TokenModel.revoked_at,
+                          token_sql.TokenModel.revision)
         self.mox.StubOutWithMock(session, 'query')
         session.query(token_sql.TokenModel.id,
-                      token_sql.TokenModel.expires).AndReturn(q)
+                      token_sql.TokenModel.expires,
+                      token_sql.TokenModel.revoked_at,
+                      token_sql.TokenModel.revision).AndReturn(q)
         self.mox.StubOutWithMock(tok, 'get_session')
         tok.get_session().AndReturn(session)
         self.mox.ReplayAll()
         tok.list_revoked_tokens()
 
+    def test_revocation_list_delta_reports_unnumbered_revocations(self):
+        # tokens revoked before the upgrade have no revision
+        legacy_id = self.delete_token()
+        session = self.token_api.driver.get_session()
+        with session.begin():
+            query = session.query(token_sql.TokenModel)
+            query.filter_by(id=legacy_id).update({'revision': None})
+        self.token_api.invalidate_revocation_list()
+        self.assertIsNone(self.token_api.get_revocation_list()['revision'])
+
+        revision = self.token_api.get_revocation_list(since=0)['revision']
+        self.assertEqual(0, revision)
+        new_id = self.delete_token()
+        delta = self.token_api.get_revocation_list(since=revision)
+        self.assertEqual(sorted([legacy_id, new_id]),
+                         [t['id'] for t in delta['revoked']])
+        self.assertGreater(delta['revision'], revision)
+
+    def test_delete_tokens_share_a_revision(self):
+        self.create_token_sample_data()
+        self.create_token_sample_data()
+        self.token_api.delete_tokens('testuserid')
+        self.assertEqual(1, len(set(
+            t['revision'] for t in self.token_api.list_revoked_tokens())))
+
+    def test_delete_tokens_only_revokes_listed_tokens(self):
+        listed_id = self.create_token_sample_data()
+        late_id = uuid.uuid4().hex
+        driver = self.token_api.driver
+        next_revision = driver._next_revision
+
+        def issue_token_then_revise(session):
+            # a matching token is issued after the tokens were listed
+            session.add(token_sql.TokenModel(
+                id=late_id, user_id='testuserid', valid=True,
+                expires=timeutils.utcnow() + datetime.timedelta(hours=1),
+                extra={'user': {'id': 'testuserid'}}))
+            return next_revision(session)
+
+        stubs = self.useFixture(moxstubout.MoxStubout()).stubs
+        stubs.Set(driver, '_next_revision', issue_token_then_revise)
+        self.assertEqual([listed_id], driver.delete_tokens('testuserid'))
+        self.assertEqual([late_id], driver._list_tokens('testuserid'))
+
+    def test_delete_many_tokens(self):
+        stubs = self.useFixture(moxstubout.MoxStubout()).stubs
+        stubs.Set(token_sql, 'DELETE_TOKENS_BATCH', 2)
+        token_ids = [self.create_token_sample_data() for _i in range(5)]
+        driver = self.token_api.driver
+        self.assertItemsEqual(token_ids, driver.delete_tokens('testuserid'))
+        self.assertEqual([], driver._list_tokens('testuserid'))
+
+
+class SqlTokenFlush(SqlTests):
+    def setUp(self):
+        super(SqlTokenFlush, self).setUp()
+        self.driver = self.token_api.driver
+        expired = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        self.expired_ids = [self._create_token(expired) for _i in range(5)]
+        self.valid_id = self._create_token(token.default_expire_time())
+
+    def _create_token(self, expires):
+        token_id = uuid.uuid4().hex
+        self.driver.create_token(token_id, {'id': token_id,
+                                            'expires': expires,
+                                            'user': {'id': 'testuserid'}})
+        return token_id
+
+    def _token_ids(self, model):
+        session = self.driver.get_session()
+        return [token_ref[0] for token_ref in session.query(model.id)]
+
+    def test_dry_run(self):
+        self.assertEqual(5, self.driver.flush_expired_tokens(dry_run=True))
+        self.assertEqual(6, len(self._token_ids(token_sql.TokenModel)))
+
+    def test_flush_in_batches(self):
+        self.mox = self.useFixture(moxstubout.MoxStubout()).mox
+        self.mox.StubOutWithMock(time, 'sleep')
+        time.sleep(0.5)
+        time.sleep(0.5)
+        self.mox.ReplayAll()
+
+        self.assertEqual(5, self.driver.flush_expired_tokens(batch_size=2,
+                                                             batch_delay=0.5))
+        self.assertEqual([self.valid_id],
+                         self._token_ids(token_sql.TokenModel))
+
+    def test_archive(self):
+        self.assertEqual(5, self.driver.flush_expired_tokens(batch_size=2,
+                                                             archive=True))
+        self.assertItemsEqual(self.expired_ids,
+                              self._token_ids(token_sql.TokenArchiveModel))
+        session = self.driver.get_session()
+        archived = session.query(token_sql.TokenArchiveModel).first()
+        self.assertEqual({'id': 'testuserid'}, archived.extra['user'])
+
+        expired = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        expired_id = self._create_token(expired)
+        self.assertEqual(1, self.driver.flush_expired_tokens(archive=True))
+        self.assertIn(expired_id,
+                      self._token_ids(token_sql.TokenArchiveModel))
+        self.assertEqual([self.valid_id],
+                         self._token_ids(token_sql.TokenModel))
+
+
+class SqlTokenSlave(SqlTests):
+    def setUp(self):
+        super(SqlTokenSlave, self).setUp()
+        # a separate in-memory database stands in for the replica, whose lag
+        # tokens may only be read from if it is bounded
+        sql.SLAVE_LAG_FUNCTIONS['sqlite'] = lambda engine: 0
+        self.addCleanup(sql.SLAVE_LAG_FUNCTIONS.pop, 'sqlite', None)
+        self.opt_in_group('sql', slave_connection='sqlite://',
+                          slave_max_lag=5)
+        self.slave_engine = sql.get_slave_engine()
+        sql.ModelBase.metadata.create_all(bind=self.slave_engine)
+        self.driver = self.token_api.driver
+
+    def tearDown(self):
+        sql.set_slave_engine(None)
+        super(SqlTokenSlave, self).tearDown()
+
+    def _token_ref(self):
+        token_id = uuid.uuid4().hex
+        return token_id, {'id': token_id,
+                          'expires': token.default_expire_time(),
+                          'user': {'id': 'testuserid'}}
+
+    def _replicate(self, data):
+        session = self.get_sessionmaker(self.slave_engine)()
+        data['user_id'] = data['user']['id']
+        with session.begin():
+            session.add(token_sql.TokenModel.from_dict(data))
+
+    def test_get_token_from_slave(self):
+        token_id, data = self._token_ref()
+        self._replicate(data)
+        self.assertEqual(token_id, self.driver.get_token(token_id)['id'])
+
+    def test_revoked_token_without_max_lag(self):
+        self.opt_in_group('sql', slave_max_lag=None)
+        token_id, data = self._token_ref()
+        self.driver.create_token(token_id, data)
+        # the revocation has not reached the replica yet
+        self._replicate(data)
+        self.driver.delete_token(token_id)
+        self.assertRaises(exception.TokenNotFound,
+                          self.driver.get_token, token_id)
+        self.assertIn(token_id,
+                      [t['id'] for t in self.driver.list_revoked_tokens()])
+
+    def test_get_new_token_from_primary(self):
+        token_id, data = self._token_ref()
+        self.driver.create_token(token_id, data)
+        self.assertEqual(token_id, self.driver.get_token(token_id)['id'])
+
+    def test_missing_token(self):
+        self.assertRaises(exception.TokenNotFound,
+                          self.driver.get_token, uuid.uuid4().hex)
+
+    def test_broken_slave(self):
+        token_id, data = self._token_ref()
+        self.driver.create_token(token_id, data)
+        sql.ModelBase.metadata.drop_all(bind=self.slave_engine)
+        self.assertEqual(token_id, self.driver.get_token(token_id)['id'])
+        self.assertIsNone(self.driver.get_slave_session())
+
+
+class SqlVerifiedPasswordCache(SqlTests):
+    def setUp(self):
+        super(SqlVerifiedPasswordCache, self).setUp()
+        self.opt_in_group('identity', verified_password_cache_size=10)
+        self.load_backends()
+
+    def test_repeated_authentication_is_cached(self):
+        for _i in range(3):
+            self.identity_api.authenticate(self.user_foo['id'],
+                                           self.user_foo['password'])
+        stats = self.identity_api.driver.password_cache.stats()
+        self.assertEqual(2, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+
+    def test_update_user_invalidates(self):
+        self.identity_api.authenticate(self.user_foo['id'],
+                                       self.user_foo['password'])
+        password = uuid.uuid4().hex
+        self.identity_api.update_user(self.user_foo['id'],
+                                      {'password': password})
+        self.assertEqual(
+            0, self.identity_api.driver.password_cache.stats()['entries'])
+        self.assertRaises(AssertionError,
+                          self.identity_api.authenticate,
+                          self.user_foo['id'],
+                          self.user_foo['password'])
+        self.identity_api.authenticate(self.user_foo['id'], password)
+
 
 class SqlCatalog(SqlTests, test_backend.CatalogTests):
     def test_malformed_catalog_throws_error(self):
@@ -446,6 +735,75 @@ class SqlCatalog(SqlTests, test_backend.CatalogTests):
                           endpoint['id'],
                           endpoint.copy())
 
+    def _create_service_with_endpoint(self, url):
+        service = {
+            'id': uuid.uuid4().hex,
+            'type': uuid.uuid4().hex,
+            'name': uuid.uuid4().hex,
+        }
+        self.catalog_api.create_service(service['id'], service.copy())
+
+        endpoint = {
+            'id': uuid.uuid4().hex,
+            'region': uuid.uuid4().hex,
+            'service_id': service['id'],
+            'interface': 'public',
+            'url': url,
+        }
+        self.catalog_api.create_endpoint(endpoint['id'], endpoint.copy())
+        return service, endpoint
+
+    def test_get_catalog_formats_urls_per_request(self):
+        service, endpoint = self._create_service_with_endpoint(
+            'http://localhost:$(public_port)s/v2/$(tenant_id)s/$(user_id)s')
+
+        for user_id, tenant_id in [('user1', 'tenant1'),
+                                   ('user2', 'tenant2')]:
+            url = 'http://localhost:%s/v2/%s/%s' % (CONF.public_port,
+                                                    tenant_id, user_id)
+
+            catalog = self.catalog_api.get_catalog(user_id, tenant_id)
+            catalog_endpoint = catalog[endpoint['region']][service['type']]
+            self.assertEqual(catalog_endpoint['publicURL'], url)
+
+            catalog = self.catalog_api.get_v3_catalog(user_id, tenant_id)
+            self.assertEqual(len(catalog), 1)
+            self.assertEqual(catalog[0]['endpoints'][0]['url'], url)
+
+    @tests.skip_if_cache_disabled('catalog')
+    def test_cache_layer_catalog_crud(self):
+        service, endpoint = self._create_service_with_endpoint(
+            'http://localhost/v2/$(tenant_id)s')
+        catalog = self.catalog_api.get_catalog('user', 'tenant')
+        v3_catalog = self.catalog_api.get_v3_catalog('user', 'tenant')
+
+        # Update endpoint, bypassing the catalog api manager
+        new_endpoint = endpoint.copy()
+        new_endpoint['url'] = 'http://example.com/v2/$(tenant_id)s'
+        self.catalog_api.driver.update_endpoint(endpoint['id'],
+                                                new_endpoint.copy())
+        # Verify the catalogs are still the cached ones
+        self.assertDictEqual(catalog,
+                             self.catalog_api.get_catalog('user', 'tenant'))
+        self.assertEqual(v3_catalog,
+                         self.catalog_api.get_v3_catalog('user', 'tenant'))
+
+        # Update endpoint via the catalog api manager
+        self.catalog_api.update_endpoint(endpoint['id'], new_endpoint.copy())
+        catalog = self.catalog_api.get_catalog('user', 'tenant')
+        catalog_endpoint = catalog[endpoint['region']][service['type']]
+        self.assertEqual(catalog_endpoint['publicURL'],
+                         'http://example.com/v2/tenant')
+        v3_catalog = self.catalog_api.get_v3_catalog('user', 'tenant')
+        self.assertEqual(v3_catalog[0]['endpoints'][0]['url'],
+                         'http://example.com/v2/tenant')
+
+        # Delete service via the catalog api manager
+        self.catalog_api.delete_service(service['id'])
+        self.assertEqual(self.catalog_api.get_catalog('user', 'tenant'), {})
+        self.assertEqual(self.catalog_api.get_v3_catalog('user', 'tenant'),
+                         [])
+
 
 class SqlPolicy(SqlTests, test_backend.PolicyTests):
     pass
@@ -455,6 +813,119 @@ class SqlInheritance(SqlTests, test_backend.InheritanceTests):
     pass
 
 
+class ExternalIdentity(object):
+    """Identity driver wrapper hiding that users are stored in SQL."""
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+
+class SqlMaterializedEffectiveRoles(SqlIdentity,
+                                    test_backend.InheritanceTests):
+    def setUp(self):
+        super(SqlMaterializedEffectiveRoles, self).setUp()
+        self.opt_in_group('assignment', materialize_effective_roles=True)
+        self.assignment_api.rebuild_effective_roles()
+
+    def _create_user_in_group_with_project_role(self):
+        role = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        self.assignment_api.create_role(role['id'], role)
+        user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                'domain_id': DEFAULT_DOMAIN_ID,
+                'password': uuid.uuid4().hex, 'enabled': True}
+        self.identity_api.create_user(user['id'], user)
+        group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                 'domain_id': DEFAULT_DOMAIN_ID}
+        self.identity_api.create_group(group['id'], group)
+        self.assignment_api.create_grant(group_id=group['id'],
+                                         project_id=self.tenant_bar['id'],
+                                         role_id=role['id'])
+        return user, group, role
+
+    def test_group_membership_updates_effective_roles(self):
+        user, group, role = self._create_user_in_group_with_project_role()
+        roles_ref = self.assignment_api.get_roles_for_user_and_project(
+            user['id'], self.tenant_bar['id'])
+        self.assertEqual([], roles_ref)
+
+        self.identity_api.add_user_to_group(user['id'], group['id'])
+        roles_ref = self.assignment_api.get_roles_for_user_and_project(
+            user['id'], self.tenant_bar['id'])
+        self.assertEqual([role['id']], roles_ref)
+
+        self.identity_api.remove_user_from_group(user['id'], group['id'])
+        roles_ref = self.assignment_api.get_roles_for_user_and_project(
+            user['id'], self.tenant_bar['id'])
+        self.assertEqual([], roles_ref)
+
+    def test_rebuild_effective_roles(self):
+        self.opt_in_group('assignment', materialize_effective_roles=False)
+        user, group, role = self._create_user_in_group_with_project_role()
+        self.identity_api.add_user_to_group(user['id'], group['id'])
+
+        self.opt_in_group('assignment', materialize_effective_roles=True)
+        roles_ref = self.assignment_api.get_roles_for_user_and_project(
+            user['id'], self.tenant_bar['id'])
+        self.assertEqual([], roles_ref)
+
+        self.assignment_api.rebuild_effective_roles()
+        roles_ref = self.assignment_api.get_roles_for_user_and_project(
+            user['id'], self.tenant_bar['id'])
+        self.assertEqual([role['id']], roles_ref)
+
+    def test_get_roles_for_user_and_project_in_one_query(self):
+        user, group, role = self._create_user_in_group_with_project_role()
+        self.identity_api.add_user_to_group(user['id'], group['id'])
+
+        statements = []
+
+        def _count_queries(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sqlalchemy.event.listen(self.engine, 'before_cursor_execute',
+                                _count_queries)
+        roles_ref = self.assignment_api.driver.\
+            list_role_ids_for_user_and_project(
+                user['id'], self.tenant_bar['id'], DEFAULT_DOMAIN_ID)
+        self.assertEqual([role['id']], roles_ref)
+        self.assertEqual(1, len(statements))
+        self.assertIn('effective_assignment', statements[0])
+
+    def test_user_without_roles_must_exist(self):
+        self.assertRaises(exception.UserNotFound,
+                          self.assignment_api.driver.
+                          list_role_ids_for_user_and_project,
+                          uuid.uuid4().hex, self.tenant_bar['id'],
+                          DEFAULT_DOMAIN_ID)
+
+    def test_ignored_without_sql_identity(self):
+        user, group, role = self._create_user_in_group_with_project_role()
+        self.identity_api.add_user_to_group(user['id'], group['id'])
+        session = self.get_session()
+        session.query(assignment_sql.EffectiveAssignment).delete()
+
+        # users and groups are no longer kept in the SQL database
+        self.identity_api.driver = ExternalIdentity(self.identity_api.driver)
+        roles_ref = self.assignment_api.get_roles_for_user_and_project(
+            user['id'], self.tenant_bar['id'])
+        self.assertEqual([role['id']], roles_ref)
+
+    def test_ignored_with_domain_specific_drivers(self):
+        user, group, role = self._create_user_in_group_with_project_role()
+        self.identity_api.add_user_to_group(user['id'], group['id'])
+        session = self.get_session()
+        session.query(assignment_sql.EffectiveAssignment).delete()
+
+        # groups of some domains may live in LDAP
+        self.opt_in_group('identity', domain_specific_drivers_enabled=True)
+        roles_ref = self.assignment_api.get_roles_for_user_and_project(
+            user['id'], self.tenant_bar['id'])
+        self.assertEqual([role['id']], roles_ref)
+
+
 class SqlTokenCacheInvalidation(SqlTests, test_backend.TokenCacheInvalidation):
     def setUp(self):
         super(SqlTokenCacheInvalidation, self).setUp()
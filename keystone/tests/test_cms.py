@@ -0,0 +1,251 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import sys
+import urllib
+
+from keystone.common import cms
+from keystone.common import cms_pool
+from keystone.common import environment
+from keystone import config
+from keystone import exception
+from keystone import tests
+from keystone.token.providers import pki
+from keystone.token.providers import pkiz
+
+
+CONF = config.CONF
+environment.use_eventlet()
+
+SIGNING_CERT = tests.dirs.root('examples', 'pki', 'certs',
+                               'signing_cert.pem')
+SIGNING_KEY = tests.dirs.root('examples', 'pki', 'private',
+                              'signing_key.pem')
+CA_CERT = tests.dirs.root('examples', 'pki', 'certs', 'cacert.pem')
+
+SAMPLE_TEXT = json.dumps({'access': {'token': {'id': 'x' * 4096}}})
+
+
+class InProcessSignerTests(tests.TestCase):
+    def setUp(self):
+        super(InProcessSignerTests, self).setUp()
+        if cms.RSA is None:
+            self.skipTest('pycrypto is not installed')
+
+    def test_token_matches_subprocess_signer(self):
+        subprocess_signer = cms.SubprocessSigner(SIGNING_CERT, SIGNING_KEY)
+        in_process_signer = cms.InProcessSigner(SIGNING_CERT, SIGNING_KEY)
+        self.assertEqual(subprocess_signer.sign_token(SAMPLE_TEXT),
+                         in_process_signer.sign_token(SAMPLE_TEXT))
+
+    def test_token_verifies(self):
+        signer = cms.InProcessSigner(SIGNING_CERT, SIGNING_KEY)
+        token_id = signer.sign_token(SAMPLE_TEXT)
+        self.assertTrue(cms.is_ans1_token(token_id))
+        self.assertNotIn('/', token_id)
+        self.assertNotIn('\n', token_id)
+        self.assertEqual(SAMPLE_TEXT,
+                         cms.verify_token(token_id, SIGNING_CERT, CA_CERT))
+
+    def test_provider_uses_configured_signer(self):
+        self.opt_in_group('signing',
+                          signer='keystone.common.cms.InProcessSigner',
+                          certfile=SIGNING_CERT,
+                          keyfile=SIGNING_KEY)
+        provider = pki.Provider()
+        self.assertIsInstance(provider.signer, cms.InProcessSigner)
+        token_id = provider._get_token_id({'token': 'data'})
+        self.assertEqual('{"token": "data"}',
+                         cms.verify_token(token_id, SIGNING_CERT, CA_CERT))
+
+
+class CompressedTokenTests(tests.TestCase):
+    def test_sign_and_verify(self):
+        signer = cms.SubprocessSigner(SIGNING_CERT, SIGNING_KEY)
+        token_id = signer.sign_compressed_token(SAMPLE_TEXT)
+        self.assertTrue(cms.is_pkiz_token(token_id))
+        self.assertFalse(cms.is_ans1_token(token_id))
+        self.assertEqual(token_id, urllib.quote(token_id))
+        self.assertEqual(SAMPLE_TEXT, cms.verify_compressed_token(
+            token_id, SIGNING_CERT, CA_CERT))
+
+    def test_smaller_than_pki_token(self):
+        signer = cms.SubprocessSigner(SIGNING_CERT, SIGNING_KEY)
+        self.assertLess(len(signer.sign_compressed_token(SAMPLE_TEXT)),
+                        len(signer.sign_token(SAMPLE_TEXT)) / 4)
+
+    def test_in_process_signer(self):
+        if cms.RSA is None:
+            self.skipTest('pycrypto is not installed')
+        subprocess_signer = cms.SubprocessSigner(SIGNING_CERT, SIGNING_KEY)
+        in_process_signer = cms.InProcessSigner(SIGNING_CERT, SIGNING_KEY)
+        self.assertEqual(
+            subprocess_signer.sign_compressed_token(SAMPLE_TEXT),
+            in_process_signer.sign_compressed_token(SAMPLE_TEXT))
+
+    def test_tampered_token(self):
+        signer = cms.SubprocessSigner(SIGNING_CERT, SIGNING_KEY)
+        signed_data = bytearray(cms.compressed_token_to_cms(
+            signer.sign_compressed_token(SAMPLE_TEXT)))
+        signed_data[-300] ^= 1
+        token_id = cms.cms_to_compressed_token(str(signed_data))
+        self.assertRaises(environment.subprocess.CalledProcessError,
+                          cms.verify_compressed_token,
+                          token_id, SIGNING_CERT, CA_CERT)
+
+    def test_hash_token(self):
+        token_id = cms.PKIZ_PREFIX + 'x' * 1000
+        self.assertEqual(32, len(cms.cms_hash_token(token_id)))
+
+    def test_provider(self):
+        self.opt_in_group('signing', certfile=SIGNING_CERT,
+                          keyfile=SIGNING_KEY)
+        token_id = pkiz.Provider()._get_token_id({'token': 'data'})
+        self.assertEqual('{"token": "data"}', cms.verify_compressed_token(
+            token_id, SIGNING_CERT, CA_CERT))
+
+
+class SigningFailureTests(tests.TestCase):
+    def _assert_unable_to_sign(self, error):
+        provider = pki.Provider()
+
+        def fail(text):
+            raise error
+
+        provider._sign_token = fail
+        e = self.assertRaises(exception.UnexpectedError,
+                              provider._get_token_id, {'token': 'data'})
+        self.assertIn('Unable to sign token', unicode(e))
+
+    def test_openssl_failure(self):
+        self._assert_unable_to_sign(
+            environment.subprocess.CalledProcessError(1, 'openssl'))
+
+    def test_in_process_signer_failure(self):
+        self._assert_unable_to_sign(ValueError('RSA key format'))
+        self._assert_unable_to_sign(IOError('signing_key.pem'))
+
+    def test_pool_failure(self):
+        self._assert_unable_to_sign(
+            exception.UnexpectedError('Token signing capacity exhausted.'))
+
+
+class LoadSignerTests(tests.TestCase):
+    def test_falls_back_to_subprocess_signer(self):
+        signer = cms.load_signer(cms.InProcessSigner,
+                                 tests.dirs.tmp('missing_cert.pem'),
+                                 tests.dirs.tmp('missing_key.pem'))
+        self.assertIs(cms.SubprocessSigner, type(signer))
+
+    def test_default_signer(self):
+        provider = pki.Provider()
+        self.assertIs(cms.SubprocessSigner, type(provider.signer))
+        self.assertEqual(CONF.signing.certfile,
+                         provider.signer.signing_cert_file_name)
+
+
+class PooledSignerTests(tests.TestCase):
+    def setUp(self):
+        super(PooledSignerTests, self).setUp()
+        self.opt_in_group('signing', pool_size=2, pool_timeout=1)
+        self.signer = cms_pool.PooledSigner(SIGNING_CERT, SIGNING_KEY)
+        self.addCleanup(self.signer.pool.stop)
+
+    def _worker_stats(self, signer, counter):
+        return sum(worker[counter]
+                   for worker in signer.pool.stats()['workers'])
+
+    def test_sign_and_verify(self):
+        token_id = self.signer.sign_token(SAMPLE_TEXT)
+        self.assertTrue(cms.is_ans1_token(token_id))
+        self.assertEqual(SAMPLE_TEXT,
+                         cms.verify_token(token_id, SIGNING_CERT, CA_CERT))
+        self.assertEqual(SAMPLE_TEXT,
+                         self.signer.verify_token(token_id, CA_CERT))
+
+    def test_sign_compressed_token(self):
+        token_id = self.signer.sign_compressed_token(SAMPLE_TEXT)
+        self.assertEqual(SAMPLE_TEXT, cms.verify_compressed_token(
+            token_id, SIGNING_CERT, CA_CERT))
+        self.assertEqual(SAMPLE_TEXT,
+                         self.signer.verify_compressed_token(token_id,
+                                                             CA_CERT))
+
+    def test_verify_failure(self):
+        self.assertRaises(environment.subprocess.CalledProcessError,
+                          self.signer.verify_token, 'MIIbogus', CA_CERT)
+        self.assertEqual(1, self._worker_stats(self.signer, 'failures'))
+
+    def test_request_counters(self):
+        for _i in range(3):
+            self.signer.sign_token(SAMPLE_TEXT)
+        stats = self.signer.pool.stats()
+        self.assertEqual(2, stats['size'])
+        self.assertEqual(2, stats['idle'])
+        self.assertEqual(0, stats['waiting'])
+        self.assertEqual(3, self._worker_stats(self.signer, 'requests'))
+
+    def test_stats_logged(self):
+        self.signer.pool._stats_logged_at = 0
+        self.signer.sign_token(SAMPLE_TEXT)
+        self.assertIn('CMS worker pool: ', self.logger.output)
+
+    def test_signing_failure(self):
+        signer = cms_pool.PooledSigner(SIGNING_CERT,
+                                       tests.dirs.tmp('missing_key.pem'))
+        self.addCleanup(signer.pool.stop)
+        self.assertRaises(environment.subprocess.CalledProcessError,
+                          signer.sign_token, SAMPLE_TEXT)
+        self.assertEqual(1, self._worker_stats(signer, 'failures'))
+
+    def test_worker_python(self):
+        self.opt(worker_python=sys.executable)
+        signer = cms_pool.PooledSigner(SIGNING_CERT, SIGNING_KEY)
+        self.addCleanup(signer.pool.stop)
+        signer.sign_token(SAMPLE_TEXT)
+
+        self.opt(worker_python=tests.dirs.tmp('no_such_python'))
+        self.assertRaises(OSError,
+                          cms_pool.PooledSigner, SIGNING_CERT, SIGNING_KEY)
+
+    def test_crashed_worker_is_restarted(self):
+        for worker in self.signer.pool.workers:
+            worker.process.kill()
+            worker.process.wait()
+        token_id = self.signer.sign_token(SAMPLE_TEXT)
+        self.assertEqual(SAMPLE_TEXT,
+                         cms.verify_token(token_id, SIGNING_CERT, CA_CERT))
+        self.assertEqual(1, self._worker_stats(self.signer, 'restarts'))
+
+    def test_worker_dies_after_restart(self):
+        for worker in self.signer.pool.workers:
+            # the restarted worker exits without answering
+            worker.command = 'import sys'
+            worker.process.kill()
+            worker.process.wait()
+        self.assertRaises(exception.UnexpectedError,
+                          self.signer.sign_token, SAMPLE_TEXT)
+
+    def test_saturated_pool(self):
+        self.opt_in_group('signing', pool_size=1, pool_timeout=0)
+        signer = cms_pool.PooledSigner(SIGNING_CERT, SIGNING_KEY)
+        self.addCleanup(signer.pool.stop)
+        busy_worker = signer.pool._idle.get()
+        self.assertRaises(exception.UnexpectedError,
+                          signer.sign_token, SAMPLE_TEXT)
+        signer.pool._idle.put(busy_worker)
+        signer.sign_token(SAMPLE_TEXT)
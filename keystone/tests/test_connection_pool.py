@@ -0,0 +1,77 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from keystone.common import connection_pool
+from keystone import exception
+from keystone.openstack.common.fixture import moxstubout
+from keystone import tests
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class ConnectionPoolTests(tests.TestCase):
+    def setUp(self):
+        super(ConnectionPoolTests, self).setUp()
+        self.clock = FakeTime()
+        stubs = self.useFixture(moxstubout.MoxStubout()).stubs
+        stubs.Set(connection_pool, 'time', self.clock)
+
+    def test_released_connection_is_reused(self):
+        pool = connection_pool.ConnectionPool(2, -1, 0)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn)
+        self.assertIs(conn, pool.acquire(FakeConnection))
+        self.assertIsNot(conn, pool.acquire(FakeConnection))
+
+    def test_idle_connection_is_closed(self):
+        pool = connection_pool.ConnectionPool(1, 60, 0)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn)
+        self.clock.now += 61
+        self.assertIsNot(conn, pool.acquire(FakeConnection))
+        self.assertTrue(conn.closed)
+
+    def test_connection_timeout(self):
+        pool = connection_pool.ConnectionPool(1, -1, 0)
+        conn = pool.acquire(FakeConnection)
+        self.assertRaises(exception.UnexpectedError,
+                          pool.acquire, FakeConnection)
+        pool.discard(conn)
+        self.assertTrue(conn.closed)
+        self.assertIsNot(conn, pool.acquire(FakeConnection))
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = connection_pool.ConnectionPool(1, -1, 0)
+
+        def connect():
+            raise IOError()
+
+        self.assertRaises(IOError, pool.acquire, connect)
+        pool.acquire(FakeConnection)
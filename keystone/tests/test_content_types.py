@@ -16,8 +16,10 @@
 
 import uuid
 
+from keystone.common import cms
 from keystone.common import extension
 from keystone import config
+from keystone.openstack.common.fixture import moxstubout
 from keystone.tests import rest
 
 
@@ -1022,6 +1024,67 @@ class JsonTestCase(RestfulTestCase, CoreApiTests, LegacyV2UsernameTests):
             expected_status=200)
         self.assertValidRevocationListResponse(r)
 
+    def test_fetch_revocation_list_not_modified(self):
+        token = self.get_scoped_token()
+        revoked_token = self.get_scoped_token()
+
+        fixture = self.useFixture(moxstubout.MoxStubout())
+        sign_calls = []
+        real_cms_sign_text = cms.cms_sign_text
+
+        def counting_cms_sign_text(*args):
+            sign_calls.append(args)
+            return real_cms_sign_text(*args)
+
+        fixture.stubs.Set(cms, 'cms_sign_text', counting_cms_sign_text)
+
+        r = self.admin_request(
+            method='GET',
+            path='/v2.0/tokens/revoked',
+            token=token,
+            expected_status=200)
+        etag = r.headers['ETag']
+        self.assertEqual(1, len(sign_calls))
+
+        # an unchanged list is neither re-sent nor re-signed
+        r = self.admin_request(
+            method='GET',
+            path='/v2.0/tokens/revoked',
+            token=token,
+            headers={'If-None-Match': etag},
+            expected_status=304)
+        self.assertEqual(etag, r.headers['ETag'])
+        r = self.admin_request(
+            method='GET',
+            path='/v2.0/tokens/revoked',
+            token=token,
+            expected_status=200)
+        self.assertEqual(etag, r.headers['ETag'])
+        self.assertEqual(1, len(sign_calls))
+
+        self.admin_request(
+            method='DELETE',
+            path='/v2.0/tokens/%s' % revoked_token,
+            token=token,
+            expected_status=204)
+        r = self.admin_request(
+            method='GET',
+            path='/v2.0/tokens/revoked',
+            token=token,
+            headers={'If-None-Match': etag},
+            expected_status=200)
+        self.assertNotEqual(etag, r.headers['ETag'])
+        self.assertValidRevocationListResponse(r)
+        self.assertEqual(2, len(sign_calls))
+
+    def test_fetch_revocation_list_since_invalid(self):
+        token = self.get_scoped_token()
+        self.admin_request(
+            method='GET',
+            path='/v2.0/tokens/revoked?since=yesterday',
+            token=token,
+            expected_status=400)
+
     def assertValidRevocationListResponse(self, response):
         self.assertIsNotNone(response.result['signed'])
 
@@ -0,0 +1,66 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from keystone.common import driver_hints
+from keystone import tests
+
+
+REFS = [{'id': x} for x in ('d', 'a', 'e', 'c', 'b')]
+
+
+class HintsTests(tests.TestCase):
+    def _ids(self, refs):
+        return [ref['id'] for ref in refs]
+
+    def test_pop_filters(self):
+        hints = driver_hints.Hints()
+        hints.add_filter('name', 'a')
+        hints.add_filter('domain_id', 'default')
+        self.assertEqual([{'name': 'name', 'value': 'a'}],
+                         hints.pop_filters({'name': 'cn', 'id': 'cn'}))
+        self.assertEqual([{'name': 'domain_id', 'value': 'default'}],
+                         hints.filters)
+
+    def test_no_pagination_keeps_order(self):
+        hints = driver_hints.Hints()
+        self.assertEqual(REFS, hints.paginate(REFS))
+        self.assertFalse(hints.more)
+
+    def test_paginate_forward(self):
+        hints = driver_hints.Hints(limit=2, marker='a')
+        self.assertEqual(['b', 'c'], self._ids(hints.paginate(REFS)))
+        self.assertTrue(hints.more)
+
+        hints = driver_hints.Hints(limit=2, marker='c')
+        self.assertEqual(['d', 'e'], self._ids(hints.paginate(REFS)))
+        self.assertFalse(hints.more)
+
+    def test_paginate_reverse(self):
+        hints = driver_hints.Hints(limit=2, marker='d', page_reverse=True)
+        self.assertEqual(['b', 'c'], self._ids(hints.paginate(REFS)))
+        self.assertTrue(hints.more)
+
+        hints = driver_hints.Hints(limit=2, marker='b', page_reverse=True)
+        self.assertEqual(['a'], self._ids(hints.paginate(REFS)))
+        self.assertFalse(hints.more)
+
+    def test_paginated_by_driver(self):
+        # the driver returned one entity beyond the page, in reverse order
+        hints = driver_hints.Hints(limit=2, marker='e', page_reverse=True)
+        hints.paginated = True
+        refs = [{'id': 'd'}, {'id': 'c'}, {'id': 'b'}]
+        self.assertEqual(['c', 'd'], self._ids(hints.paginate(refs)))
+        self.assertTrue(hints.more)
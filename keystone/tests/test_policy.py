@@ -19,6 +19,7 @@ import json
 import StringIO
 import tempfile
 import urllib2
+import uuid
 
 from testtools import matchers
 
@@ -60,6 +61,21 @@ class PolicyFileTestCase(tests.TestCase):
         self.assertRaises(exception.ForbiddenAction, rules.enforce,
                           empty_credentials, action, self.target)
 
+    def test_reload_interval(self):
+        self.opt_in_group('policy', reload_interval=3600)
+        action = "example:test"
+        credentials = {'roles': []}
+        with open(self.tmpfilename, "w") as policyfile:
+            policyfile.write("""{"example:test": []}""")
+        rules.enforce(credentials, action, self.target)
+        with open(self.tmpfilename, "w") as policyfile:
+            policyfile.write("""{"example:test": ["false:false"]}""")
+        rules._POLICY_CACHE['mtime'] = None
+        rules.enforce(credentials, action, self.target)
+        rules._POLICY_CACHE['next_check'] = 0
+        self.assertRaises(exception.ForbiddenAction, rules.enforce,
+                          credentials, action, self.target)
+
 
 class PolicyTestCase(tests.TestCase):
     def setUp(self):
@@ -213,6 +229,94 @@ class DefaultPolicyTestCase(tests.TestCase):
                           self.credentials, "example:noexist", {})
 
 
+class CompiledPolicyTestCase(tests.TestCase):
+    def setUp(self):
+        super(CompiledPolicyTestCase, self).setUp()
+        self.orig_policy_file = CONF.policy_file
+        rules.reset()
+        self.credentials = [
+            {'roles': ['admin'], 'user_id': 'u1',
+             'domain_id': 'admin_domain_id', 'project_id': None},
+            {'roles': ['Member'], 'user_id': 'u2', 'domain_id': 'd1',
+             'project_id': None},
+            {'roles': ['ADMIN', 'other'], 'user_id': 'u3', 'domain_id': 'd1',
+             'project_id': 'p1'},
+            {'roles': [], 'user_id': 'u2'}]
+        domain_keys = ['domain_id', 'user.domain_id', 'group.domain_id',
+                       'project.domain_id', 'target.user.domain_id',
+                       'target.group.domain_id', 'target.project.domain_id']
+        user_keys = ['user_id', 'target.credential.user_id',
+                     'target.token.user_id']
+        self.targets = [
+            {},
+            dict([(k, 'd1') for k in domain_keys] +
+                 [(k, 'u2') for k in user_keys]),
+            dict([(k, 'd2') for k in domain_keys] +
+                 [(k, 'u3') for k in user_keys])]
+
+    def tearDown(self):
+        super(CompiledPolicyTestCase, self).tearDown()
+        rules.reset()
+        self.opt(policy_file=self.orig_policy_file)
+
+    def _assert_matches_interpreted(self, policy_file):
+        self.opt(policy_file=policy_file)
+        rules.reset()
+        rules.init()
+        actions = json.load(file(policy_file)).keys() + ['example:noexist']
+        for action in actions:
+            for credentials in self.credentials:
+                for target in self.targets:
+                    expected = rules._ENFORCER.enforce(action, target,
+                                                       credentials)
+                    result = rules.enforce(credentials, action, target,
+                                           do_raise=False)
+                    self.assertEqual(bool(expected), bool(result), action)
+
+    def test_policy_json_matches_interpreted(self):
+        self._assert_matches_interpreted(tests.dirs.etc('policy.json'))
+
+    def test_cloudsample_matches_interpreted(self):
+        self._assert_matches_interpreted(
+            tests.dirs.etc('policy.v3cloudsample.json'))
+
+    def test_decision_cache(self):
+        self.opt_in_group('policy', decision_cache_size=2)
+        self._assert_matches_interpreted(
+            tests.dirs.etc('policy.v3cloudsample.json'))
+        decisions = rules._COMPILED.decisions
+        self.assertEqual(2, len(decisions._entries))
+
+        credentials = {'roles': ['admin'], 'user_id': 'u1'}
+        action = 'identity:list_user_projects'
+        rules.enforce(credentials, action, {'user_id': 'u2'}, do_raise=False)
+        key = decisions._entries.keys()[-1]
+        # keys the rule does not refer to are not part of the decision
+        rules.enforce(credentials, action,
+                      {'user_id': 'u2', 'unrelated': uuid.uuid4().hex},
+                      do_raise=False)
+        self.assertEqual(key, decisions._entries.keys()[-1])
+        rules.enforce(credentials, action, {'user_id': 'u3'}, do_raise=False)
+        self.assertNotEqual(key, decisions._entries.keys()[-1])
+
+        # unhashable values are evaluated without the cache
+        rules.enforce(credentials, action, {'user_id': ['u2']},
+                      do_raise=False)
+
+        rules._ENFORCER.set_rules(common_policy.Rules(
+            {action: common_policy.parse_rule('!')}))
+        self.assertRaises(exception.ForbiddenAction, rules.enforce,
+                          credentials, action, {'user_id': 'u2'})
+
+    def test_rule_reference_cycle(self):
+        rules.init()
+        rules._ENFORCER.set_rules(common_policy.Rules(dict(
+            (k, common_policy.parse_rule(v)) for k, v in {
+                'a': 'rule:b or role:admin',
+                'b': 'rule:a and role:member'}.items())))
+        rules.enforce({'roles': ['admin']}, 'a', {})
+
+
 class PolicyJsonTestCase(tests.TestCase):
 
     def _load_entries(self, filename):
@@ -12,10 +12,15 @@
 #   License for the specific language governing permissions and limitations
 #   under the License.
 
+import sqlite3
+import time
 
 from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.exc import TimeoutError
 
 from keystone.common import sql
+from keystone import exception
+from keystone.openstack.common.fixture import moxstubout
 from keystone import tests
 
 
@@ -183,6 +188,11 @@ class TestBase(tests.TestCase):
         session2 = base.get_session()
         self.assertIsNot(session1.bind, session2.bind)
 
+    def test_no_pool_stats_for_sqlite(self):
+        self.assertIsNone(sql.get_pool_stats())
+        sql.Base().get_engine()
+        self.assertIsNone(sql.get_pool_stats())
+
 
 class FakeDbapiConn(object):
     """Simulates the dbapi_conn passed to mysql_on_checkout."""
@@ -290,3 +300,212 @@ class TestDb2CheckoutHandler(tests.TestCase):
         self.assertRaises(OtherException,
                           self._do_on_checkout,
                           failwith=other_exception)
+
+
+class FakeConnectionRecord(object):
+    def __init__(self):
+        self.info = {}
+
+
+class TestPingWhenIdle(tests.TestCase):
+    def setUp(self):
+        super(TestPingWhenIdle, self).setUp()
+        self.pings = []
+        self.on_checkout = sql.ping_when_idle(
+            lambda *args: self.pings.append(args))
+        self.connection_rec = FakeConnectionRecord()
+
+    def _checkout(self):
+        self.on_checkout(None, self.connection_rec, None)
+
+    def test_new_connection_not_pinged(self):
+        self._checkout()
+        self.assertEqual([], self.pings)
+
+    def test_recently_used_connection_not_pinged(self):
+        sql.record_checkin(None, self.connection_rec)
+        self._checkout()
+        self.assertEqual([], self.pings)
+
+    def test_idle_connection_pinged(self):
+        sql.record_checkin(None, self.connection_rec)
+        self.connection_rec.info['keystone_checked_in'] -= 10
+        self._checkout()
+        self.assertEqual(1, len(self.pings))
+
+    def test_ping_every_checkout(self):
+        self.opt_in_group('sql', ping_idle_threshold=0)
+        sql.record_checkin(None, self.connection_rec)
+        self._checkout()
+        self._checkout()
+        self.assertEqual(2, len(self.pings))
+
+    def test_checkin_without_record(self):
+        sql.record_checkin(None, None)
+
+
+class TestInstrumentedQueuePool(tests.TestCase):
+    def _pool(self, **kwargs):
+        return sql.InstrumentedQueuePool(
+            lambda: sqlite3.connect(':memory:'), **kwargs)
+
+    def test_stats(self):
+        pool = self._pool(pool_size=2, max_overflow=0)
+        conn1 = pool.connect()
+        conn2 = pool.connect()
+        stats = pool.stats()
+        self.assertEqual(2, stats['checkouts'])
+        self.assertEqual(2, stats['checked_out'])
+        self.assertEqual(0, stats['waits'])
+        conn1.close()
+        conn2.close()
+        stats = pool.stats()
+        self.assertEqual(0, stats['checked_out'])
+        self.assertEqual(2, stats['checked_in'])
+        self.assertEqual(2, stats['size'])
+
+    def test_waits_counted(self):
+        pool = self._pool(pool_size=1, max_overflow=0, timeout=0)
+        conn = pool.connect()
+        start = time.time()
+        self.assertRaises(TimeoutError, pool.connect)
+        stats = pool.stats()
+        self.assertEqual(1, stats['waits'])
+        self.assertTrue(0 <= stats['wait_time'] <= time.time() - start)
+        conn.close()
+
+    def test_stats_logged(self):
+        stubs = self.useFixture(moxstubout.MoxStubout()).stubs
+        stubs.Set(sql.core, 'POOL_STATS_LOG_INTERVAL', 0)
+        pool = self._pool(pool_size=1, max_overflow=0)
+        pool.connect().close()
+        self.assertIn("SQL connection pool: {", self.logger.output)
+        self.assertIn("'checkouts': 1", self.logger.output)
+
+    def test_stats_survive_recreate(self):
+        pool = self._pool(pool_size=1, max_overflow=0)
+        pool.connect().close()
+        pool = pool.recreate()
+        self.assertIsInstance(pool, sql.InstrumentedQueuePool)
+        self.assertEqual(1, pool.stats()['checkouts'])
+        pool.connect().close()
+        self.assertEqual(2, pool.stats()['checkouts'])
+
+
+class FakeSlaveReader(sql.Base):
+    def __init__(self, error=None):
+        self.sessions = []
+        self.error = error
+
+    @sql.read_from_slave(exception.NotFound)
+    def read(self, session=None):
+        self.sessions.append(session)
+        if session is not None and self.error is not None:
+            raise self.error
+        return len(self.sessions)
+
+
+class TestReadFromSlave(tests.TestCase):
+    def setUp(self):
+        super(TestReadFromSlave, self).setUp()
+        self.opt_in_group('sql', slave_connection='sqlite://')
+        self.addCleanup(sql.SLAVE_LAG_FUNCTIONS.pop, 'sqlite', None)
+
+    def tearDown(self):
+        sql.set_slave_engine(None)
+        super(TestReadFromSlave, self).tearDown()
+
+    def test_no_slave(self):
+        self.opt_in_group('sql', slave_connection=None)
+        reader = FakeSlaveReader()
+        self.assertEqual(1, reader.read())
+        self.assertEqual([None], reader.sessions)
+
+    def test_read_from_slave(self):
+        reader = FakeSlaveReader()
+        self.assertEqual(1, reader.read())
+        self.assertIs(sql.get_slave_engine(), reader.sessions[0].bind)
+
+    def test_given_session_kept(self):
+        reader = FakeSlaveReader()
+        session = object()
+        reader.read(session=session)
+        self.assertEqual([session], reader.sessions)
+
+    def test_fallback_exception(self):
+        reader = FakeSlaveReader(exception.NotFound(target='x'))
+        self.assertEqual(2, reader.read())
+        self.assertIsNone(reader.sessions[1])
+        # a miss leaves the replica in use
+        self.assertIsNotNone(reader.get_slave_session())
+
+    def test_other_exception_raised(self):
+        reader = FakeSlaveReader(exception.Forbidden())
+        self.assertRaises(exception.Forbidden, reader.read)
+
+    def test_database_error(self):
+        reader = FakeSlaveReader(sql.OperationalError('select', {}, None))
+        self.assertEqual(2, reader.read())
+        self.assertEqual(3, reader.read())
+        self.assertEqual(None, reader.sessions[2])
+
+    def test_retry_interval(self):
+        self.opt_in_group('sql', slave_retry_interval=0)
+        reader = FakeSlaveReader(DisconnectionError())
+        reader.read()
+        self.assertIsNotNone(reader.get_slave_session())
+
+    def _lag(self, lag):
+        sql.SLAVE_LAG_FUNCTIONS['sqlite'] = lambda engine: lag
+
+    def test_lag_within_limit(self):
+        self.opt_in_group('sql', slave_max_lag=5)
+        self._lag(5)
+        self.assertIsNotNone(FakeSlaveReader().get_slave_session())
+
+    def test_lag_over_limit(self):
+        self.opt_in_group('sql', slave_max_lag=5)
+        self._lag(6)
+        self.assertIsNone(FakeSlaveReader().get_slave_session())
+
+    def test_replication_stopped(self):
+        self.opt_in_group('sql', slave_max_lag=5)
+        self._lag(None)
+        self.assertIsNone(FakeSlaveReader().get_slave_session())
+
+    def test_lag_not_checked(self):
+        self._lag(None)
+        self.assertIsNotNone(FakeSlaveReader().get_slave_session())
+
+    def test_lag_checked_periodically(self):
+        self.opt_in_group('sql', slave_max_lag=5)
+        self._lag(0)
+        reader = FakeSlaveReader()
+        self.assertIsNotNone(reader.get_slave_session())
+        self._lag(10)
+        self.assertIsNotNone(reader.get_slave_session())
+        sql.core._SLAVE_STATE['lag_checked'] -= sql.SLAVE_LAG_CHECK_INTERVAL
+        self.assertIsNone(reader.get_slave_session())
+
+
+class TestTpoolDBAPI(tests.TestCase):
+    def setUp(self):
+        super(TestTpoolDBAPI, self).setUp()
+        self.dbapi = sql.TpoolDBAPI(sqlite3)
+        # the connection is used from eventlet's native threads
+        self.connection = self.dbapi.connect(':memory:',
+                                             check_same_thread=False)
+
+    def test_module_attributes(self):
+        self.assertEqual(sqlite3.paramstyle, self.dbapi.paramstyle)
+        self.assertIs(sqlite3.OperationalError, self.dbapi.OperationalError)
+
+    def test_query(self):
+        cursor = self.connection.cursor()
+        cursor.execute('select 1')
+        self.assertEqual([(1,)], cursor.fetchall())
+
+    def test_connection_exceptions(self):
+        cursor = self.connection.cursor()
+        self.assertRaises(self.connection.OperationalError,
+                          cursor.execute, 'select * from missing')
@@ -32,6 +32,7 @@ WARNING::
 """
 
 import copy
+import datetime
 import json
 import uuid
 
@@ -44,6 +45,7 @@ from keystone.common import utils
 from keystone import config
 from keystone import credential
 from keystone import exception
+from keystone.openstack.common import timeutils
 from keystone import tests
 from keystone.tests import default_fixtures
 
@@ -1347,6 +1349,100 @@ class SqlUpgradeTests(SqlMigrateBase):
         self.assertIn(('ix_token_expires_valid', ['expires', 'valid']),
                       index_data)
 
+    def test_token_revoked_at(self):
+        self.upgrade(36)
+        table = sqlalchemy.Table('token', self.metadata, autoload=True)
+        self.assertIn('revoked_at', table.c)
+
+        self.downgrade(35)
+        meta = sqlalchemy.MetaData()
+        meta.bind = self.engine
+        table = sqlalchemy.Table('token', meta, autoload=True)
+        self.assertNotIn('revoked_at', table.c)
+
+    def test_token_tenant_id_consumer_id(self):
+        self.upgrade(36)
+        session = self.Session()
+        expires = timeutils.utcnow() + datetime.timedelta(hours=1)
+        oauth_token_data = {'token': {'OS-OAUTH1': {'consumer_id': 'cid'}}}
+        tokens = [
+            {'id': 'scoped', 'extra': {'tenant': {'id': 'tid'}}},
+            {'id': 'oauth', 'extra': {'token_data': oauth_token_data}},
+            {'id': 'unscoped', 'extra': {'tenant': None}},
+        ]
+        for token in tokens:
+            self.insert_dict(session, 'token',
+                             {'id': token['id'],
+                              'expires': expires,
+                              'extra': json.dumps(token['extra']),
+                              'valid': True,
+                              'user_id': 'uid'})
+        session.close()
+
+        self.upgrade(37)
+        meta = sqlalchemy.MetaData()
+        meta.bind = self.engine
+        token_table = sqlalchemy.Table('token', meta, autoload=True)
+        index_data = [(idx.name, idx.columns.keys())
+                      for idx in token_table.indexes]
+        for column in ['user_id', 'trust_id', 'tenant_id', 'consumer_id']:
+            self.assertIn(('ix_token_%s' % column, [column]), index_data)
+        session = self.Session()
+        rows = dict((token_id, (tenant_id, consumer_id))
+                    for token_id, tenant_id, consumer_id
+                    in session.query(token_table.c.id,
+                                     token_table.c.tenant_id,
+                                     token_table.c.consumer_id))
+        session.close()
+        self.assertEqual({'scoped': ('tid', None),
+                          'oauth': (None, 'cid'),
+                          'unscoped': (None, None)}, rows)
+
+        self.downgrade(36)
+        meta = sqlalchemy.MetaData()
+        meta.bind = self.engine
+        token_table = sqlalchemy.Table('token', meta, autoload=True)
+        self.assertNotIn('tenant_id', token_table.c)
+        self.assertNotIn('consumer_id', token_table.c)
+        self.assertEqual(3, session.query(token_table).count())
+
+    def test_token_archive_table(self):
+        self.upgrade(38)
+        self.assertTableColumns('token_archive',
+                                ['id', 'expires', 'extra', 'valid', 'user_id',
+                                 'trust_id', 'revoked_at', 'tenant_id',
+                                 'consumer_id'])
+        self.downgrade(37)
+        self.assertTableDoesNotExist('token_archive')
+
+    def test_effective_assignment_table(self):
+        self.upgrade(39)
+        self.assertTableColumns('effective_assignment',
+                                ['user_id', 'target_type', 'target_id',
+                                 'role_id', 'inherited', 'source_id'])
+        self.downgrade(38)
+        self.assertTableDoesNotExist('effective_assignment')
+
+    def test_token_revision(self):
+        self.upgrade(40)
+        for table_name in ('token', 'token_archive'):
+            table = sqlalchemy.Table(table_name, self.metadata, autoload=True)
+            self.assertIn('revision', table.c)
+        self.assertTableColumns('token_revision', ['id', 'revision'])
+        session = self.Session()
+        table = sqlalchemy.Table('token_revision', self.metadata,
+                                 autoload=True)
+        self.assertEqual([(1, 0)], list(session.query(table)))
+        session.close()
+
+        self.downgrade(39)
+        self.assertTableDoesNotExist('token_revision')
+        meta = sqlalchemy.MetaData()
+        meta.bind = self.engine
+        for table_name in ('token', 'token_archive'):
+            table = sqlalchemy.Table(table_name, meta, autoload=True)
+            self.assertNotIn('revision', table.c)
+
     def test_migrate_ec2_credential(self):
         user = {
             'id': 'foo',
@@ -748,6 +748,20 @@ class TestTokenProvider(tests.TestCase):
                           provider=token.provider.UUID_PROVIDER)
         token.provider.Manager()
 
+    def test_provider_without_include_catalog(self):
+        calls = []
+
+        class OldProvider(object):
+            def validate_v3_token(self, token_id):
+                calls.append(token_id)
+                return {'token': {}}
+
+        self.token_provider_api.driver = OldProvider()
+        self.assertEqual({'token': {}},
+                         self.token_provider_api._call_validate(
+                             'validate_v3_token', 'tid', False))
+        self.assertEqual(['tid'], calls)
+
     def test_default_token_format(self):
         self.assertEqual(token.provider.Manager.get_token_provider(),
                          token.provider.PKI_PROVIDER)
@@ -34,11 +34,15 @@ import functools
 import os
 import time
 
+from keystone.common import crypt_pool
+from keystone.common import environment
 from keystone.common import utils
+from keystone import exception
 from keystone import tests
 
 
 TZ = None
+environment.use_eventlet()
 
 
 def timezone(func):
@@ -171,3 +175,100 @@ class LimitingReaderTests(tests.TestCase):
         self.assertEqual(len(data.read_args), 1)
         self.assertEqual(len(data.read_kwargs), 0)
         self.assertEqual(data.read_args[0], 10)
+
+
+class VerifiedPasswordCacheTestCase(tests.TestCase):
+    def setUp(self):
+        super(VerifiedPasswordCacheTestCase, self).setUp()
+        self.cache = utils.VerifiedPasswordCache(size=2, ttl=60)
+        self.hashed = utils.hash_password('right')
+
+    def test_hit(self):
+        self.assertTrue(self.cache.check_password('u1', 'right', self.hashed))
+        self.assertTrue(self.cache.check_password('u1', 'right', self.hashed))
+        self.assertEqual({'hits': 1, 'misses': 1, 'entries': 1},
+                         self.cache.stats())
+
+    def test_wrong_password_not_cached(self):
+        self.assertFalse(self.cache.check_password('u1', 'wrong',
+                                                   self.hashed))
+        self.assertFalse(self.cache.check_password('u1', 'wrong',
+                                                   self.hashed))
+        self.assertEqual({'hits': 0, 'misses': 2, 'entries': 0},
+                         self.cache.stats())
+
+    def test_changed_hash_misses(self):
+        self.cache.check_password('u1', 'right', self.hashed)
+        other_hash = utils.hash_password('right')
+        self.assertTrue(self.cache.check_password('u1', 'right', other_hash))
+        self.assertEqual(0, self.cache.hits)
+
+    def test_expiry(self):
+        self.cache.ttl = -1
+        self.cache.check_password('u1', 'right', self.hashed)
+        self.cache.check_password('u1', 'right', self.hashed)
+        self.assertEqual(0, self.cache.hits)
+
+    def test_lru_eviction(self):
+        for user_id in ('u1', 'u2', 'u1', 'u3'):
+            self.cache.check_password(user_id, 'right', self.hashed)
+        self.assertEqual(2, self.cache.stats()['entries'])
+        self.cache.check_password('u1', 'right', self.hashed)
+        self.cache.check_password('u2', 'right', self.hashed)
+        self.assertEqual(2, self.cache.hits)
+
+    def test_invalidate(self):
+        self.cache.check_password('u1', 'right', self.hashed)
+        self.cache.check_password('u2', 'right', self.hashed)
+        self.cache.invalidate('u1')
+        self.assertEqual(1, self.cache.stats()['entries'])
+        self.cache.check_password('u2', 'right', self.hashed)
+        self.assertEqual(1, self.cache.hits)
+
+
+class CryptPoolTestCase(tests.TestCase):
+    def setUp(self):
+        super(CryptPoolTestCase, self).setUp()
+        self.opt(crypt_pool_size=2, crypt_pool_timeout=1)
+        self.addCleanup(self._stop_pool)
+
+    def _stop_pool(self):
+        if crypt_pool._POOL is not None:
+            crypt_pool._POOL.stop()
+            crypt_pool._POOL = None
+
+    def test_hash(self):
+        password = 'right'
+        hashed = utils.hash_password(password)
+        self.assertTrue(utils.check_password(password, hashed))
+        self.assertFalse(utils.check_password('wrongwrong', hashed))
+        self.assertEqual(3, sum(worker['requests'] for worker
+                                in crypt_pool.get_pool().stats()['workers']))
+
+    def test_hash_unicode_password(self):
+        password = u'\u043f\u0430\u0440\u043e\u043b\u044c'
+        hashed = utils.hash_password(password)
+        self.assertTrue(utils.check_password(password, hashed))
+
+    def test_malformed_hash(self):
+        self.assertRaises(ValueError,
+                          utils.check_password, 'right', 'not a hash')
+
+    def test_pool_stats(self):
+        self.assertIsNone(crypt_pool.get_pool_stats())
+        utils.hash_password('right')
+        stats = crypt_pool.get_pool_stats()
+        self.assertEqual(2, stats['size'])
+        self.assertEqual(2, stats['idle'])
+        self.assertEqual(0, stats['waiting'])
+
+    def test_saturated_pool(self):
+        self.opt(crypt_pool_size=1, crypt_pool_timeout=0)
+        pool = crypt_pool.get_pool()
+        busy_worker = pool._idle.get()
+        self.assertRaises(exception.UnexpectedError,
+                          utils.hash_password, 'right')
+        self.assertEqual(0, crypt_pool.get_pool_stats()['waiting'])
+        self.assertEqual(0, crypt_pool.get_pool_stats()['idle'])
+        pool._idle.put(busy_worker)
+        utils.hash_password('right')
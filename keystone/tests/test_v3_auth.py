@@ -19,6 +19,7 @@ from keystone import auth
 from keystone.common import cms
 from keystone import config
 from keystone import exception
+from keystone.openstack.common.fixture import moxstubout
 from keystone import tests
 from keystone.tests import test_v3
 
@@ -132,6 +133,22 @@ class TestPKITokenAPIs(test_v3.RestfulTestCase):
         expected_token_data = resp.result
         self.assertDictEqual(expected_token_data, token_data)
 
+    def test_catalog_not_persisted(self):
+        auth_data = self.build_authentication_request(
+            user_id=self.user['id'],
+            password=self.user['password'],
+            project_id=self.project_id)
+        resp = self.post('/auth/tokens', body=auth_data)
+        catalog = resp.result['token']['catalog']
+        self.assertTrue(catalog)
+
+        token_id = resp.headers.get('X-Subject-Token')
+        token_ref = self.token_api.get_token(token_id)
+        self.assertNotIn('catalog', token_ref['token_data']['token'])
+
+        resp = self.get('/auth/tokens', headers={'X-Subject-Token': token_id})
+        self.assertEqual(catalog, resp.result['token']['catalog'])
+
     def test_v3_v2_intermix_non_default_domain_failed(self):
         auth_data = self.build_authentication_request(
             user_id=self.user['id'],
@@ -327,6 +344,23 @@ class TestPKITokenAPIs(test_v3.RestfulTestCase):
         headers = {'X-Subject-Token': resp.headers.get('X-Subject-Token')}
         r = self.get('/auth/tokens?nocatalog', headers=headers)
         self.assertValidProjectScopedTokenResponse(r, require_catalog=False)
+        self.assertNotIn('catalog', r.result['token'])
+        # leaving out the catalog must not affect later validations
+        r = self.get('/auth/tokens', headers=headers)
+        self.assertValidProjectScopedTokenResponse(r)
+
+    def test_validate_token_nocatalog_skips_catalog(self):
+        token = self.get_scoped_token()
+        headers = {'X-Subject-Token': token}
+
+        def get_v3_catalog(*args, **kwargs):
+            raise exception.UnexpectedError('catalog should not be built')
+
+        stubs = self.useFixture(moxstubout.MoxStubout()).stubs
+        stubs.Set(self.catalog_api, 'get_v3_catalog', get_v3_catalog)
+        self.get('/auth/tokens?nocatalog', headers=headers, token=token)
+        self.head('/auth/tokens', headers=headers, token=token,
+                  expected_status=204)
 
     def test_revoke_token(self):
         headers = {'X-Subject-Token': self.get_scoped_token()}
@@ -336,6 +370,44 @@ class TestPKITokenAPIs(test_v3.RestfulTestCase):
         r = self.get('/auth/tokens/OS-PKI/revoked')
         self.assertIn('signed', r.result)
 
+    def test_revocation_list_etag(self):
+        r = self.get('/auth/tokens/OS-PKI/revoked')
+        etag = r.headers['ETag']
+        self.get('/auth/tokens/OS-PKI/revoked',
+                 headers={'If-None-Match': etag},
+                 expected_status=304)
+
+        headers = {'X-Subject-Token': self.get_scoped_token()}
+        self.delete('/auth/tokens', headers=headers, expected_status=204)
+        r = self.get('/auth/tokens/OS-PKI/revoked',
+                     headers={'If-None-Match': etag})
+        self.assertNotEqual(etag, r.headers['ETag'])
+
+
+class TestPKIZTokenAPIs(TestPKITokenAPIs):
+    def config_files(self):
+        conf_files = super(TestPKIZTokenAPIs, self).config_files()
+        conf_files.append(tests.dirs.tests('test_pkiz_token_provider.conf'))
+        return conf_files
+
+    def test_v3_token_id(self):
+        auth_data = self.build_authentication_request(
+            user_id=self.user['id'],
+            password=self.user['password'])
+        resp = self.post('/auth/tokens', body=auth_data)
+        token_data = resp.result
+        token_id = resp.headers.get('X-Subject-Token')
+        self.assertTrue(cms.is_pkiz_token(token_id))
+
+        signed_text = cms.verify_compressed_token(token_id,
+                                                  CONF.signing.certfile,
+                                                  CONF.signing.ca_certs)
+        self.assertEqual(token_data, json.loads(signed_text))
+        # should be able to validate hash PKIZ token as well
+        headers = {'X-Subject-Token': cms.cms_hash_token(token_id)}
+        resp = self.get('/auth/tokens', headers=headers)
+        self.assertDictEqual(token_data, resp.result)
+
 
 class TestUUIDTokenAPIs(TestPKITokenAPIs):
     def config_files(self):
@@ -20,6 +20,7 @@ from testtools import matchers
 
 from keystone.common import controller
 from keystone import exception
+from keystone.openstack.common.fixture import moxstubout
 from keystone import tests
 from keystone.tests import test_v3
 
@@ -425,6 +426,68 @@ class IdentityTestCase(test_v3.RestfulTestCase):
         r = self.get('/users', content_type='xml')
         self.assertValidUserListResponse(r, ref=self.user)
 
+    def _create_users(self, count, **kwargs):
+        for i in range(count):
+            user = self.new_user_ref(domain_id=self.domain_id)
+            user.update(kwargs)
+            self.identity_api.create_user(user['id'], user)
+
+    def _get_link(self, link):
+        return self.get(link.split('/v3', 1)[1])
+
+    def test_list_users_filtered_by_name(self):
+        """Call ``GET /users?name={name}``."""
+        self._create_users(3)
+        r = self.get('/users?name=%s' % self.user['name'])
+        self.assertValidUserListResponse(r, ref=self.user,
+                                         expected_length=1)
+
+    def test_list_users_paginated(self):
+        """Call ``GET /users?limit={limit}`` and follow the links."""
+        self._create_users(4)
+        all_ids = sorted(x['id'] for x in self.get('/users').result['users'])
+
+        r = self.get('/users?limit=2')
+        pages = [r]
+        while r.result['links']['next'] is not None:
+            r = self._get_link(r.result['links']['next'])
+            self.assertValidUserListResponse(r)
+            pages.append(r)
+        self.assertEqual(all_ids,
+                         [x['id'] for page in pages
+                          for x in page.result['users']])
+        self.assertIsNone(pages[0].result['links']['previous'])
+        self.assertThat(pages, matchers.HasLength((len(all_ids) + 1) // 2))
+
+        r = self._get_link(pages[-1].result['links']['previous'])
+        self.assertEqual(pages[-2].result['users'], r.result['users'])
+
+    def test_list_users_paginated_with_unindexed_filter(self):
+        """Call ``GET /users?email={email}&limit={limit}``."""
+        self._create_users(3, email='paged@example.com')
+        self._create_users(2)
+        r = self.get('/users?email=paged@example.com&limit=2')
+        self.assertValidUserListResponse(r, expected_length=2)
+        r = self._get_link(r.result['links']['next'])
+        users = self.assertValidUserListResponse(r, expected_length=1)
+        self.assertEqual('paged@example.com', users[0]['email'])
+        self.assertIsNone(r.result['links']['next'])
+
+    def test_list_users_list_limit(self):
+        """Call ``GET /users`` with ``list_limit`` set."""
+        self._create_users(3)
+        self.opt(list_limit=2)
+        r = self.get('/users')
+        self.assertValidUserListResponse(r, expected_length=2)
+        self.assertIn('limit=2', r.result['links']['next'])
+        r = self.get('/users?limit=100')
+        self.assertValidUserListResponse(r, expected_length=2)
+
+    def test_list_users_invalid_limit(self):
+        """Call ``GET /users?limit={limit}`` with invalid limits."""
+        self.get('/users?limit=0', expected_status=400)
+        self.get('/users?limit=many', expected_status=400)
+
     def test_get_user(self):
         """Call ``GET /users/{user_id}``."""
         r = self.get('/users/%(user_id)s' % {
@@ -1564,6 +1627,63 @@ class IdentityInheritanceTestCase(test_v3.RestfulTestCase):
         self.assertRoleAssignmentInListResponse(r, ud_entity, link_url=ud_url)
         self.assertRoleAssignmentInListResponse(r, gd_entity, link_url=gd_url)
 
+    def test_filtered_effective_role_assignments(self):
+        """Call ``GET /role_assignments?effective`` with filters.
+
+        Test Plan:
+        - Create a domain with two projects, and two users in a group
+        - Assign an inherited group role on the domain, and a direct role
+          to each user on a different project
+        - Filtering the effective assignments by user or by project
+          should return the matching subset of the unfiltered list
+        - Filtering by user should not need the members of the group
+
+        """
+        domain = self.new_domain_ref()
+        self.assignment_api.create_domain(domain['id'], domain)
+        group1 = self.new_group_ref(domain_id=domain['id'])
+        self.identity_api.create_group(group1['id'], group1)
+        users = []
+        projects = []
+        for i in range(2):
+            user = self.new_user_ref(domain_id=domain['id'])
+            self.identity_api.create_user(user['id'], user)
+            self.identity_api.add_user_to_group(user['id'], group1['id'])
+            users.append(user)
+            project = self.new_project_ref(domain_id=domain['id'])
+            self.assignment_api.create_project(project['id'], project)
+            projects.append(project)
+            self.assignment_api.create_grant(
+                self.role_id, user_id=user['id'], project_id=project['id'])
+        self.assignment_api.create_grant(
+            self.role_id, group_id=group1['id'], domain_id=domain['id'],
+            inherited_to_projects=True)
+
+        r = self.get('/role_assignments?effective')
+        all_assignments = r.result['role_assignments']
+
+        def _assertFiltered(query, matches):
+            r = self.get('/role_assignments?effective&%s' % query)
+            self.assertValidRoleAssignmentListResponse(r)
+            expected = [x for x in all_assignments if matches(x)]
+            self.assertEqual(sorted(expected),
+                             sorted(r.result['role_assignments']))
+            return r.result['role_assignments']
+
+        _assertFiltered('scope.project.id=%s' % projects[0]['id'],
+                        lambda x: x['scope'].get('project') ==
+                        {'id': projects[0]['id']})
+
+        def _no_group_members(*args, **kwargs):
+            raise AssertionError('group members listed')
+
+        stubs = self.useFixture(moxstubout.MoxStubout()).stubs
+        stubs.Set(self.identity_api, 'list_users_in_group',
+                  _no_group_members)
+        refs = _assertFiltered('user.id=%s' % users[0]['id'],
+                               lambda x: x['user'] == {'id': users[0]['id']})
+        self.assertEqual(3, len(refs))
+
 
 class IdentityInheritanceDisabledTestCase(test_v3.RestfulTestCase):
     """Test inheritance crud and its effects."""
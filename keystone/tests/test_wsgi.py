@@ -18,7 +18,9 @@ import uuid
 
 from babel import localedata
 import gettext
+import routes
 
+from keystone.common import controller
 from keystone.common import wsgi
 from keystone import exception
 from keystone.openstack.common.fixture import moxstubout
@@ -125,6 +127,90 @@ class ExtensionRouterTest(BaseWSGITest):
         self.assertEqual("test", app.kwargs["testkey"])
 
 
+class RouterTest(BaseWSGITest):
+    def setUp(self):
+        super(RouterTest, self).setUp()
+
+        class RouteApp(wsgi.Application):
+            def show(self, context, **kwargs):
+                return {'action': 'show', 'path': context['path'],
+                        'kwargs': kwargs}
+
+            def create(self, context, **kwargs):
+                return {'action': 'create', 'kwargs': kwargs}
+
+        self.route_app = RouteApp()
+        self.mapper = routes.Mapper()
+        self.mapper.connect('/users/{user_id}', controller=self.route_app,
+                            action='show', conditions=dict(method=['GET']))
+        self.mapper.connect('/users', controller=self.route_app,
+                            action='create', conditions=dict(method=['POST']))
+        self.router = wsgi.Router(self.mapper)
+
+    def _request(self, app, url, method='GET'):
+        req = wsgi.Request.blank(url)
+        req.method = method
+        resp = req.get_response(app)
+        if resp.status_int == 404:
+            return resp.status_int, None
+        return resp.status_int, jsonutils.loads(resp.body)
+
+    def test_dispatch(self):
+        status, body = self._request(self.router, '/users/foo')
+        self.assertEqual(200, status)
+        self.assertEqual('show', body['action'])
+        self.assertEqual({'user_id': 'foo'}, body['kwargs'])
+
+        status, body = self._request(self.router, '/users', 'POST')
+        self.assertEqual(200, status)
+        self.assertEqual('create', body['action'])
+
+    def test_not_found(self):
+        self.assertEqual(404, self._request(self.router, '/users', 'GET')[0])
+        self.assertEqual(404, self._request(self.router, '/groups/foo')[0])
+        self.assertEqual(404, self._request(self.router, '/')[0])
+
+    def test_route_added_after_init(self):
+        self._request(self.router, '/users/foo')
+        self.mapper.connect('/groups/{group_id}', controller=self.route_app,
+                            action='show')
+        status, body = self._request(self.router, '/groups/bar')
+        self.assertEqual(200, status)
+        self.assertEqual({'group_id': 'bar'}, body['kwargs'])
+
+    def test_mapper_order_preserved(self):
+        self.mapper.connect('/{collection}/special',
+                            controller=self.route_app, action='create')
+        self.mapper.matchlist.insert(0, self.mapper.matchlist.pop())
+        status, body = self._request(self.router, '/users/special')
+        self.assertEqual('create', body['action'])
+        self.assertEqual({'collection': 'users'}, body['kwargs'])
+
+    def test_extension_router_passes_path_on(self):
+        class FakeExtensionRouter(wsgi.ExtensionRouter):
+            def add_routes(self, mapper):
+                mapper.connect('/extension', controller=self.application,
+                               action='show')
+
+        router = FakeExtensionRouter(self.router)
+        status, body = self._request(router, '/users/foo')
+        self.assertEqual(200, status)
+        self.assertEqual({'user_id': 'foo'}, body['kwargs'])
+        self.assertEqual('/users/foo', body['path'])
+        self.assertEqual(404, self._request(router, '/groups/foo')[0])
+
+    def test_v3_post_created(self):
+        class V3App(controller.V3Controller):
+            def create(self, context):
+                return {}
+
+        mapper = routes.Mapper()
+        mapper.connect('/things', controller=V3App(), action='create')
+        router = wsgi.Router(mapper)
+        self.assertEqual(201, self._request(router, '/things', 'POST')[0])
+        self.assertEqual(200, self._request(router, '/things', 'GET')[0])
+
+
 class MiddlewareTest(BaseWSGITest):
     def test_middleware_request(self):
         class FakeMiddleware(wsgi.Middleware):
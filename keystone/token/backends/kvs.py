@@ -61,10 +61,18 @@ class Token(kvs.Base, token.Driver):
         try:
             token_ref = self.get_token(token_id)
             self.db.delete('token-%s' % token_id)
+            token_ref['revoked_at'] = timeutils.utcnow()
+            token_ref['revision'] = self._next_revision()
             self.db.set('revoked-token-%s' % token_id, token_ref)
         except exception.NotFound:
             raise exception.TokenNotFound(token_id=token_id)
 
+    def _next_revision(self):
+        counter = self.db.get('revocation-revision', {'revision': 0})
+        counter['revision'] += 1
+        self.db.set('revocation-revision', counter)
+        return counter['revision']
+
     def delete_tokens(self, user_id, tenant_id=None, trust_id=None,
                       consumer_id=None):
         return super(Token, self).delete_tokens(
@@ -153,11 +161,18 @@ class Token(kvs.Base, token.Driver):
             record = {}
             record['id'] = token_ref['id']
             record['expires'] = token_ref['expires']
+            record['revoked_at'] = token_ref.get('revoked_at')
+            record['revision'] = token_ref.get('revision')
             tokens.append(record)
         return tokens
 
-    def flush_expired_tokens(self):
+    def flush_expired_tokens(self, batch_size=None, batch_delay=0,
+                             dry_run=False, archive=False):
         now = timeutils.utcnow()
+        flushed = 0
         for token, token_ref in self.db.items():
             if self.is_expired(now, token_ref):
-                self.db.delete(token)
+                if not dry_run:
+                    self.db.delete(token)
+                flushed += 1
+        return flushed
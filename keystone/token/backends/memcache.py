@@ -16,6 +16,7 @@
 
 from __future__ import absolute_import
 import copy
+import hashlib
 
 import memcache
 
@@ -32,9 +33,15 @@ CONF = config.CONF
 
 LOG = logging.getLogger(__name__)
 
+# Revoked tokens are stored in one memcache key per hour of token expiry;
+# tokens without an expiry share a key that never expires.
+REVOCATION_BUCKET_SECONDS = 3600
+
 
 class Token(token.Driver):
     revocation_key = 'revocation-list'
+    revision_key = 'revocation-revision'
+    last_bucket_key = 'revocation-last-bucket'
 
     def __init__(self, client=None):
         self._memcache_client = client
@@ -70,6 +77,60 @@ class Token(token.Driver):
 
         return token_ref
 
+    def _user_index_keys(self, user_id, shards=None):
+        """Return the keys of every shard of a user's token index.
+
+        The first shard uses the unsharded key so that indexes written with
+        ``[memcache] user_index_shards = 1`` remain readable.
+        """
+        user_key = self._prefix_user_id(user_id)
+        return [user_key] + ['%s-%d' % (user_key, shard)
+                             for shard in range(1, shards or
+                                                self._index_shards())]
+
+    def _index_shards(self):
+        return max(CONF.memcache.user_index_shards, 1)
+
+    def _index_shards_to_read(self):
+        # after user_index_shards is lowered, tokens indexed in the dropped
+        # shards are found until previous_user_index_shards is unset
+        return max(self._index_shards(),
+                   CONF.memcache.previous_user_index_shards or 1)
+
+    def _user_index_key_for_token(self, user_id, token_id):
+        keys = self._user_index_keys(user_id)
+        shard = int(hashlib.md5(token_id.encode('utf-8')).hexdigest(), 16)
+        return keys[shard % len(keys)]
+
+    def _parse_index(self, record):
+        """Return the (token_id, expires) entries of a token index record.
+
+        ``expires`` is a unix timestamp, or None if the entry was written
+        without an expiry (including entries written before expiries were
+        stored in the index).
+        """
+        entries = []
+        for entry in jsonutils.loads('[%s]' % (record or '')):
+            if isinstance(entry, list):
+                entries.append((entry[0], entry[1]))
+            else:
+                entries.append((entry, None))
+        return entries
+
+    def _format_index_entry(self, token_id, expires):
+        return jsonutils.dumps([token_id, expires])
+
+    def _get_token_refs(self, token_ids):
+        """Fetch the given tokens in one round trip, keyed by token id."""
+        ptks = dict((self._prefix_token_id(token_id), token_id)
+                    for token_id in token_ids)
+        if not ptks:
+            return {}
+        token_refs = self.client.get_multi(ptks.keys())
+        return dict((ptks[ptk], token_ref)
+                    for ptk, token_ref in token_refs.iteritems()
+                    if token_ref)
+
     def create_token(self, token_id, data):
         data_copy = copy.deepcopy(data)
         ptk = self._prefix_token_id(token_id)
@@ -78,14 +139,15 @@ class Token(token.Driver):
         if not data_copy.get('user_id'):
             data_copy['user_id'] = data_copy['user']['id']
         kwargs = {}
+        expires_ts = None
         if data_copy['expires'] is not None:
             expires_ts = utils.unixtime(data_copy['expires'])
             kwargs['time'] = expires_ts
         self.client.set(ptk, data_copy, **kwargs)
         if 'id' in data['user']:
-            token_data = jsonutils.dumps(token_id)
+            token_data = self._format_index_entry(token_id, expires_ts)
             user_id = data['user']['id']
-            user_key = self._prefix_user_id(user_id)
+            user_key = self._user_index_key_for_token(user_id, token_id)
             # Append the new token_id to the token-index-list stored in the
             # user-key within memcache.
             self._update_user_list_with_cas(user_key, token_data)
@@ -94,8 +156,7 @@ class Token(token.Driver):
     def _update_user_list_with_cas(self, user_key, token_id):
         cas_retry = 0
         max_cas_retry = CONF.memcache.max_compare_and_set_retry
-        current_time = timeutils.normalize_time(
-            timeutils.parse_isotime(timeutils.isotime()))
+        current_time = utils.unixtime(timeutils.utcnow())
 
         self.client.reset_cas()
 
@@ -113,24 +174,27 @@ class Token(token.Driver):
             record = self.client.gets(user_key)
             filtered_list = []
 
-            if record is not None:
-                token_list = jsonutils.loads('[%s]' % record)
-                for token_i in token_list:
-                    ptk = self._prefix_token_id(token_i)
-                    token_ref = self.client.get(ptk)
+            entries = self._parse_index(record)
+            # Entries written without an expiry need the token itself to be
+            # checked; fetch all of them in a single round trip.
+            token_refs = self._get_token_refs(
+                [token_i for token_i, expires in entries if expires is None])
+            for token_i, expires in entries:
+                if expires is None:
+                    token_ref = token_refs.get(token_i)
                     if not token_ref:
                         # skip tokens that do not exist in memcache
                         continue
+                    if token_ref.get('expires') is not None:
+                        expires = utils.unixtime(token_ref['expires'])
 
-                    if 'expires' in token_ref:
-                        expires_at = timeutils.normalize_time(
-                            token_ref['expires'])
-                        if expires_at < current_time:
-                            # skip tokens that are expired.
-                            continue
+                if expires is not None and expires < current_time:
+                    # skip tokens that are expired.
+                    continue
 
-                    # Add the still valid token_id to the list.
-                    filtered_list.append(jsonutils.dumps(token_i))
+                # Add the still valid token_id to the list.
+                filtered_list.append(
+                    self._format_index_entry(token_i, expires))
             # Add the new token_id to the list.
             filtered_list.append(token_id)
 
@@ -161,14 +225,86 @@ class Token(token.Driver):
         error_msg = _('Unable to add token user list')
         raise exception.UnexpectedError(error_msg)
 
+    def _revocation_bucket_key(self, bucket):
+        if bucket is None:
+            return '%s-none' % self.revocation_key
+        return '%s-%d' % (self.revocation_key, bucket)
+
+    def _revocation_bucket(self, expires):
+        if expires is None:
+            return None
+        return int(utils.unixtime(expires)) // REVOCATION_BUCKET_SECONDS
+
+    def _next_revision(self):
+        # NOTE: memcache has no transactions, so a revocation may be appended
+        # to its bucket after one allocated a higher revision; the window is
+        # the time between the incr and the append below.
+        revision = self.client.incr(self.revision_key)
+        if revision is None:
+            self.client.add(self.revision_key, str(self._first_revision()),
+                            time=0)
+            revision = self.client.incr(self.revision_key)
+            if revision is None:
+                msg = _('Unable to allocate a revocation revision.')
+                raise exception.UnexpectedError(msg)
+        return int(revision)
+
+    def _first_revision(self):
+        """Pick the value of a missing revision counter.
+
+        The counter is missing at first, but also once memcache evicted it
+        or restarted, and clients may hold any revision it reached. It
+        restarts above the highest revision still listed and above the
+        current time in microseconds, which a counter incremented less than
+        a million times a second never reaches.
+        """
+        now = timeutils.utcnow()
+        revisions = [token_ref.get('revision') or 0
+                     for token_ref in self.list_revoked_tokens()]
+        return max([utils.unixtime(now) * 1000000 + now.microsecond] +
+                   revisions)
+
     def _add_to_revocation_list(self, data):
-        data_json = jsonutils.dumps(data)
-        if not self.client.append(self.revocation_key, ',%s' % data_json):
-            if not self.client.add(self.revocation_key, data_json):
-                if not self.client.append(self.revocation_key,
-                                          ',%s' % data_json):
+        expires = data.get('expires')
+        if expires is not None:
+            expires = timeutils.normalize_time(expires)
+        record = {'id': data['id'],
+                  'expires': expires and timeutils.isotime(expires),
+                  'revoked_at': timeutils.isotime(subsecond=True),
+                  'revision': self._next_revision()}
+        data_json = jsonutils.dumps(record)
+        bucket = self._revocation_bucket(expires)
+        bucket_key = self._revocation_bucket_key(bucket)
+        # The bucket expires from memcache once every token in it has
+        # expired; a time of 0 keeps the bucket of non-expiring tokens
+        bucket_expires = 0
+        if bucket is not None:
+            bucket_expires = (bucket + 1) * REVOCATION_BUCKET_SECONDS
+        if not self.client.append(bucket_key, ',%s' % data_json):
+            if not self.client.add(bucket_key, data_json,
+                                   time=bucket_expires):
+                if not self.client.append(bucket_key, ',%s' % data_json):
                     msg = _('Unable to add token to revocation list.')
                     raise exception.UnexpectedError(msg)
+        if bucket is not None:
+            self._record_last_revocation_bucket(bucket, bucket_expires)
+
+    def _record_last_revocation_bucket(self, bucket, bucket_expires):
+        """Remember the furthest bucket written to, if it is this one.
+
+        Tokens may have been issued under a longer ``[token] expiration``
+        than the current one, so list_revoked_tokens() reads up to this
+        bucket as well.
+        """
+        self.client.reset_cas()
+        for _i in range(CONF.memcache.max_compare_and_set_retry + 1):
+            last = self.client.gets(self.last_bucket_key)
+            if last is not None and int(last) >= bucket:
+                return
+            if self.client.cas(self.last_bucket_key, str(bucket),
+                               time=bucket_expires):
+                return
+        LOG.warning(_('Unable to record the last revocation list bucket.'))
 
     def delete_token(self, token_id):
         # Test for existence
@@ -190,12 +326,17 @@ class Token(token.Driver):
     def _list_tokens(self, user_id, tenant_id=None, trust_id=None,
                      consumer_id=None):
         tokens = []
-        user_key = self._prefix_user_id(user_id)
-        user_record = self.client.get(user_key) or ""
-        token_list = jsonutils.loads('[%s]' % user_record)
-        for token_id in token_list:
-            ptk = self._prefix_token_id(token_id)
-            token_ref = self.client.get(ptk)
+        current_time = utils.unixtime(timeutils.utcnow())
+        records = self.client.get_multi(
+            self._user_index_keys(user_id, self._index_shards_to_read()))
+        token_ids = []
+        for record in records.itervalues():
+            for token_id, expires in self._parse_index(record):
+                if expires is None or expires >= current_time:
+                    token_ids.append(token_id)
+        token_refs = self._get_token_refs(token_ids)
+        for token_id in token_ids:
+            token_ref = token_refs.get(token_id)
             if token_ref:
                 if tenant_id is not None:
                     tenant = token_ref.get('tenant')
@@ -220,13 +361,68 @@ class Token(token.Driver):
                 tokens.append(token_id)
         return tokens
 
+    def _live_revocation_bucket_keys(self):
+        # NOTE: tokens are never issued with a lifetime longer than
+        # [token] expiration; later buckets only exist if it was lowered
+        # since, and are then recorded under last_bucket_key.
+        first = self._revocation_bucket(timeutils.utcnow())
+        last = self._revocation_bucket(token.default_expire_time())
+        recorded = self.client.get(self.last_bucket_key)
+        if recorded is not None:
+            last = max(last, int(recorded))
+        keys = [self._revocation_bucket_key(bucket)
+                for bucket in range(first, last + 1)]
+        keys.append(self._revocation_bucket_key(None))
+        return keys
+
     def list_revoked_tokens(self):
-        list_json = self.client.get(self.revocation_key)
-        if list_json:
-            return jsonutils.loads('[%s]' % list_json)
-        return []
+        """Returns the revoked tokens that have not yet expired.
+
+        :returns: list of dicts with the ``id``, ``expires`` and, except for
+                  tokens revoked by older releases, ``revoked_at`` and
+                  ``revision`` of each token
+
+        """
+        now = timeutils.utcnow()
+        keys = self._live_revocation_bucket_keys()
+        records = self.client.get_multi(keys + [self.revocation_key])
+        legacy_record = records.pop(self.revocation_key, None)
+        tokens = []
+        for key in keys:
+            if not records.get(key):
+                continue
+            for record in jsonutils.loads('[%s]' % records[key]):
+                if (record['expires'] is None or
+                        timeutils.normalize_time(timeutils.parse_isotime(
+                            record['expires'])) > now):
+                    tokens.append({'id': record['id'],
+                                   'expires': record['expires'],
+                                   'revoked_at': record['revoked_at'],
+                                   'revision': record.get('revision')})
+        if legacy_record:
+            tokens.extend(self._list_legacy_revoked_tokens(legacy_record,
+                                                           now))
+        return tokens
+
+    def _list_legacy_revoked_tokens(self, legacy_record, now):
+        """Read the unbucketed revocation list written by older releases.
+
+        Its entries are full token references. The key is removed once
+        every token in it has expired, as nothing is added to it any more;
+        tokens without an expiry are kept, as in the bucketed list.
+        """
+        tokens = []
+        for data in jsonutils.loads('[%s]' % legacy_record):
+            if (data['expires'] is None or
+                    timeutils.normalize_time(timeutils.parse_strtime(
+                        data['expires'])) > now):
+                tokens.append({'id': data['id'], 'expires': data['expires']})
+        if not tokens:
+            self.client.delete(self.revocation_key)
+        return tokens
 
-    def flush_expired_tokens(self):
+    def flush_expired_tokens(self, batch_size=None, batch_delay=0,
+                             dry_run=False, archive=False):
         """Archive or delete tokens that have expired.
         """
         raise exception.NotImplemented()
@@ -15,13 +15,33 @@
 # under the License.
 
 import copy
+import time
 
 from keystone.common import sql
 from keystone import exception
+from keystone.openstack.common import log as logging
 from keystone.openstack.common import timeutils
 from keystone import token
 
 
+LOG = logging.getLogger(__name__)
+
+# number of ids in the IN clause of each UPDATE issued by delete_tokens()
+DELETE_TOKENS_BATCH = 500
+
+
+def _tenant_id(token_ref):
+    return (token_ref.get('tenant') or {}).get('id')
+
+
+def _consumer_id(token_ref):
+    try:
+        oauth = token_ref['token_data']['token'].get('OS-OAUTH1') or {}
+        return oauth.get('consumer_id')
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+
 class TokenModel(sql.ModelBase, sql.DictBase):
     __tablename__ = 'token'
     attributes = ['id', 'expires', 'user_id', 'trust_id']
@@ -31,19 +51,53 @@ class TokenModel(sql.ModelBase, sql.DictBase):
     valid = sql.Column(sql.Boolean(), default=True, nullable=False)
     user_id = sql.Column(sql.String(64))
     trust_id = sql.Column(sql.String(64))
+    revoked_at = sql.Column(sql.DateTime(), default=None)
+    tenant_id = sql.Column(sql.String(64))
+    consumer_id = sql.Column(sql.String(64))
+    revision = sql.Column(sql.BigInteger(), default=None)
     __table_args__ = (
         sql.Index('ix_token_expires', 'expires'),
         sql.Index('ix_token_valid', 'valid'),
-        sql.Index('ix_token_expires_valid', 'expires', 'valid')
+        sql.Index('ix_token_expires_valid', 'expires', 'valid'),
+        sql.Index('ix_token_user_id', 'user_id'),
+        sql.Index('ix_token_trust_id', 'trust_id'),
+        sql.Index('ix_token_tenant_id', 'tenant_id'),
+        sql.Index('ix_token_consumer_id', 'consumer_id')
     )
 
 
+class TokenArchiveModel(sql.ModelBase):
+    """Expired tokens moved aside by ``keystone-manage token_flush``."""
+
+    __tablename__ = 'token_archive'
+    id = sql.Column(sql.String(64), primary_key=True)
+    expires = sql.Column(sql.DateTime(), default=None)
+    extra = sql.Column(sql.JsonBlob())
+    valid = sql.Column(sql.Boolean(), default=True, nullable=False)
+    user_id = sql.Column(sql.String(64))
+    trust_id = sql.Column(sql.String(64))
+    revoked_at = sql.Column(sql.DateTime(), default=None)
+    tenant_id = sql.Column(sql.String(64))
+    consumer_id = sql.Column(sql.String(64))
+    revision = sql.Column(sql.BigInteger(), default=None)
+
+
+class TokenRevisionModel(sql.ModelBase):
+    """The single row counting revocations."""
+
+    __tablename__ = 'token_revision'
+    id = sql.Column(sql.Integer(), primary_key=True, autoincrement=False)
+    revision = sql.Column(sql.BigInteger(), nullable=False)
+
+
 class Token(sql.Base, token.Driver):
     # Public interface
-    def get_token(self, token_id):
+    @sql.read_from_slave(exception.TokenNotFound, bounded_lag=True)
+    def get_token(self, token_id, session=None):
         if token_id is None:
             raise exception.TokenNotFound(token_id=token_id)
-        session = self.get_session()
+        if session is None:
+            session = self.get_session()
         token_ref = session.query(TokenModel).get(token_id)
         if not token_ref or not token_ref.valid:
             raise exception.TokenNotFound(token_id=token_id)
@@ -58,6 +112,8 @@ class Token(sql.Base, token.Driver):
 
         token_ref = TokenModel.from_dict(data_copy)
         token_ref.valid = True
+        token_ref.tenant_id = _tenant_id(data_copy)
+        token_ref.consumer_id = _consumer_id(data_copy)
         session = self.get_session()
         with session.begin():
             session.add(token_ref)
@@ -71,6 +127,8 @@ class Token(sql.Base, token.Driver):
             if not token_ref or not token_ref.valid:
                 raise exception.TokenNotFound(token_id=token_id)
             token_ref.valid = False
+            token_ref.revoked_at = timeutils.utcnow()
+            token_ref.revision = self._next_revision(session)
             session.flush()
 
     def delete_tokens(self, user_id, tenant_id=None, trust_id=None,
@@ -82,122 +140,152 @@ class Token(sql.Base, token.Driver):
         If using a trust, the token's user_id is set to the trustee's user ID
         or the trustor's user ID, so will use trust_id to query the tokens.
 
+        The matching token ids are read and locked, then exactly those
+        tokens are revoked by UPDATEs on their ids, without loading them;
+        tokens issued in the meantime are neither revoked nor returned.
+
+        :returns: list of the revoked token ids
+
         """
         session = self.get_session()
         with session.begin():
             now = timeutils.utcnow()
-            query = session.query(TokenModel)
-            query = query.filter_by(valid=True)
-            query = query.filter(TokenModel.expires > now)
-            if trust_id:
-                query = query.filter(TokenModel.trust_id == trust_id)
-            else:
-                query = query.filter(TokenModel.user_id == user_id)
-
-            for token_ref in query.all():
-                if tenant_id:
-                    token_ref_dict = token_ref.to_dict()
-                    if not self._tenant_matches(tenant_id, token_ref_dict):
-                        continue
-                if consumer_id:
-                    token_ref_dict = token_ref.to_dict()
-                    if not self._consumer_matches(consumer_id, token_ref_dict):
-                        continue
-
-                token_ref.valid = False
-
-            session.flush()
+            query = self._tokens_query(session, TokenModel.id, now, user_id,
+                                       tenant_id, trust_id, consumer_id)
+            token_ids = [token_ref[0]
+                         for token_ref in query.with_lockmode('update')]
+            if token_ids:
+                values = {'valid': False, 'revoked_at': now,
+                          'revision': self._next_revision(session)}
+                for start in range(0, len(token_ids), DELETE_TOKENS_BATCH):
+                    batch = token_ids[start:start + DELETE_TOKENS_BATCH]
+                    query = session.query(TokenModel)
+                    query = query.filter(TokenModel.id.in_(batch))
+                    query.update(values, synchronize_session=False)
+        return token_ids
 
-    def _tenant_matches(self, tenant_id, token_ref_dict):
-        return ((tenant_id is None) or
-                (token_ref_dict.get('tenant') and
-                 token_ref_dict['tenant'].get('id') == tenant_id))
+    def _next_revision(self, session):
+        """Allocate the revision of a revocation in its transaction.
 
-    def _consumer_matches(self, consumer_id, ref):
-        if consumer_id is None:
-            return True
-        else:
-            try:
-                oauth = ref['token_data']['token'].get('OS-OAUTH1', {})
-                return oauth and oauth['consumer_id'] == consumer_id
-            except KeyError:
-                return False
-
-    def _list_tokens_for_trust(self, trust_id):
-        session = self.get_session()
-        tokens = []
-        now = timeutils.utcnow()
-        query = session.query(TokenModel)
-        query = query.filter(TokenModel.expires > now)
-        query = query.filter(TokenModel.trust_id == trust_id)
+        The counter row stays locked until the transaction commits, so
+        revocations become visible in the order of their revisions.
 
-        token_references = query.filter_by(valid=True)
-        for token_ref in token_references:
-            token_ref_dict = token_ref.to_dict()
-            tokens.append(token_ref_dict['id'])
-        return tokens
+        """
+        query = session.query(TokenRevisionModel).with_lockmode('update')
+        counter = query.get(1)
+        if counter is None:
+            # the schema was not created by the migrations
+            counter = TokenRevisionModel(id=1, revision=0)
+            session.add(counter)
+        counter.revision += 1
+        session.flush()
+        return counter.revision
 
-    def _list_tokens_for_user(self, user_id, tenant_id=None):
-        session = self.get_session()
-        tokens = []
-        now = timeutils.utcnow()
-        query = session.query(TokenModel)
+    def _tokens_query(self, session, entity, now, user_id, tenant_id=None,
+                      trust_id=None, consumer_id=None):
+        query = session.query(entity)
+        query = query.filter_by(valid=True)
         query = query.filter(TokenModel.expires > now)
-        query = query.filter(TokenModel.user_id == user_id)
-
-        token_references = query.filter_by(valid=True)
-        for token_ref in token_references:
-            token_ref_dict = token_ref.to_dict()
-            if self._tenant_matches(tenant_id, token_ref_dict):
-                tokens.append(token_ref['id'])
-        return tokens
-
-    def _list_tokens_for_consumer(self, user_id, consumer_id):
-        tokens = []
-        session = self.get_session()
-        with session.begin():
-            now = timeutils.utcnow()
-            query = session.query(TokenModel)
-            query = query.filter(TokenModel.expires > now)
+        if trust_id:
+            query = query.filter(TokenModel.trust_id == trust_id)
+        else:
             query = query.filter(TokenModel.user_id == user_id)
-            token_references = query.filter_by(valid=True)
-
-            for token_ref in token_references:
-                token_ref_dict = token_ref.to_dict()
-                if self._consumer_matches(consumer_id, token_ref_dict):
-                    tokens.append(token_ref_dict['id'])
-            session.flush()
-        return tokens
+        if tenant_id:
+            query = query.filter(TokenModel.tenant_id == tenant_id)
+        if consumer_id:
+            query = query.filter(TokenModel.consumer_id == consumer_id)
+        return query
 
     def _list_tokens(self, user_id, tenant_id=None, trust_id=None,
                      consumer_id=None):
-        if trust_id:
-            return self._list_tokens_for_trust(trust_id)
-        if consumer_id:
-            return self._list_tokens_for_consumer(user_id, consumer_id)
-        else:
-            return self._list_tokens_for_user(user_id, tenant_id)
-
-    def list_revoked_tokens(self):
         session = self.get_session()
+        query = self._tokens_query(session, TokenModel.id,
+                                   timeutils.utcnow(), user_id,
+                                   tenant_id=tenant_id,
+                                   trust_id=trust_id,
+                                   consumer_id=consumer_id)
+        return [token_ref[0] for token_ref in query]
+
+    @sql.read_from_slave(bounded_lag=True)
+    def list_revoked_tokens(self, session=None):
+        if session is None:
+            session = self.get_session()
         tokens = []
         now = timeutils.utcnow()
-        query = session.query(TokenModel.id, TokenModel.expires)
+        query = session.query(TokenModel.id, TokenModel.expires,
+                              TokenModel.revoked_at, TokenModel.revision)
         query = query.filter(TokenModel.expires > now)
         token_references = query.filter_by(valid=False)
         for token_ref in token_references:
             record = {
                 'id': token_ref[0],
                 'expires': token_ref[1],
+                'revoked_at': token_ref[2],
+                'revision': token_ref[3],
             }
             tokens.append(record)
         return tokens
 
-    def flush_expired_tokens(self):
+    def flush_expired_tokens(self, batch_size=None, batch_delay=0,
+                             dry_run=False, archive=False):
+        """Delete or archive the tokens that have expired.
+
+        With a ``batch_size``, the expired tokens are removed that many at a
+        time, oldest first, each batch in its own transaction and separated
+        by ``batch_delay`` seconds, so that a large flush does not hold locks
+        for long or starve concurrent requests.
+
+        :param batch_size: number of tokens per batch, or None for a single
+                           DELETE
+        :param batch_delay: seconds to sleep between batches
+        :param dry_run: only count the expired tokens
+        :param archive: copy the expired tokens into ``token_archive``
+        :returns: number of expired tokens flushed (or found, if dry_run)
+
+        """
         session = self.get_session()
+        now = timeutils.utcnow()
 
-        query = session.query(TokenModel)
-        query = query.filter(TokenModel.expires < timeutils.utcnow())
-        query.delete(synchronize_session=False)
+        if dry_run:
+            query = session.query(TokenModel.id)
+            return query.filter(TokenModel.expires < now).count()
 
-        session.flush()
+        if not batch_size:
+            with session.begin():
+                query = session.query(TokenModel)
+                query = query.filter(TokenModel.expires < now)
+                if archive:
+                    self._archive_tokens(session, query)
+                return query.delete(synchronize_session=False)
+
+        flushed = 0
+        start = time.time()
+        while True:
+            with session.begin():
+                query = session.query(TokenModel.id)
+                query = query.filter(TokenModel.expires < now)
+                query = query.order_by(TokenModel.expires).limit(batch_size)
+                token_ids = [token_ref[0] for token_ref in query]
+                if token_ids:
+                    query = session.query(TokenModel)
+                    query = query.filter(TokenModel.id.in_(token_ids))
+                    if archive:
+                        self._archive_tokens(session, query)
+                    query.delete(synchronize_session=False)
+            flushed += len(token_ids)
+            elapsed = time.time() - start
+            LOG.info(_('Flushed %(flushed)d expired tokens '
+                       '(%(rate)d tokens/sec)'),
+                     {'flushed': flushed,
+                      'rate': flushed / elapsed if elapsed else flushed})
+            if len(token_ids) < batch_size:
+                return flushed
+            time.sleep(batch_delay)
+
+    def _archive_tokens(self, session, query):
+        columns = TokenArchiveModel.__table__.columns.keys()
+        rows = [dict((column, getattr(token_ref, column))
+                     for column in columns)
+                for token_ref in query]
+        if rows:
+            session.execute(TokenArchiveModel.__table__.insert(), rows)
@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import json
 
 from keystone.common import cms
@@ -32,6 +33,36 @@ LOG = logging.getLogger(__name__)
 DEFAULT_DOMAIN_ID = CONF.identity.default_domain_id
 
 
+def render_revocation_list_response(context, token_api):
+    """Render the signed revocation list.
+
+    The response carries an ``ETag`` of the unsigned list; a request whose
+    ``If-None-Match`` header matches it is answered with ``304 Not Modified``
+    without signing anything. A ``since`` query parameter limits the list to
+    the tokens revoked after that revision.
+
+    """
+    since = context['query_string'].get('since')
+    data = token_api.get_revocation_list(since=since)
+    json_data = json.dumps(data, sort_keys=True)
+    etag = '"%s"' % hashlib.sha1(json_data).hexdigest()
+    headers = [('ETag', etag)]
+
+    if_none_match = context['headers'].get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return wsgi.render_response(status=(304, 'Not Modified'),
+                                    headers=headers)
+
+    if since is None:
+        signed_text = token_api.sign_revocation_list(json_data)
+    else:
+        signed_text = cms.cms_sign_text(json_data,
+                                        CONF.signing.certfile,
+                                        CONF.signing.keyfile)
+    return wsgi.render_response(body={'signed': signed_text},
+                                headers=headers)
+
+
 class ExternalAuthNotApplicable(Exception):
     """External authentication is not applicable."""
     pass
@@ -123,10 +154,9 @@ class Auth(controller.V2Controller):
         if bind:
             auth_token_data['bind'] = bind
 
-        roles_ref = []
-        for role_id in metadata_ref.get('roles', []):
-            role_ref = self.assignment_api.get_role(role_id)
-            roles_ref.append(dict(name=role_ref['name']))
+        role_names = self.assignment_api.get_role_names(
+            metadata_ref.get('roles', []))
+        roles_ref = [dict(name=name) for name in role_names]
 
         (token_id, token_data) = self.token_provider_api.issue_v2_token(
             auth_token_data, roles_ref=roles_ref, catalog_ref=catalog_ref)
@@ -436,19 +466,7 @@ class Auth(controller.V2Controller):
     @controller.v2_deprecated
     @controller.protected()
     def revocation_list(self, context, auth=None):
-        tokens = self.token_api.list_revoked_tokens()
-
-        for t in tokens:
-            expires = t['expires']
-            if not (expires and isinstance(expires, unicode)):
-                    t['expires'] = timeutils.isotime(expires)
-        data = {'revoked': tokens}
-        json_data = json.dumps(data)
-        signed_text = cms.cms_sign_text(json_data,
-                                        CONF.signing.certfile,
-                                        CONF.signing.keyfile)
-
-        return {'signed': signed_text}
+        return render_revocation_list_response(context, self.token_api)
 
     @controller.v2_deprecated
     def endpoints(self, context, token_id):
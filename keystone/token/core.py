@@ -107,6 +107,7 @@ class Manager(manager.Manager):
 
     def __init__(self):
         super(Manager, self).__init__(CONF.token.driver)
+        self._signed_revocation_list = None
 
     def unique_id(self, token_id):
         """Return a unique ID for a token.
@@ -163,10 +164,9 @@ class Manager(manager.Manager):
 
     def delete_tokens(self, user_id, tenant_id=None, trust_id=None,
                       consumer_id=None):
-        token_list = self.driver._list_tokens(user_id, tenant_id, trust_id,
-                                              consumer_id)
-        self.driver.delete_tokens(user_id, tenant_id, trust_id, consumer_id)
-        for token_id in token_list:
+        token_list = self.driver.delete_tokens(user_id, tenant_id, trust_id,
+                                               consumer_id)
+        for token_id in token_list or []:
             unique_id = self.unique_id(token_id)
             self._invalidate_individual_token_cache(unique_id)
         self.invalidate_revocation_list()
@@ -176,6 +176,64 @@ class Manager(manager.Manager):
     def list_revoked_tokens(self):
         return self.driver.list_revoked_tokens()
 
+    def get_revocation_list(self, since=None):
+        """Returns the revocation list, ready to be serialized and signed.
+
+        Drivers number revocations from a counter that only ever grows, and
+        the ``revision`` of the list is the highest number it contains. If
+        ``since`` is a revision, only the tokens revoked after it, plus those
+        revoked before drivers numbered revocations, are listed, and the
+        revision is never lower than ``since``. Tokens that have since
+        expired are never reported, so callers should discard revoked tokens
+        once they expire.
+
+        :param since: optional revision, as an integer
+        :returns: dict with ``revoked`` and ``revision`` keys
+        :raises: keystone.exception.ValidationError
+
+        """
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                raise exception.ValidationError(attribute='a revision number',
+                                                target='since')
+
+        revision = since
+        revoked = []
+        for token_ref in self.list_revoked_tokens():
+            token_revision = token_ref.get('revision')
+            if token_revision is not None:
+                if revision is None or token_revision > revision:
+                    revision = token_revision
+                if since is not None and token_revision <= since:
+                    continue
+            expires = token_ref['expires']
+            if (expires is not None and
+                    not isinstance(expires, six.string_types)):
+                expires = timeutils.isotime(expires)
+            revoked.append({'id': token_ref['id'], 'expires': expires})
+
+        # NOTE: keep the serialized list stable so that it can be compared
+        # (and its ETag computed) across requests and servers.
+        revoked.sort(key=lambda t: t['id'])
+        return {'revoked': revoked, 'revision': revision}
+
+    def sign_revocation_list(self, json_data):
+        """Sign a serialized revocation list.
+
+        The most recently signed list is remembered, so polling an unchanged
+        list does not invoke CMS again.
+
+        """
+        if (self._signed_revocation_list is None or
+                self._signed_revocation_list[0] != json_data):
+            signed_text = cms.cms_sign_text(json_data,
+                                            CONF.signing.certfile,
+                                            CONF.signing.keyfile)
+            self._signed_revocation_list = (json_data, signed_text)
+        return self._signed_revocation_list[1]
+
     def invalidate_revocation_list(self):
         # NOTE(morganfainberg): Note that ``self`` needs to be passed to
         # invalidate() because of the way the invalidation method works on
@@ -294,7 +352,9 @@ class Driver(object):
         :type trust_id: string
         :param consumer_id: identity of the consumer
         :type consumer_id: string
-        :returns: None.
+        :returns: list of the deleted token_id's, which the manager uses to
+                  invalidate their cache entries; drivers written against
+                  older releases may return None
         :raises: keystone.exception.TokenNotFound
 
         """
@@ -303,11 +363,14 @@ class Driver(object):
                                        trust_id=trust_id,
                                        consumer_id=consumer_id)
 
+        deleted = []
         for token in token_list:
             try:
                 self.delete_token(token)
+                deleted.append(token)
             except exception.NotFound:
                 pass
+        return deleted
 
     @abc.abstractmethod
     def _list_tokens(self, user_id, tenant_id=None, trust_id=None,
@@ -335,13 +398,29 @@ class Driver(object):
     def list_revoked_tokens(self):
         """Returns a list of all revoked tokens
 
-        :returns: list of token_id's
+        Each record holds the token's ``id`` and ``expires`` time and, if the
+        driver tracks them, the ``revoked_at`` time of the revocation and its
+        ``revision``: an integer allocated in increasing order, which should
+        only become visible once every lower revision has, so that clients
+        passing a revision back as ``since`` miss nothing.
+
+        :returns: list of revocation records
 
         """
         raise exception.NotImplemented()
 
     @abc.abstractmethod
-    def flush_expired_tokens(self):
+    def flush_expired_tokens(self, batch_size=None, batch_delay=0,
+                             dry_run=False, archive=False):
         """Archive or delete tokens that have expired.
+
+        :param batch_size: number of tokens to remove at a time, if the
+                           driver supports batching
+        :param batch_delay: seconds to sleep between batches
+        :param dry_run: only count the expired tokens
+        :param archive: keep a copy of the expired tokens, if the driver
+                        supports archiving
+        :returns: number of expired tokens flushed (or found, if dry_run)
+
         """
         raise exception.NotImplemented()
@@ -17,6 +17,7 @@
 """Token provider interface."""
 
 import abc
+import inspect
 
 import six
 
@@ -105,30 +106,60 @@ class Manager(manager.Manager):
 
     def __init__(self):
         super(Manager, self).__init__(self.get_token_provider())
+        self._include_catalog_supported = {}
 
-    def validate_token(self, token_id, belongs_to=None):
+    def _call_validate(self, method_name, token_id, include_catalog):
+        """Call a provider's validate method, with include_catalog if known.
+
+        Providers written before include_catalog existed take only the token
+        id; they keep working, and always include the catalog.
+
+        """
+        method = getattr(self.driver, method_name)
+        supported = self._include_catalog_supported.get(method_name)
+        if supported is None:
+            try:
+                argspec = inspect.getargspec(method)
+                supported = ('include_catalog' in argspec.args or
+                             argspec.keywords is not None)
+            except TypeError:
+                supported = True
+            if not supported:
+                LOG.warning(_('Token provider %(provider)s.%(method)s does '
+                              'not accept include_catalog; the catalog is '
+                              'always included.'),
+                            {'provider': self.driver.__class__.__name__,
+                             'method': method_name})
+            self._include_catalog_supported[method_name] = supported
+        if supported:
+            return method(token_id, include_catalog=include_catalog)
+        return method(token_id)
+
+    def validate_token(self, token_id, belongs_to=None,
+                       include_catalog=True):
         unique_id = self.token_api.unique_id(token_id)
         # NOTE(morganfainberg): Ensure we never use the long-form token_id
         # (PKI) as part of the cache_key.
-        token = self._validate_token(unique_id)
+        token = self._validate_token(unique_id, include_catalog)
         self._token_belongs_to(token, belongs_to)
         self._is_valid_token(token)
         return token
 
-    def validate_v2_token(self, token_id, belongs_to=None):
+    def validate_v2_token(self, token_id, belongs_to=None,
+                          include_catalog=True):
         unique_id = self.token_api.unique_id(token_id)
         # NOTE(morganfainberg): Ensure we never use the long-form token_id
         # (PKI) as part of the cache_key.
-        token = self._validate_v2_token(unique_id)
+        token = self._validate_v2_token(unique_id, include_catalog)
         self._token_belongs_to(token, belongs_to)
         self._is_valid_token(token)
         return token
 
-    def validate_v3_token(self, token_id):
+    def validate_v3_token(self, token_id, include_catalog=True):
         unique_id = self.token_api.unique_id(token_id)
         # NOTE(morganfainberg): Ensure we never use the long-form token_id
         # (PKI) as part of the cache_key.
-        token = self._validate_v3_token(unique_id)
+        token = self._validate_v3_token(unique_id, include_catalog)
         self._is_valid_token(token)
         return token
 
@@ -143,7 +174,8 @@ class Manager(manager.Manager):
         # NOTE(morganfainberg): Ensure we never use the long-form token_id
         # (PKI) as part of the cache_key.
         unique_id = self.token_api.unique_id(token_id)
-        self.validate_v2_token(unique_id, belongs_to=belongs_to)
+        self.validate_v2_token(unique_id, belongs_to=belongs_to,
+                               include_catalog=False)
 
     def check_v3_token(self, token_id):
         """Check the validity of the given V3 token.
@@ -155,22 +187,25 @@ class Manager(manager.Manager):
         # NOTE(morganfainberg): Ensure we never use the long-form token_id
         # (PKI) as part of the cache_key.
         unique_id = self.token_api.unique_id(token_id)
-        self.validate_v3_token(unique_id)
+        self.validate_v3_token(unique_id, include_catalog=False)
 
     @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
                         expiration_time=CONF.token.cache_time)
-    def _validate_token(self, token_id):
-        return self.driver.validate_token(token_id)
+    def _validate_token(self, token_id, include_catalog):
+        return self._call_validate('validate_token', token_id,
+                                   include_catalog)
 
     @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
                         expiration_time=CONF.token.cache_time)
-    def _validate_v2_token(self, token_id):
-        return self.driver.validate_v2_token(token_id)
+    def _validate_v2_token(self, token_id, include_catalog):
+        return self._call_validate('validate_v2_token', token_id,
+                                   include_catalog)
 
     @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
                         expiration_time=CONF.token.cache_time)
-    def _validate_v3_token(self, token_id):
-        return self.driver.validate_v3_token(token_id)
+    def _validate_v3_token(self, token_id, include_catalog):
+        return self._call_validate('validate_v3_token', token_id,
+                                   include_catalog)
 
     def _is_valid_token(self, token):
          # Verify the token has not expired.
@@ -222,9 +257,12 @@ class Manager(manager.Manager):
         # consulted before accepting a token as valid.  For now we will
         # do the explicit individual token invalidation.
 
-        self._validate_token.invalidate(self, token_id)
-        self._validate_v2_token.invalidate(self, token_id)
-        self._validate_v3_token.invalidate(self, token_id)
+        for include_catalog in (True, False):
+            self._validate_token.invalidate(self, token_id, include_catalog)
+            self._validate_v2_token.invalidate(self, token_id,
+                                               include_catalog)
+            self._validate_v3_token.invalidate(self, token_id,
+                                               include_catalog)
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -296,26 +334,30 @@ class Provider(object):
         raise exception.NotImplemented()
 
     @abc.abstractmethod
-    def validate_token(self, token_id):
+    def validate_token(self, token_id, include_catalog=True):
         """Detect token version and validate token and return the token data.
 
         Must raise Unauthorized exception if unable to validate token.
 
         :param token_id: identity of the token
         :type token_id: string
+        :param include_catalog: whether to include the service catalog
+        :type include_catalog: boolean
         :returns: token_data
         :raises: keystone.exception.TokenNotFound
         """
         raise exception.NotImplemented()
 
     @abc.abstractmethod
-    def validate_v2_token(self, token_id):
+    def validate_v2_token(self, token_id, include_catalog=True):
         """Validate the given V2 token and return the token data.
 
         Must raise Unauthorized exception if unable to validate token.
 
         :param token_id: identity of the token
         :type token_id: string
+        :param include_catalog: whether to include the service catalog
+        :type include_catalog: boolean
         :returns: token data
         :raises: keystone.exception.TokenNotFound
 
@@ -323,11 +365,13 @@ class Provider(object):
         raise exception.NotImplemented()
 
     @abc.abstractmethod
-    def validate_v3_token(self, token_id):
+    def validate_v3_token(self, token_id, include_catalog=True):
         """Validate the given V3 token and return the token_data.
 
         :param token_id: identity of the token
         :type token_id: string
+        :param include_catalog: whether to include the service catalog
+        :type include_catalog: boolean
         :returns: token data
         :raises: keystone.exception.TokenNotFound
         """
@@ -352,6 +352,26 @@ class BaseProvider(provider.Provider):
                 return token.provider.V3
         raise token.provider.UnsupportedTokenVersionException()
 
+    def _omit_catalog(self, token_data, section, key):
+        """Return a copy of token_data without its catalog.
+
+        Catalogs are shared by many tokens and often outweigh the rest of the
+        token data, so token records carry a catalog_scope instead, from
+        which validation renders the catalog again when it is wanted.
+
+        """
+        stored_token_data = dict(token_data)
+        stored_token_data[section] = dict(token_data[section])
+        del stored_token_data[section][key]
+        return stored_token_data
+
+    def _with_catalog(self, token_data, section, key, catalog):
+        # copied, as token_ref may be shared with the token cache
+        token_data = dict(token_data)
+        token_data[section] = dict(token_data[section])
+        token_data[section][key] = catalog
+        return token_data
+
     def issue_v2_token(self, token_ref, roles_ref=None,
                        catalog_ref=None):
         token_data = self.v2_token_data_helper.format_token(
@@ -363,13 +383,28 @@ class BaseProvider(provider.Provider):
             if isinstance(expiry, basestring):
                 expiry = timeutils.normalize_time(
                     timeutils.parse_isotime(expiry))
+            metadata_ref = token_ref['metadata']
+            if 'roles' in metadata_ref:
+                # saves resolving role names on every policy check
+                metadata_ref = dict(
+                    metadata_ref,
+                    role_names=self.assignment_api.get_role_names(
+                        metadata_ref['roles']))
+            stored_token_data = token_data
+            catalog_scope = None
+            if catalog_ref and token_ref['tenant']:
+                stored_token_data = self._omit_catalog(
+                    token_data, 'access', 'serviceCatalog')
+                catalog_scope = {'user_id': token_ref['user']['id'],
+                                 'project_id': token_ref['tenant']['id']}
             data = dict(key=token_id,
                         id=token_id,
                         expires=expiry,
                         user=token_ref['user'],
                         tenant=token_ref['tenant'],
-                        metadata=token_ref['metadata'],
-                        token_data=token_data,
+                        metadata=metadata_ref,
+                        token_data=stored_token_data,
+                        catalog_scope=catalog_scope,
                         bind=token_ref.get('bind'),
                         trust_id=token_ref['metadata'].get('trust_id'),
                         token_version=token.provider.V2)
@@ -432,13 +467,25 @@ class BaseProvider(provider.Provider):
                 metadata_ref.setdefault('trust_id', trust['id'])
                 metadata_ref.setdefault('trustee_user_id',
                                         trust['trustee_user_id'])
+            stored_token_data = token_data
+            catalog_scope = None
+            if token_data['token'].get('catalog'):
+                stored_token_data = self._omit_catalog(
+                    token_data, 'token', 'catalog')
+                # the catalog is the trustor's for trust scoped tokens
+                catalog_scope = {
+                    'user_id': (trust['trustor_user_id']
+                                if CONF.trust.enabled and trust
+                                else user_id),
+                    'project_id': project_id}
             data = dict(key=token_id,
                         id=token_id,
                         expires=expiry,
                         user=token_data['token']['user'],
                         tenant=token_data['token'].get('project'),
                         metadata=metadata_ref,
-                        token_data=token_data,
+                        token_data=stored_token_data,
+                        catalog_scope=catalog_scope,
                         trust_id=trust['id'] if trust else None,
                         token_version=token.provider.V3)
             self.token_api.create_token(token_id, data)
@@ -508,11 +555,11 @@ class BaseProvider(provider.Provider):
                 if project_ref['domain_id'] != DEFAULT_DOMAIN_ID:
                     raise exception.Unauthorized(msg)
 
-    def validate_v2_token(self, token_id):
+    def validate_v2_token(self, token_id, include_catalog=True):
         token_ref = self._verify_token(token_id)
-        return self._validate_v2_token_ref(token_ref)
+        return self._validate_v2_token_ref(token_ref, include_catalog)
 
-    def _validate_v2_token_ref(self, token_ref):
+    def _validate_v2_token_ref(self, token_ref, include_catalog=True):
         try:
             self._assert_default_domain(token_ref)
             # FIXME(gyee): performance or correctness? Should we return the
@@ -536,28 +583,42 @@ class BaseProvider(provider.Provider):
                 # Get a service catalog if possible
                 # This is needed for on-behalf-of requests
                 catalog_ref = None
-                if token_ref.get('tenant'):
+                if include_catalog and token_ref.get('tenant'):
                     catalog_ref = self.catalog_api.get_catalog(
                         token_ref['user']['id'],
                         token_ref['tenant']['id'],
                         metadata_ref)
                 token_data = self.v2_token_data_helper.format_token(
                     token_ref, roles_ref, catalog_ref)
+            elif not include_catalog:
+                if 'serviceCatalog' in token_data['access']:
+                    token_data = self._omit_catalog(
+                        token_data, 'access', 'serviceCatalog')
+            elif token_ref.get('catalog_scope'):
+                catalog_scope = token_ref['catalog_scope']
+                catalog_ref = self.catalog_api.get_catalog(
+                    catalog_scope['user_id'],
+                    catalog_scope['project_id'],
+                    token_ref['metadata'])
+                token_data = self._with_catalog(
+                    token_data, 'access', 'serviceCatalog',
+                    self.v2_token_data_helper.format_catalog(catalog_ref))
             return token_data
         except exception.ValidationError as e:
             LOG.exception(_('Failed to validate token'))
             raise exception.TokenNotFound(e)
 
-    def validate_v3_token(self, token_id):
+    def validate_v3_token(self, token_id, include_catalog=True):
         try:
             token_ref = self._verify_token(token_id)
-            token_data = self._validate_v3_token_ref(token_ref)
+            token_data = self._validate_v3_token_ref(token_ref,
+                                                     include_catalog)
             return token_data
         except (exception.ValidationError,
                 exception.UserNotFound):
             LOG.exception(_('Failed to validate token'))
 
-    def _validate_v3_token_ref(self, token_ref):
+    def _validate_v3_token_ref(self, token_ref, include_catalog=True):
         # FIXME(gyee): performance or correctness? Should we return the
         # cached token or reconstruct it? Obviously if we are going with
         # the cached token, any role, project, or domain name changes
@@ -579,14 +640,24 @@ class BaseProvider(provider.Provider):
                 {},
                 project_id=project_id,
                 bind=token_ref.get('bind'),
-                expires=token_ref['expires'])
+                expires=token_ref['expires'],
+                include_catalog=include_catalog)
+        elif not include_catalog:
+            if 'catalog' in token_data['token']:
+                token_data = self._omit_catalog(token_data, 'token', 'catalog')
+        elif token_ref.get('catalog_scope'):
+            catalog_scope = token_ref['catalog_scope']
+            token_data = self._with_catalog(
+                token_data, 'token', 'catalog',
+                self.catalog_api.get_v3_catalog(catalog_scope['user_id'],
+                                                catalog_scope['project_id']))
         return token_data
 
-    def validate_token(self, token_id):
+    def validate_token(self, token_id, include_catalog=True):
         token_ref = self._verify_token(token_id)
         version = self.get_token_version(token_ref)
         if version == token.provider.V3:
-            return self._validate_v3_token_ref(token_ref)
+            return self._validate_v3_token_ref(token_ref, include_catalog)
         elif version == token.provider.V2:
-            return self._validate_v2_token_ref(token_ref)
+            return self._validate_v2_token_ref(token_ref, include_catalog)
         raise token.provider.UnsupportedTokenVersionException()
@@ -22,6 +22,7 @@ from keystone.common import cms
 from keystone.common import environment
 from keystone import config
 from keystone import exception
+from keystone.openstack.common import importutils
 from keystone.openstack.common import log as logging
 from keystone.token.providers import common
 
@@ -32,13 +33,33 @@ LOG = logging.getLogger(__name__)
 
 
 class Provider(common.BaseProvider):
+    def __init__(self, *args, **kwargs):
+        super(Provider, self).__init__(*args, **kwargs)
+        self._signer = None
+
+    @property
+    def signer(self):
+        # loaded lazily so the signing cert and key only need to exist once
+        # tokens are actually issued
+        if self._signer is None:
+            self._signer = cms.load_signer(
+                importutils.import_class(CONF.signing.signer),
+                CONF.signing.certfile,
+                CONF.signing.keyfile)
+        return self._signer
+
+    def _sign_token(self, text):
+        return self.signer.sign_token(text)
+
     def _get_token_id(self, token_data):
         try:
-            token_id = cms.cms_sign_token(json.dumps(token_data),
-                                          CONF.signing.certfile,
-                                          CONF.signing.keyfile)
+            token_id = self._sign_token(json.dumps(token_data))
             return token_id
-        except environment.subprocess.CalledProcessError:
+        except (environment.subprocess.CalledProcessError,
+                exception.UnexpectedError, IOError, OSError,
+                ValueError, TypeError):
+            # openssl failures, in-process (pycrypto) signing failures and a
+            # saturated or crashed signing pool all mean the same thing here
             LOG.exception(_('Unable to sign token'))
             raise exception.UnexpectedError(_(
                 'Unable to sign token.'))
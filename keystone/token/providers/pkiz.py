@@ -0,0 +1,29 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Keystone compressed PKI (PKIZ) Token Provider
+
+Token data is compressed with zlib before being signed, and the signed
+document is encoded in URL safe base64 behind ``cms.PKIZ_PREFIX``. Large
+service catalogs typically shrink the token ID several fold.
+"""
+
+from keystone.token.providers import pki
+
+
+class Provider(pki.Provider):
+    def _sign_token(self, text):
+        return self.signer.sign_compressed_token(text)